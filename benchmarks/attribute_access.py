@@ -0,0 +1,73 @@
+"""
+Microbenchmark of the per-row attribute access cost of result objects
+
+    $ PYTHONPATH=. python benchmarks/attribute_access.py [--rows 10000] [--repeat 5]
+
+Rows are built from synthetic decoded pages, no requests are made. DataHolder (old) is the same rows read through
+the normalising __getattribute__ every attribute access went through before the fast attribute path
+"""
+import argparse
+import timeit
+
+from blackcurve.api import BlackCurveAPI, DataHolder
+
+
+class OldDataHolder(DataHolder):
+    """
+    DataHolder with the __getattribute__ it had before the fast attribute path
+    """
+
+    def __getattribute__(self, item):
+        if isinstance(item, str):
+            item = item.lower().replace(' ', '_').strip()
+        if callable(object.__getattribute__(self, item)) and '_' not in item:
+            if item not in self._api.data_attributes:
+                raise AttributeError('%s method not allowed' % item)
+        return object.__getattribute__(self, item)
+
+
+def build_rows(rows, compact, old=False):
+    """
+    Build result rows from a page without requesting it
+    :param rows: number of rows
+    :param compact: build read-only Rows instead of DataHolders
+    :param old: read the DataHolders through the old __getattribute__
+    :return: list of rows
+    """
+    bc = BlackCurveAPI('benchmark', 'token')
+    holder = bc.prices().all(compact=compact)
+    data = [{'Product ID': 'P%s' % i, 'Geography': 'UK', 'Price': i * 1.5, 'Cost Price': i, 'System ID': i}
+            for i in range(rows)]
+    output = holder._process_request(True, {'prices': data, 'no_pages': 1})._pages_queryset
+    if old:
+        for row in output:
+            row.__class__ = OldDataHolder
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ('row.product_id', lambda rows: [r.product_id for r in rows]),
+        ('row.Price', lambda rows: [r.Price for r in rows]),
+        ("row['Cost Price']", lambda rows: [r['Cost Price'] for r in rows]),
+    ]
+    # label, compact, old
+    kinds = [('DataHolder (old)', False, True), ('DataHolder', False, False), ('Row', True, False)]
+    print('%-16s %-20s %12s' % ('rows', 'access', 'ns / row'))
+    for label, compact, old in kinds:
+        rows = build_rows(args.rows, compact, old)
+        for name, func in cases:
+            best = min(timeit.repeat(lambda: func(rows), number=1, repeat=args.repeat))
+            print('%-16s %-20s %12.1f' % (label, name, best / args.rows * 1e9))
+        if not old:
+            best = min(timeit.repeat(lambda: build_rows(args.rows, compact), number=1, repeat=args.repeat))
+            print('%-16s %-20s %12.1f' % (label, 'build', best / args.rows * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Microbenchmark of the JSON engines on price & sales history payloads
+
+    $ PYTHONPATH=. python benchmarks/json_engines.py [--rows 5000] [--width 30] [--repeat 5]
+
+Encodes a bulk create payload with dates, datetimes, Decimals & NumPy scalars in it (and with build_json's old
+recursive walk for comparison), and decodes a page of each endpoint, with every engine installed here
+"""
+import argparse
+import datetime
+import decimal
+import json
+import timeit
+
+from blackcurve import serialisation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def recursive_build_json(data, recursion=False):
+    """
+    build_json before the JSON engines, formats the dates & datetimes in a recursive walk and then calls json.dumps
+    """
+    if isinstance(data, list):
+        output = [recursive_build_json(i, True) for i in data]
+        return output if recursion else json.dumps(output)
+    elif isinstance(data, dict):
+        output = dict((k, recursive_build_json(v, True)) for k, v in data.items())
+        return output if recursion else json.dumps(output)
+    if isinstance(data, datetime.datetime):
+        return data.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(data, datetime.date):
+        return data.strftime("%Y-%m-%d")
+    return data
+
+
+def price_rows(rows):
+    """
+    :param rows: number of rows
+    :return: list of price rows as they are sent to the API
+    """
+    updated = datetime.datetime(2020, 6, 1, 9, 30)
+    return [{'Product ID': 'P%s' % i, 'Geography': 'UK', 'Currency': 'GBP',
+             'Price': decimal.Decimal('%s.99' % (i % 500)), 'Cost Price': decimal.Decimal('%s.25' % (i % 300)),
+             'Effective Date': datetime.date(2020, 1, 1 + i % 28), 'Updated': updated}
+            for i in range(rows)]
+
+
+def sales_rows(rows, width):
+    """
+    :param rows: number of rows
+    :param width: number of columns
+    :return: list of sales history rows, half of the measures are NumPy scalars when NumPy is installed
+    """
+    output = []
+    for i in range(rows):
+        row = {'System ID': i, 'Product ID': 'P%s' % (i % 1000), 'Date': datetime.date(2019, 1 + i % 12, 1)}
+        for column in range(width - len(row)):
+            value = i * 0.5 + column
+            if numpy is not None and column % 2:
+                value = numpy.float64(value) if column % 4 == 1 else numpy.int64(i + column)
+            row['Measure %s' % column] = value
+        output.append(row)
+    return output
+
+
+def best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [('prices', price_rows(args.rows)), ('sales history', sales_rows(args.rows, args.width))]
+    engines = [serialisation.get_engine(name) for name in serialisation.available_engines()]
+    print('%-14s %-22s %12s %12s' % ('payload', 'engine', 'encode ms', 'decode ms'))
+    for name, rows in payloads:
+        if name == 'prices':
+            # the old walk only knew dates & datetimes, Decimals have to be converted first
+            old_rows = [dict(row, **{'Price': float(row['Price']), 'Cost Price': float(row['Cost Price'])})
+                        for row in rows]
+            encode = best(lambda: recursive_build_json(old_rows), args.repeat)
+            print('%-14s %-22s %12.2f %12s' % (name, 'recursive build_json', 1000 * encode, '-'))
+        for engine in engines:
+            text = engine.dumps(rows)
+            page = '{"%s": %s, "no_pages": 1}' % ('prices' if name == 'prices' else 'data', text)
+            encode = best(lambda: engine.dumps(rows), args.repeat)
+            decode = best(lambda: engine.loads(page), args.repeat)
+            print('%-14s %-22s %12.2f %12.2f' % (name, engine.name, 1000 * encode, 1000 * decode))
+
+
+if __name__ == '__main__':
+    main()
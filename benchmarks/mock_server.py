@@ -0,0 +1,252 @@
+"""
+Local stand-in for the BlackCurve API, for benchmarking the client without touching a real account
+
+    $ PYTHONPATH=. python benchmarks/mock_server.py --pages 20 --rows 500 --width 10 --latency 0.02
+
+Serves token/, prices/, data_sources/<name>, data_sources_info/, geographies/ & currencies/ on
+http://127.0.0.1:<port>/api/ with generated rows, point a client at it with
+BlackCurveAPI(domain=...)
+"""
+import argparse
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+GEOGRAPHIES = ['UK', 'US', 'DE', 'FR']
+CURRENCIES = [{'code': 'GBP', 'rate': 1.0}, {'code': 'USD', 'rate': 1.27}, {'code': 'EUR', 'rate': 1.17}]
+
+
+class MockData(object):
+    def __init__(self, pages=10, rows=100, width=10):
+        """
+        Generated rows served by the mock server, the same settings always give the same rows
+        :param pages: number of pages of prices & data source rows
+        :param rows: rows per page
+        :param width: number of extra columns per row
+        """
+        self.pages = pages
+        self.rows = rows
+        self.width = width
+        self.columns = ['Product ID', 'Geography', 'Price', 'Cost Price', 'Volume'] + \
+            ['Attribute %s' % i for i in range(width)]
+
+    @property
+    def total(self):
+        return self.pages * self.rows
+
+    def row(self, i):
+        """
+        :param i: row number, from 0
+        :return: dict
+        """
+        row = {'id': i + 1, 'Product ID': 'P%06d' % i, 'Geography': GEOGRAPHIES[i % len(GEOGRAPHIES)],
+               'Price': round(10 + (i % 997) * 0.37, 2), 'Cost Price': round(5 + (i % 991) * 0.21, 2),
+               'Volume': i % 113}
+        for a in range(self.width):
+            row['Attribute %s' % a] = 'value %s' % ((i + a) % 50)
+        return row
+
+    def page(self, page_no):
+        """
+        :param page_no: page number, from 1
+        :return: list of rows
+        """
+        start = (page_no - 1) * self.rows
+        return [self.row(i) for i in range(start, min(start + self.rows, self.total))]
+
+    def info(self):
+        """
+        :return: data_sources_info response
+        """
+        types = dict((column, 'Decimal' if 'Price' in column else 'Integer' if column == 'Volume' else 'String')
+                     for column in self.columns)
+        return {'Sales History': types, 'Products': types}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers & body are written separately, don't let Nagle hold the body back on kept-alive connections
+    disable_nagle_algorithm = True
+    data = None
+    latency = 0
+    counter = None
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, body, status=200):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method):
+        if self.latency:
+            time.sleep(self.latency)
+        self.counter.add(method)
+        url = urlparse(self.path)
+        path = url.path.split('/api/', 1)[-1]
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        body = self._read_body()
+        page_no = int(query.get('page', 1))
+        data = self.data
+
+        if path == 'token/':
+            return self._respond({'token': 'benchmark'})
+        if method != 'GET':
+            rows = json.loads(body.decode('utf-8')) if body else None
+            return self._respond({'success': len(rows) if isinstance(rows, list) else 1})
+
+        match = re.match(r'^prices/(.+)$', path)
+        if match:
+            return self._find(match.group(1).split(','), 'Product ID', 'prices')
+        if path == 'prices/':
+            if 'product_id' in query:
+                return self._find(query['product_id'].split(','), 'Product ID', 'prices')
+            return self._respond({'prices': data.page(page_no), 'no_pages': data.pages})
+        if path.startswith('data_sources/'):
+            if 'id' in query:
+                return self._find(query['id'].split(','), 'id', 'data')
+            return self._respond({'data': data.page(page_no), 'no_pages': data.pages})
+        if path == 'data_sources_info/':
+            return self._respond(data.info())
+        if path.startswith('data_sources_info/'):
+            info = data.info()
+            name = path.split('/', 1)[1]
+            if name not in info:
+                return self._respond({'error': 'Unknown data source %s' % name}, 404)
+            return self._respond({name: info[name]})
+        if path.startswith('geographies/'):
+            return self._respond({'data': [{'name': g, 'currency': 'GBP'} for g in GEOGRAPHIES]})
+        if path == 'currencies/':
+            return self._respond({'data': CURRENCIES})
+        return self._respond({'error': 'Unknown endpoint %s' % path}, 404)
+
+    def _find(self, ids, column, name):
+        """
+        Respond with the rows matching a list of ids, rows are numbered so no search is needed
+        """
+        rows = []
+        for pk in ids:
+            try:
+                i = int(pk[1:]) if column == 'Product ID' else int(pk) - 1
+            except ValueError:
+                continue
+            if 0 <= i < self.data.total:
+                rows.append(self.data.row(i))
+        if not rows:
+            return self._respond({'error': 'Not found'}, 404)
+        return self._respond({name: rows})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class RequestCounter(object):
+    def __init__(self):
+        """
+        Number of requests the server has handled, by method
+        """
+        self.counts = dict()
+        self._lock = threading.Lock()
+
+    def add(self, method):
+        with self._lock:
+            self.counts[method] = self.counts.get(method, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict()
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockServer(object):
+    def __init__(self, pages=10, rows=100, width=10, latency=0, port=0):
+        """
+        Mock BlackCurve API running on a background thread
+        :param pages: number of pages of prices & data source rows
+        :param rows: rows per page
+        :param width: number of extra columns per row
+        :param latency: seconds every response is delayed by
+        :param port: Optional: port to listen on, a free one if 0
+        """
+        self.data = MockData(pages, rows, width)
+        self.counter = RequestCounter()
+        handler = type('Handler', (MockHandler,), dict(data=self.data, latency=latency, counter=self.counter))
+        self.server = ThreadingServer(('127.0.0.1', port), handler)
+        self._thread = None
+
+    @property
+    def domain(self):
+        """
+        Value for BlackCurveAPI(domain=...)
+        """
+        return 'http://127.0.0.1:%s/api/' % self.server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = MockServer(args.pages, args.rows, args.width, args.latency, args.port)
+    print('Serving %s' % server.domain)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
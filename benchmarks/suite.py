@@ -0,0 +1,245 @@
+"""
+Benchmark scenarios run against the local mock server
+
+    $ PYTHONPATH=. python benchmarks/suite.py [--pages 20] [--rows 500] [--width 10] [--latency 0.01]
+                                              [--repeat 3] [--only all,find] [--transport requests]
+                                              [--json results.json]
+
+Every scenario reports its best & median wall time, the requests it made, rows/s, request latency
+percentiles and its peak memory (measured with tracemalloc in a separate, untimed run)
+"""
+import argparse
+import collections
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.extract import ShardedExtractor
+from blackcurve.metrics import MetricsCollector
+from blackcurve.transport import TRANSPORTS
+
+from mock_server import MockServer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# name -> function(client, server data) returning the number of rows handled
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(name):
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+@scenario('all')
+def all_pages(bc, data):
+    return len(list(bc.data_sources('Sales History').all()))
+
+
+@scenario('all_prefetch')
+def all_prefetch(bc, data):
+    return len(list(bc.data_sources('Sales History').all(prefetch=8)))
+
+
+@scenario('all_compact')
+def all_compact(bc, data):
+    return len(list(bc.data_sources('Sales History').all(prefetch=8, compact=True)))
+
+
+@scenario('iter_rows')
+def iter_rows(bc, data):
+    return sum(1 for _ in bc.data_sources('Sales History').all().iter_rows(compact=True))
+
+
+@scenario('export')
+def export_csv(bc, data):
+    path = os.path.join(tempfile.gettempdir(), 'blackcurve-benchmark.csv')
+    try:
+        return bc.data_sources('Sales History').export(path, prefetch=8)
+    finally:
+        os.remove(path)
+
+
+@scenario('extract')
+def extract(bc, data):
+    return sum(len(batch) for batch in ShardedExtractor(bc, processes=4).extract(['Sales History']))
+
+
+@scenario('prices')
+def prices(bc, data):
+    return len(list(bc.prices().all(prefetch=8)))
+
+
+@scenario('pages')
+def page_range(bc, data):
+    finish = max(1, data.pages // 2)
+    return len(list(bc.data_sources('Sales History').pages(1, finish)))
+
+
+@scenario('find')
+def find_storm(bc, data):
+    count = min(200, data.total)
+    for pk in range(1, count + 1):
+        bc.data_sources('Sales History').find(pk)
+    return count
+
+
+@scenario('find_hot')
+def find_hot(bc, data):
+    # many handlers looking up the same few ids at once, identical requests in flight are coalesced
+    ids = ['P%06d' % (i % 5) for i in range(400)]
+    executor = ThreadPoolExecutor(max_workers=16)
+    try:
+        return len(list(executor.map(lambda pk: bc.prices().find(pk), ids)))
+    finally:
+        executor.shutdown()
+
+
+@scenario('find_many')
+def find_many(bc, data):
+    count = min(2000, data.total)
+    return len(bc.data_sources('Sales History').find_many(range(1, count + 1), max_workers=8))
+
+
+@scenario('batch_create')
+def batch_create(bc, data):
+    rows = [data.row(i) for i in range(min(5000, data.total))]
+    bc.data_sources('Sales History').batch_create(rows, chunk_size=500, max_workers=4)
+    return len(rows)
+
+
+@scenario('save')
+def save_edited(bc, data):
+    rows = list(bc.data_sources('Sales History').page(1))[:100]
+    for row in rows:
+        row.price = row.price + 1
+        row.save()
+    return len(rows)
+
+
+@scenario('save_batch')
+def save_batch(bc, data):
+    rows = list(bc.data_sources('Sales History').all())
+    with bc.batch(chunk_size=500, max_workers=4):
+        for row in rows:
+            row.price = row.price + 1
+            row.save()
+    return len(rows)
+
+
+def client(server, transport=None):
+    """
+    BlackCurveAPI pointed at the mock server
+    :param server: MockServer
+    :param transport: Optional: transport name ('requests')
+    :return: BlackCurveAPI
+    """
+    bc = BlackCurveAPI('benchmark', pool_maxsize=16, transport=transport, domain=server.domain)
+    bc.get_access_token('key', 'secret')
+    return bc
+
+
+def run(name, func, server, repeat, transport=None):
+    """
+    Run a scenario
+    :param name: scenario name
+    :param func: scenario function
+    :param server: MockServer
+    :param repeat: number of timed runs
+    :param transport: Optional: transport name ('requests')
+    :return: dict of results
+    """
+    times = []
+    metrics = MetricsCollector()
+    rows = 0
+    server.counter.reset()
+    for _ in range(repeat):
+        bc = client(server, transport)
+        bc.add_hook(metrics)
+        gc.collect()
+        started = timer()
+        rows = func(bc, server.data)
+        times.append(timer() - started)
+        bc.close()
+    requests = server.counter.total // repeat
+    latency = metrics.summary()['latency']
+
+    peak = None
+    if tracemalloc is not None:
+        bc = client(server, transport)
+        gc.collect()
+        tracemalloc.start()
+        func(bc, server.data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        bc.close()
+
+    times.sort()
+    return collections.OrderedDict([
+        ('scenario', name),
+        ('best', times[0]),
+        ('median', times[len(times) // 2]),
+        ('requests', requests),
+        ('rows', rows),
+        ('rows_per_second', rows / times[0] if times[0] else None),
+        ('p50_ms', latency['p50'] * 1000 if latency['p50'] is not None else None),
+        ('p95_ms', latency['p95'] * 1000 if latency['p95'] is not None else None),
+        ('p99_ms', latency['p99'] * 1000 if latency['p99'] is not None else None),
+        ('peak_mb', peak / 1024.0 / 1024.0 if peak is not None else None),
+    ])
+
+
+def print_results(results):
+    # column, width, format of the value
+    columns = [('scenario', 13, '%s'), ('best', 9, '%.3f'), ('median', 9, '%.3f'), ('requests', 9, '%d'),
+               ('rows', 8, '%d'), ('rows_per_second', 16, '%.0f'), ('p50_ms', 8, '%.2f'), ('p95_ms', 8, '%.2f'),
+               ('p99_ms', 8, '%.2f'), ('peak_mb', 8, '%.2f')]
+    print(' '.join(name.rjust(width) if i else name.ljust(width) for i, (name, width, _) in enumerate(columns)))
+    for result in results:
+        values = ['-' if result[name] is None else fmt % result[name] for name, _, fmt in columns]
+        print(' '.join(value.rjust(width) if i else value.ljust(width)
+                       for i, (value, (_, width, _)) in enumerate(zip(values, columns))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds every response is delayed by')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='comma separated scenarios to run (%s)' % ', '.join(SCENARIOS))
+    parser.add_argument('--transport', default='requests', choices=sorted(TRANSPORTS))
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(unknown))
+
+    results = []
+    with MockServer(args.pages, args.rows, args.width, args.latency) as server:
+        for name in names:
+            results.append(run(name, SCENARIOS[name], server, args.repeat, args.transport))
+            sys.stdout.flush()
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(settings=vars(args), results=results), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,947 @@
+import asyncio
+import collections
+import contextvars
+
+import aiohttp
+
+from blackcurve import columnar, export, serialisation
+from blackcurve.api import APIException, BlackCurveAPI, DataFunction, DataHolder, SaveBatch
+from blackcurve.auth import token_expired
+from blackcurve.coalesce import request_key
+from blackcurve.metrics import timer
+from blackcurve.streaming import JSONArrayStream
+from blackcurve.throttle import OVERLOAD_STATUSES
+from blackcurve.transport import FakeTransport
+
+
+def async_data_func_called_dec(evaluated=False):
+    """
+    A decorator for the awaitable data functions in the AsyncDataHolder class
+    :param evaluated: if the function will be immediately evaluated or not (False)
+    :return: DataFunction
+    """
+    def decorator(func):
+        async def wrapper(self, *args, **kwargs):
+            """ Log the function call """
+            self._data_function_called_dict[func.__name__] = True
+            output = await func(self, *args, **kwargs)
+            if evaluated:
+                output._data_function_evaluated_dict[func.__name__] = True
+                self._data_function_evaluated_dict[func.__name__] = True
+                for i in output._pages_queryset:
+                    if isinstance(i, DataHolder):
+                        i._data_function_evaluated_dict[func.__name__] = True
+                for i in self._pages_queryset:
+                    if isinstance(i, DataHolder):
+                        i._data_function_evaluated_dict[func.__name__] = True
+            return output
+        wrapper.__doc__ = func.__doc__
+        return DataFunction(wrapper, func.__name__)
+    return decorator
+
+
+async def scheduled_call(scheduler, send, method, errors=()):
+    """
+    Awaitable version of RequestScheduler.call(), waiting for the rate limit, a slot & retries without blocking the
+    event loop
+    :param scheduler: RequestScheduler
+    :param send: function returning an awaitable for the response
+    :param method: http method
+    :param errors: exception types raised for dropped connections / timeouts
+    :return: response, the last one received if every retry failed
+    """
+    attempt = 0
+    while True:
+        await acquire_slot(scheduler)
+        overloaded = False
+        try:
+            response = await send()
+        except errors as e:
+            wait = scheduler.retry_delay(method, attempt, error=e)
+            if wait is None:
+                raise
+        else:
+            overloaded = response.status_code in OVERLOAD_STATUSES
+            wait = scheduler.retry_delay(method, attempt, response)
+            if wait is None:
+                return response
+        finally:
+            scheduler.release(overloaded)
+        await asyncio.sleep(wait)
+        attempt += 1
+
+
+async def acquire_slot(scheduler):
+    """
+    Await RequestScheduler.acquire_async(), giving the slot straight back if the task is cancelled once it was taken
+    :param scheduler: RequestScheduler
+    """
+    acquired = scheduler.acquire_async()
+    try:
+        await acquired
+    except asyncio.CancelledError:
+        if acquired.done() and not acquired.cancelled():
+            scheduler.release()
+        raise
+
+
+class AsyncRequestCoalescer(object):
+    def __init__(self):
+        """
+        asyncio version of RequestCoalescer: while a request is in flight, the same request from other tasks awaits
+        it and gets its result (or exception) instead of being sent again
+        The request runs as its own task, so cancelling one of the tasks waiting for it doesn't cancel it for the rest
+        """
+        self._calls = dict()
+
+    async def call(self, key, func):
+        """
+        Await func(), unless a call with the same key is already in flight, then await that
+        :param key: request key
+        :param func: function returning an awaitable making the request
+        :return: (result, Boolean if the result was shared from a call already in flight)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def __len__(self):
+        """
+        :return: number of requests in flight
+        """
+        return len(self._calls)
+
+
+class AsyncResponse(object):
+    __slots__ = ('status_code', 'headers', 'text')
+
+    def __init__(self, status_code, headers, text):
+        """
+        Response read from an AsyncSession, with the same attributes as a requests Response
+        :param status_code: http status
+        :param headers: http headers
+        :param text: response body
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    async def iter_chunks(self, chunk_size=65536):
+        """
+        :param chunk_size: bytes at a time
+        :return: async iterator of bytes of the body, which has already been read
+        """
+        content = self.text.encode('utf-8')
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class AsyncStreamedResponse(object):
+    def __init__(self, response):
+        """
+        Response of an AsyncSession whose body hasn't been read yet
+        :param response: aiohttp ClientResponse
+        """
+        self._response = response
+        self.status_code = response.status
+        self.headers = response.headers
+
+    async def iter_chunks(self, chunk_size=65536):
+        """
+        :param chunk_size: bytes read from the connection at a time
+        :return: async iterator of bytes of the body as it is received
+        """
+        async for chunk in self._response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    def close(self):
+        """
+        Give the connection back to the pool, a connection with some of the body left unread is closed instead
+        """
+        self._response.release()
+
+
+class AsyncSession(object):
+    # errors worth retrying the request for
+    errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+    def __init__(self, limit, limit_per_host, keep_alive=True, timeout=None):
+        """
+        Lazily created aiohttp session shared by an AsyncBlackCurveAPI and every query made from it
+        :param limit: max number of open connections
+        :param limit_per_host: max number of open connections per host
+        :param keep_alive: reuse connections between requests (True)
+        :param timeout: Optional: request timeout in seconds, or a (connect, read) tuple
+        """
+        self._connector_kwargs = dict(limit=limit, limit_per_host=limit_per_host, force_close=not keep_alive)
+        if isinstance(timeout, tuple):
+            self._timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            self._timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        self._session = None
+
+    def _get_session(self):
+        """
+        The aiohttp session has to be created inside a running event loop, so it is built on the first request
+        :return: aiohttp ClientSession
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self._connector_kwargs),
+                                                  timeout=self._timeout)
+        return self._session
+
+    async def request(self, method, url, headers=None, data=None, stream=False):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: don't read the body of a successful response yet (False), error responses are
+        always read so their status can be checked
+        :return: AsyncResponse, or AsyncStreamedResponse when streaming
+        """
+        response = await self._get_session().request(method, url, headers=headers, data=data)
+        if stream and response.status < 400:
+            return AsyncStreamedResponse(response)
+        async with response:
+            return AsyncResponse(response.status, response.headers, await response.text())
+
+    async def close(self):
+        """
+        Close the pooled connections
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncFakeTransport(FakeTransport):
+    """
+    Awaitable version of FakeTransport, for testing AsyncBlackCurveAPI in-process
+    """
+
+    async def request(self, method, url, headers=None, data=None, stream=False):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: unused
+        :return: AsyncResponse
+        """
+        response = FakeTransport.request(self, method, url, headers, data)
+        return AsyncResponse(response.status_code, response.headers, response.text)
+
+    async def close(self):
+        pass
+
+
+class AsyncDataHolder(DataHolder):
+    """
+    Awaitable version of DataHolder, rows and pages are consumed with async for
+    """
+
+    async def _send(self, params, stream=False, event=None):
+        """
+        Send the request through the api's transport & request scheduler
+        :param params: http parameters
+        :param stream: Optional: don't read the response body yet (False)
+        :param event: Optional: RequestEvent to record the request in
+        :return: AsyncResponse, or AsyncStreamedResponse when streaming
+        """
+        transport = self._api.transport
+        scheduler = self._api.scheduler
+        credentials = self._api.credentials
+
+        async def send():
+            request_params = params
+            if credentials.access_token is None and credentials.can_refresh:
+                request_params = await self._api._refresh_access_token(request_params)
+            response = await transport.request(stream=stream, **request_params)
+            if credentials.can_refresh and token_expired(response):
+                # held here until the token has been refreshed, then sent again with it
+                response.close()
+                request_params = await self._api._refresh_access_token(request_params)
+                response = await transport.request(stream=stream, **request_params)
+            return response
+
+        if event is not None:
+            send = self._count_attempts(send, event)
+            started = timer()
+        if scheduler is None:
+            response = await send()
+        else:
+            response = await scheduled_call(scheduler, send, params['method'],
+                                            getattr(transport, 'errors', AsyncSession.errors))
+        if event is not None:
+            self._record_response(event, params, response, started, stream)
+        self._check_status(response)
+        return response
+
+    async def _get_response(self, params, event=None):
+        """
+        Make the request, going through the api's response cache if it has one
+        When hooks are registered the request is reported to them, unless the caller passes its own event (it is
+        then only reported here if the request fails)
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
+        :return: response
+        """
+        with self._reported(event) as event:
+            return await self._coalesce_response(params, event)
+
+    async def _coalesce_response(self, params, event=None):
+        """
+        Make a GET request, sharing the decoded response of an identical request that is already in flight
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
+        :return: decoded response
+        """
+        coalescer = self._api.coalescer
+        if coalescer is None or params['method'] != 'GET':
+            return await self._fetch_response(params, event)
+        started = timer()
+        data, shared = await coalescer.call(request_key(params), lambda: self._fetch_response(params, event))
+        self._record_coalesced(event, shared, started)
+        return data
+
+    async def _fetch_response(self, params, event=None):
+        """
+        Make the request & decode the response
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
+        :return: response
+        """
+        ttl, entry = self._cache_lookup(params, event)
+        if entry is not None and entry.fresh:
+            return entry.value
+        if ttl is None:
+            try:
+                return self._decode((await self._send(params, event=event)).text, event)
+            finally:
+                self._invalidate_cache(params)
+        response = await self._send(self._build_conditional_params(params, entry), event=event)
+        return self._store_response(self._api.cache, ttl, params, entry, response, event)
+
+    async def _fetch_page(self, page_no=None, event=None):
+        """
+        Request a single page without touching this object
+        :param page_no: Optional: page to request, defaults to the current page
+        :param event: Optional: RequestEvent to record the request in, reported once the page has been built
+        :return: decoded response
+        """
+        return await self._get_response(self._build_request_params(page_no=page_no), event)
+
+    async def _process_request(self, new_instance=False, data=None, event=None):
+        """
+        Update this object with the data
+        :param new_instance: If we need a new instance or not
+        :param data: Optional: an already fetched response, otherwise the current page is requested
+        :param event: Optional: RequestEvent the data was fetched with, reported once the rows have been built
+        :return: self
+        """
+        if data is None:
+            event = self._new_event(self._page_no)
+            data = await self._fetch_page(event=event)
+        return DataHolder._process_request(self, new_instance, data, event)
+
+    async def iter_rows(self, raw=False, compact=False, chunk_size=65536):
+        """
+        Stream the rows of every requested page without keeping them on this object, each response is decoded as
+        it is received so only the row being read is held in memory
+        :param raw: Optional: yield the decoded dicts instead of AsyncDataHolder objects, or (name, dict) pairs for
+        data_sources_info (False)
+        :param compact: Optional: yield read-only Row objects instead of AsyncDataHolder objects (False)
+        :param chunk_size: Optional: bytes read from the connection at a time (65536)
+        :return: async iterator of rows
+        """
+        async for row in self._iter_raw_rows(chunk_size):
+            if raw:
+                yield row
+            elif isinstance(row, tuple):
+                yield self._build_child(row[1], row[0])
+            elif compact:
+                yield self._build_row(row)
+            else:
+                yield self._build_child(row)
+
+    async def _iter_raw_rows(self, chunk_size=65536):
+        """
+        Async generator of the decoded rows of every requested page, streamed one page at a time
+        :param chunk_size: bytes read from the connection at a time
+        :return: async iterator of rows
+        """
+        page_no = self._first_stream_page()
+        completed = 0
+        while page_no is not None:
+            stream = JSONArrayStream(self._api.response_data_name)
+            async for row in self._stream_page(stream, page_no, chunk_size):
+                yield row
+            completed += 1
+            page_no = self._complete_stream_page(stream, page_no, completed)
+
+    async def _iter_raw_pages(self, prefetch=1, cursor=None):
+        """
+        Async generator of the decoded rows of every requested page, a list per page in page order, without building
+        objects or keeping the rows on this object. Once the page count is known up to prefetch pages are requested
+        concurrently, so only the pages in flight are held in memory
+        :param prefetch: number of pages to request at once
+        :param cursor: Optional: Cursor to start from
+        :return: async iterator of (page number, list of rows, Boolean if it is the last page)
+        """
+        page_no, finish = self._raw_pages_range(cursor)
+        if finish is None:
+            # the first page says how many there are
+            event = self._new_event(page_no)
+            data = await self._fetch_page(page_no, event)
+            finish = self._read_no_pages(data)
+            yield page_no, self._page_rows(data, event), finish is None or page_no >= finish
+            if finish is None:
+                return
+            page_no += 1
+        in_flight = collections.deque()
+        try:
+            while page_no <= finish or in_flight:
+                page_no = self._queue_pages(in_flight, page_no, finish, prefetch, self._submit_page)
+                number, event, future = in_flight.popleft()
+                yield number, self._page_rows(await future, event), number == finish
+        finally:
+            self._cancel_pages(in_flight)
+
+    @async_data_func_called_dec()
+    async def export(self, path, format=None, prefetch=None, columns=None):
+        """
+        Write the rows of every requested page straight to a file without keeping them in memory, pages are
+        requested concurrently but written in page order. With a checkpoint or resume() a csv / ndjson export carries on
+        from the cursor, appending to the file
+        :param path: file path
+        :param format: Optional: 'csv', 'ndjson' or 'parquet' (requires pyarrow, a row group per page), from the file
+        extension by default
+        :param prefetch: Optional: number of pages requested at once (the prefetch passed to all() / pages(), or 4)
+        :param columns: Optional: columns to write, by default every column of the first row (csv & parquet) or of
+        each row (ndjson)
+        :return: number of rows written
+        """
+        format = export.export_format(path, format)
+        cursor = self._start_export(format) if self._needs_evaluating else None
+        if cursor is not None and cursor.done:
+            return 0
+        column_types = await self._column_types() if format == 'parquet' else None
+        writer = self._open_export(path, format, columns, column_types, cursor)
+        try:
+            if self._needs_evaluating:
+                completed = 0
+                async for page_no, rows, last_page in self._iter_raw_pages(prefetch or self._prefetch or 4, cursor):
+                    completed += 1
+                    self._write_export_page(writer, page_no, rows, last_page, completed)
+            else:
+                writer.write(self._fetched_rows())
+        finally:
+            writer.close()
+        return writer.count
+
+    async def to_numpy(self):
+        """
+        Get the rows as a numpy structured array, one typed field per column (requires numpy)
+        :return: numpy structured array
+        """
+        return columnar.to_numpy(*await self._collect_columns())
+
+    async def to_pandas(self):
+        """
+        Get the rows as a pandas DataFrame with typed columns (requires pandas)
+        :return: pandas DataFrame
+        """
+        return columnar.to_pandas(*await self._collect_columns())
+
+    async def to_arrow(self):
+        """
+        Get the rows as a pyarrow Table with typed columns (requires pyarrow)
+        :return: pyarrow Table
+        """
+        return columnar.to_arrow(*await self._collect_columns())
+
+    async def _collect_columns(self):
+        """
+        Build the columns straight from the decoded rows, rows that have already been fetched are reused, otherwise
+        the pages are streamed without building an object per row
+        :return: OrderedDict of column name: list of values, dict of column name: kind
+        """
+        if self._needs_evaluating:
+            rows = [self._row_values(row) async for row in self._iter_raw_rows()]
+        else:
+            rows = self._fetched_rows()
+        return self._build_columns(rows, await self._column_types())
+
+    async def _column_types(self):
+        """
+        Get the column types of the data source from data_sources_info
+        :return: dict of column name: type (empty for the other endpoints)
+        """
+        if not self._api.endpoint.startswith('data_sources/'):
+            return dict()
+        try:
+            data = await self._get_response(self._build_column_types_params())
+        except APIException:
+            return dict()
+        return self._read_column_types(data)
+
+    async def _stream_page(self, stream, page_no, chunk_size):
+        """
+        Request a single page and decode it as it is received
+        :param stream: JSONArrayStream
+        :param page_no: page to request
+        :param chunk_size: bytes read from the connection at a time
+        :return: async iterator of rows
+        """
+        params = self._build_request_params(page_no=page_no)
+        event = self._new_event(page_no)
+        response = await self._send(params, stream=True, event=event)
+        with self._reading(response, event):
+            async for chunk in response.iter_chunks(chunk_size):
+                for row in self._check_stream(stream, self._feed(stream, chunk, event)):
+                    yield row
+            for row in self._check_stream(stream, self._feed(stream, None, event)):
+                yield row
+
+    @async_data_func_called_dec(True)
+    async def page(self, number):
+        """
+        Get a single page of data
+        :param number: page number
+        :return: data
+        """
+        self._page_no = 1
+        self._max_page = None
+        self._page_no = number
+        if self._data_function_called_dict['all'] and not self._data_function_evaluated_dict['all']:
+            return self._pages_queryset[0]
+        return await self._process_request()
+
+    @async_data_func_called_dec(True)
+    async def find(self, pk):
+        """
+        Find a single object
+        :param pk: ID for the object
+        :return: object
+        """
+        self._pages_queryset = []
+        self._page_no = 1
+        self._pk = pk
+        return await self._process_request()
+
+    @async_data_func_called_dec()
+    async def find_many(self, ids, max_workers=4, max_url_length=2000, compact=False):
+        """
+        Find several objects at once, the ids are sent as a filter in as few requests as the url length allows
+        If the endpoint ignores the filter, falls back to one find() per id with max_workers in flight at once
+        Ids that aren't found are reported in the result's missing list rather than raised
+        :param ids: list (or any iterable) of ids, Product IDs for prices
+        :param max_workers: Optional: number of requests in flight at once (4)
+        :param max_url_length: Optional: longest url sent (2000)
+        :param compact: Optional: return read-only Row objects instead of AsyncDataHolder objects (False)
+        :return: FoundRows of id: row, id: list of rows for prices
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        wanted = collections.OrderedDict((str(pk), pk) for pk in ids)
+        found = dict()
+        remaining = list(wanted.values())
+        chunks = self._id_chunks(remaining, max_url_length)
+        if chunks:
+            # check the endpoint understands the filter before sending the rest of the chunks
+            try:
+                rows = await self._find_chunk(chunks[0], compact)
+            except APIException:
+                rows = None
+            if rows is not None:
+                results = [rows] + list(await asyncio.gather(*[bounded(self._find_chunk(chunk, compact))
+                                                               for chunk in chunks[1:]]))
+                remaining = self._add_chunk_results(found, chunks, results)
+        results = await asyncio.gather(*[bounded(self._find_one(pk, compact)) for pk in remaining])
+        return self._build_found_rows(wanted, found, self._add_single_results(found, results))
+
+    async def _find_chunk(self, chunk, compact):
+        """
+        Request every page of the rows matching a chunk of ids
+        :param chunk: list of ids
+        :param compact: build read-only Row objects
+        :return: list of rows, None if a row doesn't match any of the ids (the endpoint ignored the filter)
+        """
+        holder, matches = self._chunk_lookup(chunk, compact)
+        rows = []
+        page_no = 1
+        while page_no <= (holder._no_pages or 1):
+            page_rows = (await holder._process_request(True, await holder._fetch_page(page_no)))._pages_queryset
+            if not matches(page_rows):
+                return None
+            rows += page_rows
+            page_no += 1
+        return rows
+
+    async def _find_one(self, pk, compact):
+        """
+        Request the rows of a single id
+        :param pk: id
+        :param compact: build read-only Row objects
+        :return: (id, list of rows, APIException or None)
+        """
+        holder = self._lookup_holder(compact)
+        holder._pk = pk
+        try:
+            return pk, (await holder._process_request(True, await holder._fetch_page(1)))._pages_queryset, None
+        except APIException as e:
+            return pk, [], e
+
+    @async_data_func_called_dec()
+    async def delete(self, attribute=None):
+        """
+        Deletes a Data Object
+        :param attribute: Optional: for deleting a single value
+        :return: self
+        """
+        await self._get_response(self._build_delete_params(attribute))
+        return self
+
+    @async_data_func_called_dec()
+    async def create(self, *args, **kwargs):
+        """
+        Create a new data object
+        :param args: Object data
+        :param kwargs: Object data
+        :return: self
+        """
+        if args:
+            if len(args) > 1:
+                raise TypeError('Too many rows, use bulk_create() to add multiple rows at once')
+            args = args[0]
+            if not isinstance(args, dict):
+                raise TypeError('arguments must be a dictionary')
+            data = args
+        else:
+            data = kwargs
+        if not data:
+            raise TypeError('create() takes at least one argument')
+        self._update_query = data
+        return await self.save(True)
+
+    @async_data_func_called_dec()
+    async def batch_create(self, object_list, chunk_size=500, max_workers=1):
+        """
+        Create multiple data objects at once, split into chunks that are sent concurrently
+        Chunks that fail don't stop the others, they are raised together in a BatchCreateException afterwards
+        :param object_list: list (or any iterable) of objects to be created
+        :param chunk_size: Optional: number of objects sent per request (500)
+        :param max_workers: Optional: number of chunks in flight at once (1)
+        :return: self
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def send(chunk_no, rows):
+            async with semaphore:
+                return await self._send_chunk(chunk_no, rows)
+
+        results = await asyncio.gather(*[send(*chunk) for chunk in
+                                         enumerate(self._iter_chunks(object_list, chunk_size))])
+        return self._check_batch(results)
+
+    async def _send_chunk(self, chunk_no, rows):
+        """
+        Send a chunk of objects to be created
+        :param chunk_no: position of the chunk in the batch
+        :param rows: list of objects
+        :return: list of (chunk number, rows, exception) for the rows that failed
+        """
+        failed = []
+        for request_rows, params in self._build_chunk_params(rows):
+            try:
+                await self._get_response(params)
+            except Exception as e:
+                failed.append((chunk_no, request_rows, e))
+        return failed
+
+    @async_data_func_called_dec()
+    async def save(self, create=False):
+        """
+        Save data objects
+        :param create: Whether or not to create a new entry or update an existing one
+        :return: self
+        """
+        batch = self._api._batch_state.batch
+        if batch is not None:
+            batch.add(self, self._build_save_data(create))
+            return self
+
+        params = self._build_save_params(create)
+        if params is not None:
+            await self._get_response(params)
+
+        # See if there are any deleted attributes
+        deleted = self._get_deleted_attributes()
+        if deleted and self._api.endpoint == 'data_sources_info/':
+            await self.delete(list(deleted.keys()))
+        self._mark_saved()
+        return self
+
+    async def iter_pages(self):
+        """
+        Async generator for evaluating the requests and updating the object
+        :return: async iterator for results pages
+        """
+        completed = 0
+        last_page = not self._start_pages()
+        while not last_page:
+            page_no = self._page_no
+            obj = await self._process_request(True)
+            last_page = self._record_page(obj)
+            yield obj
+            completed += 1
+            self._complete_page(page_no, completed, last_page, self._no_pages)
+            if self._prefetches(last_page):
+                async for obj in self._iter_prefetched_pages(self._page_no, self._no_pages, completed):
+                    yield obj
+                return
+
+    async def _iter_prefetched_pages(self, start, finish, completed=0):
+        """
+        Async generator that requests a range of pages concurrently but yields them in page order
+        :param start: first page to request
+        :param finish: last page to request
+        :param completed: number of pages already consumed by this iteration
+        :return: async iterator for results pages
+        """
+        in_flight = collections.deque()
+        next_page = start
+        try:
+            while next_page <= finish or in_flight:
+                # keep at most one request per worker queued ahead of the consumer
+                next_page = self._queue_pages(in_flight, next_page, finish, self._prefetch, self._submit_page)
+                page_no, event, future = in_flight.popleft()
+                obj = await self._process_request(True, await future, event)
+                self._page_no = page_no
+                self._keep_page(obj)
+                yield obj
+                completed += 1
+                self._complete_page(page_no, completed, page_no == finish, self._no_pages)
+            self._finish_pages()
+        finally:
+            self._cancel_pages(in_flight)
+
+    def _submit_page(self, page_no, event):
+        """
+        Start requesting a page in the background, for _queue_pages()
+        :param page_no: page to request
+        :param event: RequestEvent or None
+        :return: asyncio Future of the decoded page
+        """
+        return asyncio.ensure_future(self._fetch_page(page_no, event))
+
+    async def __aiter__(self):
+        if self._needs_evaluating:
+            async for p in self.iter_pages():
+                for i in p._pages_queryset:
+                    yield i
+        else:
+            for i in DataHolder.__iter__(self):
+                yield i
+
+    def __iter__(self):
+        if self._needs_evaluating:
+            raise TypeError('%s has not been fetched yet, use async for' % self._object_name)
+        return DataHolder.__iter__(self)
+
+
+class TaskBatchState(object):
+    def __init__(self):
+        """
+        Batch open in the current asyncio task, what threading.local is to the sync client: a batch opened in one task
+        doesn't catch the saves awaited by another
+        """
+        self._batch = contextvars.ContextVar('batch', default=None)
+
+    @property
+    def batch(self):
+        return self._batch.get()
+
+    @batch.setter
+    def batch(self, batch):
+        self._batch.set(batch)
+
+
+class AsyncSaveBatch(SaveBatch):
+    """
+    Unit of work for saving edited objects, use through "async with AsyncBlackCurveAPI.batch()"
+    """
+
+    def __enter__(self):
+        raise TypeError('use "async with" with AsyncBlackCurveAPI.batch()')
+
+    async def __aenter__(self):
+        self._open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        batch = self._close()
+        if batch is not None and exc_type is None:
+            await batch.flush()
+
+    async def _send(self, request):
+        """
+        Send one grouped request
+        :param request: (chunk number, (list of (AsyncDataHolder, data), request params))
+        :return: (chunk number, entries, exception or None)
+        """
+        chunk_no, (entries, params) = request
+        try:
+            await entries[0][0]._get_response(params)
+        except Exception as e:
+            return chunk_no, entries, e
+        return chunk_no, entries, None
+
+    async def flush(self):
+        """
+        Send every queued save
+        """
+        pending, self._pending = self._pending, list()
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def send(request):
+            async with semaphore:
+                return await self._send(request)
+
+        results = await asyncio.gather(*[send(request) for request in enumerate(self._build_requests(pending))])
+        for holder, deleted in self._saved(pending, results):
+            if deleted:
+                await holder.delete(list(deleted.keys()))
+            holder._mark_saved()
+        self._check_results(results)
+
+
+class AsyncBlackCurveAPI(BlackCurveAPI):
+    _data_holder_class = AsyncDataHolder
+
+    def __init__(self, subdomain, access_token=None, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=None, cache=None, scheduler=None, client_key=None, client_secret=None,
+                 coalesce=True, transport=None, domain=None):
+        """
+        asyncio version of BlackCurveAPI, every endpoint call returns an independent query sharing one
+        connection pool, so several queries can be awaited together with asyncio.gather
+        :param subdomain: Your BlackCurve subdomain (name of company usually)
+        :param access_token: Optional: API access token obtained
+        :param pool_connections: Optional: number of hosts to keep connections open for (10)
+        :param pool_maxsize: Optional: max number of connections kept open per host (10)
+        :param pool_block: Optional: unused, requests always wait for a free connection
+        :param keep_alive: Optional: reuse connections between requests (True)
+        :param timeout: Optional: request timeout in seconds, or a (connect, read) tuple
+        :param cache: Optional: ResponseCache for GET responses, writes invalidate the endpoint they touch
+        :param scheduler: Optional: RequestScheduler rate limiting & retrying requests, False to send requests
+        straight away without retrying them (a RequestScheduler with the default settings)
+        :param client_key: Optional: client key used to get & refresh the access token
+        :param client_secret: Optional: client secret used to get & refresh the access token
+        :param coalesce: Optional: identical GET requests made at the same time share one request & response (True)
+        :param transport: Optional: awaitable transport sending the requests, e.g. AsyncFakeTransport (an
+        AsyncSession built with the pool settings)
+        :param domain: Optional: base url of the API, e.g. a local stand-in server
+        ('https://<subdomain>.blackcurve.io/api/')
+        """
+        BlackCurveAPI.__init__(self, subdomain, access_token, pool_connections, pool_maxsize, pool_block, keep_alive,
+                               timeout, cache, scheduler, client_key, client_secret, coalesce, transport, domain)
+        self._batch_state = TaskBatchState()
+
+    @staticmethod
+    def _build_coalescer():
+        """
+        Build the coalescer shared by every query made through this object
+        :return: AsyncRequestCoalescer
+        """
+        return AsyncRequestCoalescer()
+
+    def _build_transport(self, transport, pool_connections, pool_maxsize, pool_block, keep_alive):
+        """
+        Build the transport shared by every query made through this object
+        :param transport: awaitable transport or None for an AsyncSession
+        :param pool_connections: number of hosts to keep connections open for
+        :param pool_maxsize: max number of connections kept open per host
+        :param pool_block: unused
+        :param keep_alive: reuse connections between requests
+        :return: AsyncSession
+        """
+        if transport is None:
+            return AsyncSession(pool_connections * pool_maxsize, pool_maxsize, keep_alive, self.timeout)
+        if isinstance(transport, str):
+            raise ValueError('AsyncBlackCurveAPI only has the aiohttp transport, pass an awaitable transport instead')
+        return transport
+
+    def batch(self, chunk_size=500, max_workers=1):
+        """
+        Group the save() calls awaited inside an async with block into bulk requests sent when the block exits, a
+        block inside another one joins it
+        :param chunk_size: Optional: number of rows sent per request (500)
+        :param max_workers: Optional: number of requests in flight at once (1)
+        :return: AsyncSaveBatch
+        """
+        return AsyncSaveBatch(self, chunk_size, max_workers)
+
+    async def close(self):
+        """
+        Close the pooled connections
+        """
+        await self.transport.close()
+
+    def __enter__(self):
+        raise TypeError('use "async with" with AsyncBlackCurveAPI')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def get_access_token(self, client_key, client_secret):
+        """
+        Obtains a new access token, this will change your token for the API credentials
+        The token is set on this object as access_token, the key & secret are kept to refresh it when it expires
+        :param client_key: Your client key
+        :param client_secret: Your client secret
+        """
+        self.credentials.client_key = client_key
+        self.credentials.client_secret = client_secret
+        self.access_token = await self._fetch_access_token(client_key, client_secret)
+        return self.access_token
+
+    async def _fetch_access_token(self, client_key, client_secret):
+        """
+        Request a new access token
+        :param client_key: Your client key
+        :param client_secret: Your client secret
+        :return: access token
+        """
+        params = self._build_access_token_params(client_key, client_secret)
+        return self._read_access_token(serialisation.loads((await self.transport.request(**params)).text))
+
+    async def _refresh_access_token(self, params):
+        """
+        Get a new access token for a request refused with an expired one, requests refused at the same time share
+        a single refresh
+        :param params: http parameters of the refused request
+        :return: the http parameters with the new token
+        """
+        credentials = self.credentials
+        if credentials.async_lock is None:
+            credentials.async_lock = asyncio.Lock()
+        async with credentials.async_lock:
+            if credentials.is_current(params['headers'].get('Authorization')):
+                self.access_token = await self._fetch_access_token(credentials.client_key, credentials.client_secret)
+        return dict(params, headers=dict(params['headers'], **self.headers))
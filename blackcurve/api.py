@@ -1,14 +1,29 @@
-import requests
-import json
 import sys
 import collections
-import datetime
+import contextlib
+import functools
+import itertools
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from blackcurve import columnar, export, serialisation
+from blackcurve.auth import Credentials, token_expired
+from blackcurve.checkpoint import Cursor
+from blackcurve.coalesce import RequestCoalescer, request_key
+from blackcurve.metrics import RequestEvent, timer
+from blackcurve.streaming import JSONArrayStream
+from blackcurve.throttle import RETRY_STATUSES, RequestScheduler
+from blackcurve.transport import RequestsTransport, build_transport
 
 # Python 2 & 3 compatible url-encoding
 if sys.version_info >= (3, 0):
-    from urllib.parse import urlencode
+    from urllib.parse import quote_plus, urlencode
 else:
-    from urllib import urlencode
+    from urllib import quote_plus, urlencode
+
+# read-only view of a dict, Python 2 has no such type so its queries hold a copy instead
+_read_only = getattr(types, 'MappingProxyType', dict)
 
 
 class APIException(Exception):
@@ -16,11 +31,165 @@ class APIException(Exception):
     pass
 
 
+class BatchException(APIException):
+    """ Raised when some of the chunks of a bulk request failed """
+    action = 'sent'
+
+    def __init__(self, failed):
+        """
+        :param failed: list of (chunk number, rows, exception) for the rows that failed
+        """
+        self.failed = failed
+        super(BatchException, self).__init__('%s rows in %s chunks failed to be %s' % (
+            sum(len(rows) for _, rows, _ in failed), len(set(chunk for chunk, _, _ in failed)), self.action))
+
+
+class BatchCreateException(BatchException):
+    """ Raised when some of the chunks sent by batch_create() failed """
+    action = 'created'
+
+
+class BatchSaveException(BatchException):
+    """ Raised when some of the saves grouped by BlackCurveAPI.batch() failed """
+    action = 'saved'
+
+
+class FoundRows(dict):
+    def __init__(self):
+        """
+        Rows returned by find_many(), id: row, or id: list of rows for endpoints where several rows share an id (a
+        price per geography), even when only one was found
+        missing holds the ids that weren't found, errors the API errors (by id) of single lookups that failed
+        """
+        super(FoundRows, self).__init__()
+        self.missing = []
+        self.errors = dict()
+
+
+def freeze_params(params):
+    """
+    Read-only copy of the request params of a query, list values become tuples, so the queries, rows & threads
+    sharing them can't change them
+    :param params: dict of request params or None
+    :return: read-only mapping
+    """
+    return _read_only(dict((key, tuple(value) if isinstance(value, list) else value)
+                           for key, value in (params or {}).items()))
+
+
+def map_bounded(func, items, max_workers):
+    """
+    Call func on every item using a thread pool, with at most max_workers items in flight at once
+    :param func: function taking a single item
+    :param items: iterable of items (only consumed as workers free up)
+    :param max_workers: number of worker threads
+    :return: list of results in the order of items
+    """
+    results = []
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = collections.deque()
+    try:
+        for item in items:
+            if len(in_flight) >= max_workers:
+                results.append(in_flight.popleft().result())
+            in_flight.append(executor.submit(func, item))
+        while in_flight:
+            results.append(in_flight.popleft().result())
+    finally:
+        executor.shutdown()
+    return results
+
+
+# column name -> attribute style name, shared by every object so each column name is only normalised once
+_attribute_names = dict()
+_MAX_ATTRIBUTE_NAMES = 10000
+
+
+def attribute_name(key):
+    """
+    Attribute style name of a column, e.g. 'Product ID' -> 'product_id'
+    :param key: column name
+    :return: attribute name
+    """
+    try:
+        return _attribute_names[key]
+    except KeyError:
+        name = key.replace(' ', '_').lower().strip()
+        if len(_attribute_names) < _MAX_ATTRIBUTE_NAMES:
+            _attribute_names[key] = name
+        return name
+
+
+# (DataHolder class, column names) -> DataHolder class of that column layout
+_holder_classes = dict()
+_MAX_HOLDER_CLASSES = 1000
+
+
+def _column_alias(name):
+    """
+    Property reading a column of a DataHolder by its column name, e.g. obj.Price for obj.price
+    A column that isn't loaded raises AttributeError, which hands the lookup on to DataHolder.__getattr__
+    :param name: attribute name of the column
+    :return: property
+    """
+    def get(obj):
+        try:
+            return obj.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+    return property(get)
+
+
+def holder_class(base, keys):
+    """
+    DataHolder class for a column layout, with a property for each column name that isn't already attribute style,
+    so obj.Price is found by the normal attribute lookup rather than a failed lookup followed by __getattr__
+    :param base: DataHolder class
+    :param keys: tuple of column names
+    :return: base, or a subclass of it when some of the column names aren't attribute style
+    """
+    base = getattr(base, '_layout_base', base)
+    cls = _holder_classes.get((base, keys))
+    if cls is None:
+        attributes = dict()
+        for key in keys:
+            name = attribute_name(key)
+            if key != name and not key.startswith('_') and not hasattr(base, key):
+                attributes[key] = _column_alias(name)
+        cls = base
+        if attributes:
+            attributes['_layout_base'] = base
+            cls = type(base.__name__, (base,), attributes)
+        if len(_holder_classes) < _MAX_HOLDER_CLASSES:
+            _holder_classes[(base, keys)] = cls
+    return cls
+
+
+class DataFunction(object):
+    def __init__(self, func, name):
+        """
+        Descriptor for the data functions, only the ones the current endpoint allows can be looked up
+        The check only runs when the function is looked up, not on every attribute access
+        :param func: wrapped function
+        :param name: name of the data function
+        """
+        self.func = func
+        self.__name__ = name
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if not instance._allows(self.__name__):
+            raise AttributeError('%s method not allowed' % self.__name__)
+        return types.MethodType(self.func, instance)
+
+
 def data_func_called_dec(evaluated=False):
     """
     A decorator for the data functions in the DataHolder class
     :param evaluated: if the function will be immediately evaluated or not (False)
-    :return: method
+    :return: DataFunction
     """
     def decorator(func):
         def wrapper(self, *args, **kwargs):
@@ -31,15 +200,31 @@ def data_func_called_dec(evaluated=False):
                 output._data_function_evaluated_dict[func.__name__] = True
                 self._data_function_evaluated_dict[func.__name__] = True
                 for i in output._pages_queryset:
-                    i._data_function_evaluated_dict[func.__name__] = True
+                    if isinstance(i, DataHolder):
+                        i._data_function_evaluated_dict[func.__name__] = True
                 for i in self._pages_queryset:
-                    i._data_function_evaluated_dict[func.__name__] = True
+                    if isinstance(i, DataHolder):
+                        i._data_function_evaluated_dict[func.__name__] = True
                 return output
             return func(self, *args, **kwargs)
-        return wrapper
+        wrapper.__doc__ = func.__doc__
+        return DataFunction(wrapper, func.__name__)
     return decorator
 
 
+def endpoint_method(func):
+    """
+    A decorator for the endpoint methods of BlackCurveAPI, the endpoint is set up on a new query sharing the transport,
+    hooks & credentials of the client, so the client itself never changes and can be used from several threads
+    :param func: endpoint method
+    :return: method returning the query
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return func(self._new_query(), *args, **kwargs)
+    return wrapper
+
+
 class DataHolder(object):
     def __init__(self, api):
         """
@@ -50,26 +235,43 @@ class DataHolder(object):
         self._request = self._api.current_request
 
         # has a data function been evaluated?
-        self._data_function_evaluated_dict = dict(all=False, page=False, pages=False, find=False, delete=False,
-                                                  save=False, create=False, batch_create=False)
-        self._data_function_called_dict = dict(all=False, page=False, pages=False, find=False, delete=False, save=False,
-                                               create=False, batch_create=False)
+        self._data_function_evaluated_dict = dict(all=False, page=False, pages=False, find=False, find_many=False,
+                                                  delete=False, save=False, create=False, batch_create=False,
+                                                  export=False)
+        self._data_function_called_dict = dict(all=False, page=False, pages=False, find=False, find_many=False,
+                                               delete=False, save=False, create=False, batch_create=False,
+                                               export=False)
 
         # page info (multi & single page object)
         self._page_no = 1
         self._max_page = None
         self._no_pages = None
+        self._prefetch = None
+        self._compact = False
+        self._row_schemas = dict()
+        self._checkpoint = None
+        self._resume_cursor = None
+        self._cursor = None
 
         # id / pk of the item (single item object)
         self._pk = None
+        # filters added on top of the endpoint's params
+        self._extra_params = dict()
 
         # object data storage
         self._pages_queryset = list()
         self._query = dict()
 
+        # lazy hash indexes of the rows (multi item object)
+        self._index_columns = list()
+        self._indexes = dict()
+        self._indexed_rows = 0
+
         # data attribute changes storage
         self._update_query = dict()
         self._attribute_map = dict()
+        self._changed = set()
+        self._deleted = set()
 
         self._data_source = None
         self._object_name = self._api.object_name
@@ -77,29 +279,15 @@ class DataHolder(object):
     @staticmethod
     def build_json(data, recursion=False):
         """
-        Builds a JSON string from a dictionary / list
+        Builds a JSON string from a dictionary / list in a single pass of the JSON engine, dates, datetimes,
+        Decimals (as strings, so they keep every digit) & NumPy scalars are encoded as the API expects them
         :param data: Dict / List
-        :param recursion: Boolean if it is a recursive call or not
+        :param recursion: Optional: return the data with those values encoded instead of a JSON string (False)
         :return: JSON String
         """
-        list_output = list()
-        dict_output = dict()
-
-        if isinstance(data, list):
-            for i in data:
-                list_output.append(DataHolder.build_json(i, True))
-            return list_output if recursion else json.dumps(list_output)
-        elif isinstance(data, dict):
-            for k, v in data.items():
-                dict_output[k] = DataHolder.build_json(v, True)
-            return dict_output if recursion else json.dumps(dict_output)
-        else:
-            if isinstance(data, datetime.datetime):
-                return data.strftime("%Y-%m-%d %H:%M:%S")
-            if isinstance(data, datetime.date):
-                return data.strftime("%Y-%m-%d")
-            else:
-                return data
+        if recursion:
+            return serialisation.encode(data)
+        return serialisation.dumps(data)
 
     @staticmethod
     def _parse_response(response):
@@ -108,21 +296,25 @@ class DataHolder(object):
         :param response: http response
         :return: decoded response
         """
-        resp = json.loads(response)
+        resp = serialisation.loads(response)
         if not isinstance(resp, list):
             if 'error' in resp.keys():
                 raise APIException(resp['error'])
         return resp
 
-    def _build_request_params(self, method=None, data=None):
+    def _build_request_params(self, method=None, data=None, page_no=None, extra_params=None):
         """
         Build the request params
         :param method: http method
         :param data: any post data
+        :param page_no: Optional: page to request, defaults to the current page
+        :param extra_params: Optional: dict of get params added for this request only
         :return: dict of the params to make the request
         """
         if method is None:
             method = self._api.method
+        if page_no is None:
+            page_no = self._page_no
         url = self._api.domain + self._api.endpoint
         # get the pk if there is one
         if self._pk is not None:
@@ -130,33 +322,298 @@ class DataHolder(object):
                 url += str(self._pk)
             else:
                 url += '?id=' + str(self._pk)
+        # work on a copy so pages can be built concurrently
+        get_params = dict(self._api.params or {})
+        get_params.update(self._extra_params)
+        if extra_params:
+            get_params.update(extra_params)
         # get the page number
-        if self._page_no > 1:
-            self._api.params['page'] = self._page_no
+        if page_no > 1:
+            get_params['page'] = page_no
         else:
-            if self._api.params is not None:
-                self._api.params.pop('page', None)
-                # change lists to comma delimited strings
-                for k, v in self._api.params.items():
-                    if isinstance(v, list):
-                        self._api.params[k] = ','.join(v)
+            get_params.pop('page', None)
+        # change lists to comma delimited strings
+        for k, v in get_params.items():
+            if isinstance(v, (list, tuple)):
+                get_params[k] = ','.join(v)
 
         # get the get params
-        if self._api.params:
-            url += '?' + urlencode(self._api.params)
+        if get_params:
+            url += '?' + urlencode(get_params)
         if self._data_source is not None:
             url += self._data_source
         if data is not None:
             return {'method': method, 'url': url, 'headers': self._api.headers, 'data': data}
         return {'method': method, 'url': url, 'headers': self._api.headers}
 
-    def _get_response(self, params):
+    def _send(self, params, stream=False, event=None):
         """
-        Make the request
+        Send the request through the api's transport & request scheduler
         :param params: http parameters
+        :param stream: Optional: don't read the response body yet (False)
+        :param event: Optional: RequestEvent to record the request in
+        :return: http response
+        """
+        transport = self._api.transport
+        scheduler = self._api.scheduler
+        credentials = self._api.credentials
+
+        def send():
+            request_params = params
+            if credentials.access_token is None and credentials.can_refresh:
+                request_params = self._api._refresh_access_token(request_params)
+            response = transport.request(stream=stream, timeout=self._api.timeout, **request_params)
+            if credentials.can_refresh and token_expired(response):
+                # held here until the token has been refreshed, then sent again with it
+                response.close()
+                request_params = self._api._refresh_access_token(request_params)
+                response = transport.request(stream=stream, timeout=self._api.timeout, **request_params)
+            return response
+
+        if event is not None:
+            send = self._count_attempts(send, event)
+            started = timer()
+        if scheduler is None:
+            response = send()
+        else:
+            # a session set before transports could be swapped doesn't say which errors to retry
+            response = scheduler.call(send, params['method'], getattr(transport, 'errors', RequestsTransport.errors))
+        if event is not None:
+            self._record_response(event, params, response, started, stream)
+        self._check_status(response)
+        return response
+
+    @staticmethod
+    def _count_attempts(send, event):
+        """
+        Wrap a send function so every retry is counted on the event
+        :param send: function sending the request
+        :param event: RequestEvent
+        :return: function
+        """
+        # the first attempt takes retries back to 0
+        event.retries -= 1
+
+        def counted():
+            event.retries += 1
+            return send()
+        return counted
+
+    @staticmethod
+    def _record_response(event, params, response, started, stream=False):
+        """
+        Record a response on its RequestEvent
+        :param event: RequestEvent
+        :param params: http parameters
+        :param response: http response
+        :param started: timer() when the request was handed to the scheduler
+        :param stream: the response body hasn't been read yet
+        """
+        event.network += timer() - started
+        event.method = params['method']
+        event.url = params['url']
+        event.status = response.status_code
+        if not stream:
+            content = getattr(response, 'content', None)
+            event.bytes += len(content if content is not None else response.text.encode('utf-8'))
+
+    @staticmethod
+    def _check_status(response):
+        """
+        Raise for responses that are still failing once every retry has been used up
+        :param response: http response
+        """
+        if response.status_code not in RETRY_STATUSES:
+            return
+        try:
+            error = serialisation.loads(response.text)['error']
+        except (ValueError, KeyError, TypeError):
+            error = 'HTTP %s' % response.status_code
+        raise APIException(error)
+
+    def _get_response(self, params, event=None):
+        """
+        Make the request, going through the api's response cache if it has one
+        When hooks are registered the request is reported to them, unless the caller passes its own event (it is
+        then only reported here if the request fails)
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
         :return: response
         """
-        return self._parse_response(requests.request(**params).text)
+        with self._reported(event) as event:
+            return self._coalesce_response(params, event)
+
+    @contextlib.contextmanager
+    def _reported(self, event=None):
+        """
+        Report a request to the hooks, for _get_response()
+        :param event: Optional: RequestEvent of the caller, only reported here if the request fails
+        :return: context manager giving the RequestEvent to record the request in, or None when nothing is timed
+        """
+        emit = event is None and bool(self._api.hooks)
+        if emit:
+            event = RequestEvent(self._api.endpoint)
+        try:
+            yield event
+        except Exception as e:
+            if event is not None:
+                event.error = e
+                if not emit:
+                    self._api._emit(event)
+            raise
+        finally:
+            if emit:
+                self._api._emit(event)
+
+    def _coalesce_response(self, params, event=None):
+        """
+        Make a GET request, sharing the decoded response of an identical request that is already in flight
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
+        :return: decoded response
+        """
+        coalescer = self._api.coalescer
+        if coalescer is None or params['method'] != 'GET':
+            return self._fetch_response(params, event)
+        started = timer()
+        data, shared = coalescer.call(request_key(params), lambda: self._fetch_response(params, event))
+        self._record_coalesced(event, shared, started)
+        return data
+
+    @staticmethod
+    def _record_coalesced(event, shared, started):
+        """
+        Record a request that was answered by an identical request already in flight
+        :param event: RequestEvent or None
+        :param shared: Boolean if the response was shared
+        :param started: timer() when the request was handed to the coalescer
+        """
+        if shared and event is not None:
+            event.coalesced = True
+            event.network += timer() - started
+
+    def _fetch_response(self, params, event=None):
+        """
+        Make the request & decode the response
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record the request in
+        :return: response
+        """
+        ttl, entry = self._cache_lookup(params, event)
+        if entry is not None and entry.fresh:
+            return entry.value
+        if ttl is None:
+            try:
+                return self._decode(self._send(params, event=event).text, event)
+            finally:
+                self._invalidate_cache(params)
+        response = self._send(self._build_conditional_params(params, entry), event=event)
+        return self._store_response(self._api.cache, ttl, params, entry, response, event)
+
+    def _cache_lookup(self, params, event=None):
+        """
+        Look a request up in the api's response cache
+        :param params: http parameters
+        :param event: Optional: RequestEvent to record a fresh cached response in
+        :return: (seconds the response is fresh for, None if it isn't cached, CacheEntry or None)
+        """
+        cache = self._api.cache
+        if cache is None or params['method'] != 'GET':
+            return None, None
+        ttl = cache.ttl(params['url'][len(self._api.domain):])
+        if ttl is None:
+            return None, None
+        entry = cache.get(params['url'])
+        if entry is not None and entry.fresh and event is not None:
+            event.cached = True
+        return ttl, entry
+
+    def _invalidate_cache(self, params):
+        """
+        Writes invalidate the cached responses of the endpoint they touch
+        :param params: http parameters
+        """
+        cache = self._api.cache
+        if cache is not None and params['method'] != 'GET':
+            cache.invalidate(self._api.domain + self._api.endpoint)
+
+    def _decode(self, text, event=None):
+        """
+        Decode a response body, timing it when there is an event
+        :param text: response body
+        :param event: Optional: RequestEvent to record the decode time in
+        :return: decoded response
+        """
+        if event is None:
+            return self._parse_response(text)
+        started = timer()
+        try:
+            return self._parse_response(text)
+        finally:
+            event.decode += timer() - started
+
+    def _new_event(self, page_no=None):
+        """
+        RequestEvent for a page request, only when hooks are registered so nothing is timed otherwise
+        :param page_no: Optional: page number
+        :return: RequestEvent or None
+        """
+        if not self._api.hooks:
+            return None
+        return RequestEvent(self._api.endpoint, self._api.method, page=page_no)
+
+    @staticmethod
+    def _build_conditional_params(params, entry):
+        """
+        Add the validators of a stale cache entry so the server can answer 304 Not Modified
+        :param params: http parameters
+        :param entry: CacheEntry or None
+        :return: http parameters
+        """
+        if entry is None:
+            return params
+        headers = dict(params['headers'])
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+        return dict(params, headers=headers)
+
+    def _store_response(self, cache, ttl, params, entry, response, event=None):
+        """
+        Decode a response and cache it
+        :param cache: ResponseCache
+        :param ttl: seconds the response is fresh for
+        :param params: http parameters
+        :param entry: the stale CacheEntry that was revalidated or None
+        :param response: http response
+        :param event: Optional: RequestEvent to record the request in
+        :return: decoded response
+        """
+        if response.status_code == 304 and entry is not None:
+            cache.touch(params['url'], ttl)
+            if event is not None:
+                event.cached = True
+            return entry.value
+        data = self._decode(response.text, event)
+        if response.status_code == 200:
+            cache.set(params['url'], data, ttl, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return data
+
+    def _allows(self, name):
+        """
+        Can a data function be used on this object, the endpoint's after find functions are allowed once find() or
+        pages() has been called on it or on the object it was built by. The query itself is never changed
+        :param name: name of the data function
+        :return: Boolean
+        """
+        api = self._api
+        if name in api.data_attributes:
+            return True
+        if api.after_find_attributes is None or name not in api.after_find_attributes:
+            return False
+        return any(self._data_function_called_dict[key] or self._data_function_evaluated_dict[key]
+                   for key in ('find', 'pages'))
 
     def set_child_as_evaluated(self, child):
         """
@@ -167,57 +624,496 @@ class DataHolder(object):
             if v:
                 child._data_function_evaluated_dict[k] = True
 
-    def _process_request(self, new_instance=False):
+    def _fetch_page(self, page_no=None, event=None):
+        """
+        Request a single page without touching this object (safe to call from worker threads)
+        :param page_no: Optional: page to request, defaults to the current page
+        :param event: Optional: RequestEvent to record the request in, reported once the page has been built
+        :return: decoded response
+        """
+        return self._get_response(self._build_request_params(page_no=page_no), event)
+
+    def _process_request(self, new_instance=False, data=None, event=None):
         """
         Update this object with the data
         :param new_instance: If we need a new instance or not
+        :param data: Optional: an already fetched response, otherwise the current page is requested
+        :param event: Optional: RequestEvent the data was fetched with, reported once the rows have been built
         :return: self
         """
-        data = self._get_response(self._build_request_params())
-        self._no_pages = dict(data).pop('no_pages', None)
-        inst = DataHolder(self._api)
+        if data is None:
+            event = self._new_event(self._page_no)
+            data = self._fetch_page(event=event)
+        if event is not None:
+            started = timer()
+        self._no_pages = data.get('no_pages') if isinstance(data, dict) else None
+        inst = self.__class__(self._api)
         if self._api.response_data_name is not None:
             data = data[self._api.response_data_name]
 
         if isinstance(data, list):
+            build = self._build_row if self._compact else self._build_child
             for i in data:
-                d_obj = DataHolder(self._api)
-                d_obj._request = self._api.current_request
-                d_obj._object_name = self._api.object_name
-                self.set_child_as_evaluated(d_obj)
-                for key, val in i.items():
-                    d_obj._query[key] = val
-                    self._set_class_attribute(d_obj, key, val)
+                d_obj = build(i)
                 if new_instance:
                     inst._pages_queryset.append(d_obj)
                 else:
                     self._pages_queryset.append(d_obj)
         elif isinstance(data, dict):
             for k, v in data.items():
-                d_obj = DataHolder(self._api)
-                d_obj._request = self._api.current_request
-                d_obj._object_name = k
-                d_obj._data_source = k
-                self.set_child_as_evaluated(d_obj)
-                for key, val in v.items():
-                    d_obj._query[key] = val
-                    self._set_class_attribute(d_obj, key, val)
+                d_obj = self._build_child(v, k)
                 if new_instance:
                     inst._pages_queryset.append(d_obj)
                 else:
                     self._pages_queryset.append(d_obj)
+        if event is not None:
+            event.build += timer() - started
+            event.rows += len(data) if isinstance(data, (list, dict)) else 0
+            self._api._emit(event)
         if new_instance:
             return inst
         if len(self._pages_queryset) == 1:
             return self._pages_queryset[0]
         return self
 
+    def _build_child(self, values, data_source=None):
+        """
+        Build the object for a single row
+        :param values: decoded row (dict)
+        :param data_source: Optional: name of the data source the row describes (data_sources_info)
+        :return: DataHolder obj
+        """
+        d_obj = holder_class(self.__class__, tuple(values))(self._api)
+        d_obj._request = self._api.current_request
+        d_obj._object_name = self._api.object_name
+        if data_source is not None:
+            d_obj._object_name = data_source
+            d_obj._data_source = data_source
+        self.set_child_as_evaluated(d_obj)
+        attributes = d_obj.__dict__
+        attribute_map = d_obj._attribute_map
+        d_obj._query.update(values)
+        # set directly so loading the data doesn't count as a change
+        for key, val in values.items():
+            name = attribute_name(key)
+            attributes[name] = val
+            attribute_map[name] = key
+        if 'system_id' in attribute_map:
+            attributes['id'] = attributes['system_id']
+            attribute_map['id'] = 'id'
+        return d_obj
+
+    def _build_row(self, values):
+        """
+        Build a read-only Row for a single row, rows with the same columns share one RowSchema
+        :param values: decoded row (dict)
+        :return: Row obj
+        """
+        keys = tuple(values)
+        schema = self._row_schemas.get(keys)
+        if schema is None:
+            schema = self._row_schemas[keys] = RowSchema(self, keys)
+        return schema.row_class(schema, tuple(values.values()))
+
+    def iter_rows(self, raw=False, compact=False, chunk_size=65536):
+        """
+        Stream the rows of every requested page without keeping them on this object, each response is decoded as
+        it is received so only the row being read is held in memory
+        :param raw: Optional: yield the decoded dicts instead of DataHolder objects, or (name, dict) pairs for
+        data_sources_info (False)
+        :param compact: Optional: yield read-only Row objects instead of DataHolder objects (False)
+        :param chunk_size: Optional: bytes read from the connection at a time (65536)
+        :return: iterator of rows
+        """
+        for row in self._iter_raw_rows(chunk_size):
+            if raw:
+                yield row
+            elif isinstance(row, tuple):
+                yield self._build_child(row[1], row[0])
+            elif compact:
+                yield self._build_row(row)
+            else:
+                yield self._build_child(row)
+
+    def _iter_raw_rows(self, chunk_size=65536):
+        """
+        Generator of the decoded rows of every requested page, streamed one page at a time
+        :param chunk_size: bytes read from the connection at a time
+        :return: iterator of rows
+        """
+        page_no = self._first_stream_page()
+        completed = 0
+        while page_no is not None:
+            stream = JSONArrayStream(self._api.response_data_name)
+            for row in self._stream_page(stream, page_no, chunk_size):
+                yield row
+            completed += 1
+            page_no = self._complete_stream_page(stream, page_no, completed)
+
+    def _first_stream_page(self):
+        """
+        First page _iter_raw_rows() requests, the one after the cursor when resuming
+        :return: page number, None if the cursor has already consumed every page
+        """
+        cursor = self._start_cursor()
+        if cursor is None:
+            return self._page_no if self._max_page is not None else 1
+        return None if cursor.done else cursor.page
+
+    def _complete_stream_page(self, stream, page_no, completed):
+        """
+        Move the cursor on once a streamed page has been consumed
+        :param stream: JSONArrayStream of the page
+        :param page_no: page that was consumed
+        :param completed: number of pages consumed so far by this iteration
+        :return: next page to request, None after the last page
+        """
+        no_pages = stream.meta.get('no_pages')
+        last_page = self._max_page if self._max_page is not None else no_pages
+        done = last_page is None or page_no >= last_page
+        self._complete_page(page_no, completed, done, no_pages)
+        return None if done else page_no + 1
+
+    def _iter_raw_pages(self, prefetch=1, cursor=None):
+        """
+        Generator of the decoded rows of every requested page, a list per page in page order, without building
+        objects or keeping the rows on this object. Once the page count is known up to prefetch pages are requested
+        concurrently, so only the pages in flight are held in memory
+        :param prefetch: number of pages to request at once
+        :param cursor: Optional: Cursor to start from
+        :return: iterator of (page number, list of rows, Boolean if it is the last page)
+        """
+        page_no, finish = self._raw_pages_range(cursor)
+        if finish is None:
+            # the first page says how many there are
+            event = self._new_event(page_no)
+            data = self._fetch_page(page_no, event)
+            finish = self._read_no_pages(data)
+            yield page_no, self._page_rows(data, event), finish is None or page_no >= finish
+            if finish is None:
+                return
+            page_no += 1
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        in_flight = collections.deque()
+        try:
+            while page_no <= finish or in_flight:
+                page_no = self._queue_pages(in_flight, page_no, finish, prefetch,
+                                            lambda number, event: executor.submit(self._fetch_page, number, event))
+                number, event, future = in_flight.popleft()
+                yield number, self._page_rows(future.result(), event), number == finish
+        finally:
+            self._cancel_pages(in_flight)
+            executor.shutdown(wait=False)
+
+    def _queue_pages(self, in_flight, page_no, finish, limit, submit):
+        """
+        Request pages ahead of the consumer until limit are in flight
+        :param in_flight: deque of (page number, RequestEvent or None, future) to add to
+        :param page_no: next page to request
+        :param finish: last page to request
+        :param limit: max number of pages in flight
+        :param submit: function taking (page number, event) and returning a future of the decoded page
+        :return: next page to request
+        """
+        while page_no <= finish and len(in_flight) < limit:
+            event = self._new_event(page_no)
+            in_flight.append((page_no, event, submit(page_no, event)))
+            page_no += 1
+        return page_no
+
+    @staticmethod
+    def _cancel_pages(in_flight):
+        """
+        Cancel the pages still in flight when an iteration stops early
+        :param in_flight: deque of (page number, RequestEvent or None, future)
+        """
+        for _, _, future in in_flight:
+            future.cancel()
+
+    def _raw_pages_range(self, cursor=None):
+        """
+        Pages requested by _iter_raw_pages
+        :param cursor: Optional: Cursor to start from
+        :return: (first page, last page or None if the first page has to say how many there are)
+        """
+        if cursor is not None:
+            self._no_pages = cursor.no_pages
+            return cursor.page, cursor.finish if cursor.finish is not None else cursor.no_pages
+        return (self._page_no if self._max_page is not None else 1), self._max_page
+
+    def _read_no_pages(self, data):
+        """
+        Keep the page count reported in a decoded page
+        :param data: decoded response
+        :return: number of pages or None
+        """
+        self._no_pages = data.get('no_pages') if isinstance(data, dict) else None
+        return self._no_pages
+
+    def _page_rows(self, data, event=None):
+        """
+        Get the rows out of a decoded page
+        :param data: decoded response
+        :param event: Optional: RequestEvent the page was fetched with, reported now the rows are ready
+        :return: list of dicts
+        """
+        if self._api.response_data_name is not None:
+            data = data[self._api.response_data_name]
+        if isinstance(data, dict):
+            data = list(data.values())
+        if event is not None:
+            event.rows += len(data)
+            self._api._emit(event)
+        return data
+
+    def _stream_page(self, stream, page_no, chunk_size):
+        """
+        Request a single page and decode it as it is received
+        :param stream: JSONArrayStream
+        :param page_no: page to request
+        :param chunk_size: bytes read from the connection at a time
+        :return: iterator of rows
+        """
+        params = self._build_request_params(page_no=page_no)
+        event = self._new_event(page_no)
+        response = self._send(params, stream=True, event=event)
+        with self._reading(response, event):
+            for chunk in response.iter_content(chunk_size):
+                for row in self._check_stream(stream, self._feed(stream, chunk, event)):
+                    yield row
+            for row in self._check_stream(stream, self._feed(stream, None, event)):
+                yield row
+
+    @contextlib.contextmanager
+    def _reading(self, response, event=None):
+        """
+        Close a streamed response once it has been read, reporting the page to the hooks
+        :param response: http response
+        :param event: Optional: RequestEvent of the page
+        :return: context manager
+        """
+        try:
+            yield
+        except Exception as e:
+            if event is not None:
+                event.error = e
+            raise
+        finally:
+            response.close()
+            if event is not None:
+                self._api._emit(event)
+
+    @staticmethod
+    def _feed(stream, chunk, event=None):
+        """
+        Feed a chunk of a streamed response to its decoder
+        :param stream: JSONArrayStream
+        :param chunk: bytes, None once the whole response has been received
+        :param event: Optional: RequestEvent to record the decode time, bytes & rows in
+        :return: rows completed by the chunk
+        """
+        if event is None:
+            return stream.close() if chunk is None else stream.feed(chunk)
+        started = timer()
+        rows = stream.close() if chunk is None else stream.feed(chunk)
+        event.decode += timer() - started
+        event.bytes += len(chunk or b'')
+        event.rows += len(rows)
+        return rows
+
+    @staticmethod
+    def _check_stream(stream, rows):
+        """
+        Check the streamed response for errors
+        :param stream: JSONArrayStream
+        :param rows: rows decoded so far
+        :return: rows
+        """
+        if 'error' in stream.meta:
+            raise APIException(stream.meta['error'])
+        return rows
+
+    def to_numpy(self):
+        """
+        Get the rows as a numpy structured array, one typed field per column (requires numpy)
+        :return: numpy structured array
+        """
+        return columnar.to_numpy(*self._collect_columns())
+
+    def to_pandas(self):
+        """
+        Get the rows as a pandas DataFrame with typed columns (requires pandas)
+        :return: pandas DataFrame
+        """
+        return columnar.to_pandas(*self._collect_columns())
+
+    def to_arrow(self):
+        """
+        Get the rows as a pyarrow Table with typed columns (requires pyarrow)
+        :return: pyarrow Table
+        """
+        return columnar.to_arrow(*self._collect_columns())
+
+    def _collect_columns(self):
+        """
+        Build the columns straight from the decoded rows, rows that have already been fetched are reused, otherwise
+        the pages are streamed without building an object per row
+        :return: OrderedDict of column name: list of values, dict of column name: kind
+        """
+        if self._needs_evaluating:
+            rows = (self._row_values(row) for row in self._iter_raw_rows())
+        else:
+            rows = self._fetched_rows()
+        return self._build_columns(rows, self._column_types())
+
+    @staticmethod
+    def _row_values(row):
+        """
+        :param row: row from _iter_raw_rows, a dict or a (name, dict) pair for data_sources_info
+        :return: dict
+        """
+        return row[1] if isinstance(row, tuple) else row
+
+    @staticmethod
+    def _build_columns(rows, column_types):
+        """
+        :param rows: iterator of dicts
+        :param column_types: dict of column name: BlackCurve column type
+        :return: OrderedDict of column name: list of values, dict of column name: kind
+        """
+        columns, _ = columnar.collect_columns(rows)
+        return columns, columnar.column_kinds(columns, column_types)
+
+    @data_func_called_dec()
+    def export(self, path, format=None, prefetch=None, columns=None):
+        """
+        Write the rows of every requested page straight to a file without keeping them in memory, pages are
+        requested concurrently but written in page order. With a checkpoint or resume() a csv / ndjson export carries on
+        from the cursor, appending to the file
+        :param path: file path
+        :param format: Optional: 'csv', 'ndjson' or 'parquet' (requires pyarrow, a row group per page), from the file
+        extension by default
+        :param prefetch: Optional: number of pages requested at once (the prefetch passed to all() / pages(), or 4)
+        :param columns: Optional: columns to write, by default every column of the first row (csv & parquet) or of
+        each row (ndjson)
+        :return: number of rows written
+        """
+        format = export.export_format(path, format)
+        cursor = self._start_export(format) if self._needs_evaluating else None
+        if cursor is not None and cursor.done:
+            return 0
+        column_types = self._column_types() if format == 'parquet' else None
+        writer = self._open_export(path, format, columns, column_types, cursor)
+        try:
+            if self._needs_evaluating:
+                completed = 0
+                for page_no, rows, last_page in self._iter_raw_pages(prefetch or self._prefetch or 4, cursor):
+                    completed += 1
+                    self._write_export_page(writer, page_no, rows, last_page, completed)
+            else:
+                writer.write(self._fetched_rows())
+        finally:
+            writer.close()
+        return writer.count
+
+    def _start_export(self, format):
+        """
+        Cursor an export starts from, like _start_cursor(), only csv & ndjson files can be resumed
+        :param format: export format
+        :return: Cursor or None
+        """
+        if format not in export.RESUMABLE and (self._checkpoint is not None or self._resume_cursor is not None):
+            raise ValueError('%s exports can\'t be resumed, export to %s to use a checkpoint or resume()'
+                             % (format, ' or '.join(export.RESUMABLE)))
+        return self._start_cursor()
+
+    @staticmethod
+    def _open_export(path, format, columns, column_types, cursor):
+        """
+        Open the writer of an export, a resumed export drops anything written after its cursor was saved and carries
+        on at the end of the file
+        :param path: file path
+        :param format: export format
+        :param columns: columns to write or None
+        :param column_types: dict of column name: BlackCurve column type or None
+        :param cursor: Cursor the export resumes from or None
+        :return: writer
+        """
+        if cursor is None:
+            return export.open_writer(path, format, columns, column_types)
+        export.truncate(path, cursor.offset)
+        return export.open_writer(path, format, columns, column_types, append=True)
+
+    def _write_export_page(self, writer, page_no, rows, last_page, completed):
+        """
+        Write a page of an export and move the cursor on, with the size of the file so a resumed export continues
+        from exactly this point
+        :param writer: writer
+        :param page_no: page number
+        :param rows: list of dicts
+        :param last_page: Boolean if it is the last page
+        :param completed: number of pages written so far by this export
+        """
+        writer.write(rows)
+        self._complete_page(page_no, completed, last_page, self._no_pages, writer.tell())
+
+    def _fetched_rows(self):
+        """
+        Decoded rows of the rows already fetched
+        :return: list of dicts
+        """
+        if self._pages_queryset:
+            return [row.to_dict() if isinstance(row, Row) else row._query for row in self._pages_queryset]
+        return [self._query]
+
+    def _column_types(self):
+        """
+        Get the column types of the data source from data_sources_info
+        :return: dict of column name: type (empty for the other endpoints)
+        """
+        if not self._api.endpoint.startswith('data_sources/'):
+            return dict()
+        try:
+            data = self._get_response(self._build_column_types_params())
+        except APIException:
+            return dict()
+        return self._read_column_types(data)
+
+    def _build_column_types_params(self):
+        """
+        Build the request params for the data_sources_info of the data source
+        :return: dict of the params to make the request
+        """
+        source_name = self._api.endpoint[len('data_sources/'):]
+        return {'method': 'GET', 'url': self._api.domain + 'data_sources_info/' + source_name,
+                'headers': self._api.headers}
+
+    def _read_column_types(self, data):
+        """
+        Read the column types out of a data_sources_info response
+        :param data: decoded response
+        :return: dict of column name: type
+        """
+        source_name = self._api.endpoint[len('data_sources/'):]
+        if isinstance(data, dict):
+            data = data.get(source_name, data)
+        if not isinstance(data, dict):
+            return dict()
+        return {k: v for k, v in data.items() if not isinstance(v, (dict, list))}
+
     @data_func_called_dec()
-    def all(self):
+    def all(self, prefetch=None, compact=False, checkpoint=None):
         """
         Get all of the entries
+        :param prefetch: Optional: number of pages to request concurrently once the page count is known
+        :param compact: Optional: hold the rows as read-only Row objects instead of DataHolder objects (False)
+        :param checkpoint: Optional: FileCheckpoint / MemoryCheckpoint the cursor is saved to as pages are consumed,
+        if it already holds a cursor for this query iteration resumes from it
         :return: all of the data (all pages)
         """
+        self._prefetch = prefetch
+        self._compact = compact
+        self._checkpoint = checkpoint
         return self
 
     @data_func_called_dec(True)
@@ -235,17 +1131,22 @@ class DataHolder(object):
         return self._process_request()
 
     @data_func_called_dec()
-    def pages(self, start, finish):
+    def pages(self, start, finish, prefetch=None, compact=False, checkpoint=None):
         """
         Get a range of pages of data
         :param start: page to start from
         :param finish: page to end on
+        :param prefetch: Optional: number of pages to request concurrently once the page count is known
+        :param compact: Optional: hold the rows as read-only Row objects instead of DataHolder objects (False)
+        :param checkpoint: Optional: FileCheckpoint / MemoryCheckpoint the cursor is saved to as pages are consumed,
+        if it already holds a cursor for this query iteration resumes from it
         :return: concat data for given page range
         """
-        if self._api.after_find_attributes is not None:
-            self._api.data_attributes += self._api.after_find_attributes
         self._page_no = start
         self._max_page = finish
+        self._prefetch = prefetch
+        self._compact = compact
+        self._checkpoint = checkpoint
         return self
 
     @data_func_called_dec(True)
@@ -256,12 +1157,179 @@ class DataHolder(object):
         :return: object
         """
         self._pages_queryset = []
-        if self._api.after_find_attributes is not None:
-            self._api.data_attributes += self._api.after_find_attributes
         self._page_no = 1
         self._pk = pk
         return self._process_request()
 
+    @data_func_called_dec()
+    def find_many(self, ids, max_workers=4, max_url_length=2000, compact=False):
+        """
+        Find several objects at once, the ids are sent as a filter in as few requests as the url length allows
+        If the endpoint ignores the filter, falls back to one find() per id with max_workers in flight at once
+        Ids that aren't found are reported in the result's missing list rather than raised
+        :param ids: list (or any iterable) of ids, Product IDs for prices
+        :param max_workers: Optional: number of requests in flight at once (4)
+        :param max_url_length: Optional: longest url sent (2000)
+        :param compact: Optional: return read-only Row objects instead of DataHolder objects (False)
+        :return: FoundRows of id: row, id: list of rows for prices
+        """
+        wanted = collections.OrderedDict((str(pk), pk) for pk in ids)
+        found = dict()
+        remaining = list(wanted.values())
+        chunks = self._id_chunks(remaining, max_url_length)
+        if chunks:
+            # check the endpoint understands the filter before sending the rest of the chunks
+            try:
+                rows = self._find_chunk(chunks[0], compact)
+            except APIException:
+                rows = None
+            if rows is not None:
+                results = [rows] + map_bounded(lambda chunk: self._find_chunk(chunk, compact), chunks[1:], max_workers)
+                remaining = self._add_chunk_results(found, chunks, results)
+        results = map_bounded(lambda pk: self._find_one(pk, compact), remaining, max_workers)
+        return self._build_found_rows(wanted, found, self._add_single_results(found, results))
+
+    def _id_chunks(self, ids, max_url_length):
+        """
+        Split the ids into chunks that fit in the url as a comma delimited filter
+        :param ids: list of ids
+        :param max_url_length: longest url sent
+        :return: list of lists of ids, empty if the endpoint can't be filtered by id
+        """
+        if self._api.id_filter is None or not ids:
+            return []
+        # every chunk is added to the url of the first page, with an encoded comma (%2C) between ids
+        space = max_url_length - len(self._build_request_params(page_no=1)['url']) - len(self._api.id_filter) - 2
+        chunks = [[]]
+        used = 0
+        for pk in ids:
+            size = len(quote_plus(str(pk))) + 3
+            if chunks[-1] and used + size > space:
+                chunks.append([])
+                used = 0
+            chunks[-1].append(pk)
+            used += size
+        return chunks
+
+    def _lookup_holder(self, compact):
+        """
+        New object for the requests of find_many(), so they don't touch this one
+        :param compact: build read-only Row objects
+        :return: DataHolder obj
+        """
+        holder = self.__class__(self._api)
+        holder._compact = compact
+        holder._data_function_called_dict['find'] = True
+        return holder
+
+    def _chunk_lookup(self, chunk, compact):
+        """
+        New object requesting the rows that match a chunk of ids, for _find_chunk()
+        :param chunk: list of ids
+        :param compact: build read-only Row objects
+        :return: (DataHolder obj, function taking a page of rows and returning False if one of them isn't for the
+        ids, i.e. the endpoint ignored the filter)
+        """
+        holder = self._lookup_holder(compact)
+        holder._extra_params = {self._api.id_filter: [str(pk) for pk in chunk]}
+        wanted = set(str(pk) for pk in chunk)
+        name = attribute_name(self._api.id_filter)
+
+        def matches(rows):
+            return all(str(self._row_value(row, name)) in wanted for row in rows)
+        return holder, matches
+
+    def _find_chunk(self, chunk, compact):
+        """
+        Request every page of the rows matching a chunk of ids (safe to call from worker threads)
+        :param chunk: list of ids
+        :param compact: build read-only Row objects
+        :return: list of rows, None if a row doesn't match any of the ids (the endpoint ignored the filter)
+        """
+        holder, matches = self._chunk_lookup(chunk, compact)
+        rows = []
+        page_no = 1
+        while page_no <= (holder._no_pages or 1):
+            page_rows = holder._process_request(True, holder._fetch_page(page_no))._pages_queryset
+            if not matches(page_rows):
+                return None
+            rows += page_rows
+            page_no += 1
+        return rows
+
+    def _find_one(self, pk, compact):
+        """
+        Request the rows of a single id (safe to call from worker threads)
+        :param pk: id
+        :param compact: build read-only Row objects
+        :return: (id, list of rows, APIException or None)
+        """
+        holder = self._lookup_holder(compact)
+        holder._pk = pk
+        try:
+            return pk, holder._process_request(True, holder._fetch_page(1))._pages_queryset, None
+        except APIException as e:
+            return pk, [], e
+
+    def _add_chunk_results(self, found, chunks, results):
+        """
+        Group the rows returned for each chunk of ids by id
+        :param found: dict of str(id): list of rows to add to
+        :param chunks: list of lists of ids
+        :param results: list of rows (or None) per chunk from _find_chunk()
+        :return: list of the ids left to find one at a time, from the chunks the endpoint didn't filter
+        """
+        remaining = []
+        for chunk, rows in zip(chunks, results):
+            if rows is None:
+                remaining += chunk
+            else:
+                self._add_found_rows(found, rows)
+        return remaining
+
+    @staticmethod
+    def _add_single_results(found, results):
+        """
+        Add the rows returned for single ids
+        :param found: dict of str(id): list of rows to add to
+        :param results: list of (id, list of rows, APIException or None) from _find_one()
+        :return: dict of id: APIException of the ids that failed
+        """
+        errors = dict()
+        for pk, rows, error in results:
+            found[str(pk)] = rows
+            if error is not None:
+                errors[pk] = error
+        return errors
+
+    def _add_found_rows(self, found, rows):
+        """
+        Group the rows returned for a chunk of ids by id
+        :param found: dict of str(id): list of rows to add to
+        :param rows: list of rows
+        """
+        name = attribute_name(self._api.id_filter)
+        for row in rows:
+            found.setdefault(str(self._row_value(row, name)), []).append(row)
+
+    def _build_found_rows(self, wanted, found, errors):
+        """
+        Build the result of find_many() in the order the ids were asked for
+        :param wanted: dict of str(id): id that were asked for
+        :param found: dict of str(id): list of rows
+        :param errors: dict of id: APIException
+        :return: FoundRows
+        """
+        result = FoundRows()
+        for key, pk in wanted.items():
+            rows = found.get(key)
+            if rows:
+                result[pk] = rows[0] if self._api.unique_ids else rows
+            else:
+                result.missing.append(pk)
+        result.errors = errors
+        return result
+
     @data_func_called_dec()
     def delete(self, attribute=None):
         """
@@ -269,14 +1337,25 @@ class DataHolder(object):
         :param attribute: Optional: for deleting a single value
         :return: self
         """
+        self._get_response(self._build_delete_params(attribute))
+        return self
+
+    def _build_delete_params(self, attribute=None):
+        """
+        Build the request params for deleting a data object / attribute
+        :param attribute: Optional: for deleting a single value
+        :return: dict of the params to make the request
+        """
         data = None
-        
+        extra_params = None
+
         if 'data_sources/' in self._api.endpoint:
             if self._query:
-                self._api.params['id'] = self._query['id']
+                # only for this request, the query's params are shared by every row of the result
+                extra_params = {'id': self._query['id']}
             else:
                 raise APIException('Need a single item to delete')
-        
+
         else:
             if attribute:
                 data = attribute
@@ -284,10 +1363,8 @@ class DataHolder(object):
                     data = [attribute]
             else:
                 data = self._get_deleted_attributes()
-                
-        params = self._build_request_params('DELETE', json.dumps(data))
-        self._get_response(params)
-        return self
+
+        return self._build_request_params('DELETE', self.build_json(data), extra_params=extra_params)
 
     @data_func_called_dec()
     def create(self, *args, **kwargs):
@@ -315,38 +1392,132 @@ class DataHolder(object):
         return self.save(True)
 
     @data_func_called_dec()
-    def batch_create(self, object_list):
+    def batch_create(self, object_list, chunk_size=500, max_workers=1):
+        """
+        Create multiple data objects at once, split into chunks that are sent concurrently
+        Chunks that fail don't stop the others, they are raised together in a BatchCreateException afterwards
+        :param object_list: list (or any iterable) of objects to be created
+        :param chunk_size: Optional: number of objects sent per request (500)
+        :param max_workers: Optional: number of chunks in flight at once (1)
+        :return: self
+        """
+        results = map_bounded(lambda chunk: self._send_chunk(*chunk),
+                              enumerate(self._iter_chunks(object_list, chunk_size)), max_workers)
+        return self._check_batch(results)
+
+    def _check_batch(self, results):
+        """
+        Raise the chunks of a batch_create() that failed together, once every chunk has been sent
+        :param results: list of the failures of each chunk from _send_chunk()
+        :return: self
+        """
+        failed = [i for result in results for i in result]
+        if failed:
+            raise BatchCreateException(failed)
+        return self
+
+    @staticmethod
+    def _iter_chunks(object_list, chunk_size):
+        """
+        Split objects into lists of chunk_size
+        :param object_list: list (or any iterable) of objects
+        :param chunk_size: number of objects per chunk
+        :return: iterator of lists
+        """
+        object_list = iter(object_list)
+        chunk = list(itertools.islice(object_list, chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(object_list, chunk_size))
+
+    def _build_chunk_params(self, rows):
+        """
+        Build the requests for creating a chunk of objects, data sources accept a list of rows in one request,
+        the other endpoints need one request per row
+        :param rows: list of objects
+        :return: list of (rows, request params)
+        """
+        if 'data_sources/' in self._api.endpoint:
+            return [(rows, self._build_request_params('POST', self.build_json(rows)))]
+        return [([row], self._build_request_params('POST', self.build_json(row))) for row in rows]
+
+    def _send_chunk(self, chunk_no, rows):
+        """
+        Send a chunk of objects to be created (safe to call from worker threads)
+        :param chunk_no: position of the chunk in the batch
+        :param rows: list of objects
+        :return: list of (chunk number, rows, exception) for the rows that failed
+        """
+        failed = []
+        for request_rows, params in self._build_chunk_params(rows):
+            try:
+                self._get_response(params)
+            except Exception as e:
+                failed.append((chunk_no, request_rows, e))
+        return failed
+
+    @data_func_called_dec()
+    def save(self, create=False):
+        """
+        Save data objects
+        :param create: Whether or not to create a new entry or update an existing one
+        :return: self
+        """
+        batch = getattr(self._api._batch_state, 'batch', None)
+        if batch is not None:
+            batch.add(self, self._build_save_data(create))
+            return self
+
+        params = self._build_save_params(create)
+        if params is not None:
+            self._get_response(params)
+
+        # See if there are any deleted attributes
+        deleted = self._get_deleted_attributes()
+        if deleted and self._api.endpoint == 'data_sources_info/':
+            self.delete(list(deleted.keys()))
+        self._mark_saved()
+        return self
+
+    def _mark_saved(self):
         """
-        Create multiple data objects at once
-        :param object_list: list of objects to be created
-        :return: self
+        Record the changed & deleted attributes as saved
         """
-        if 'data_sources/' in self._api.endpoint:
-            params = self._build_request_params('POST', json.dumps(object_list))
-            self._get_response(params)
-            
-        else:
-            for i in object_list:
-                self.create(**i)
-                
-        return self
+        for name in self._changed:
+            key = self._attribute_map.get(name, name)
+            if name in self.__dict__:
+                self._query[key] = self.__dict__[name]
+        for name in self._deleted:
+            self._query.pop(self._attribute_map.get(name, name), None)
+        self._changed.clear()
+        self._deleted.clear()
+
+    def _build_save_params(self, create=False):
+        """
+        Build the request params for saving the changed attributes
+        :param create: Whether or not to create a new entry or update an existing one
+        :return: dict of the params to make the request (None if there is nothing to save)
+        """
+        data = self._build_save_data(create)
+        if data is not None:
+            return self._build_request_params('POST', self.build_json(data))
+        return None
 
-    @data_func_called_dec()
-    def save(self, create=False):
+    def _build_save_data(self, create=False):
         """
-        Save data objects
+        Build the data for saving the changed attributes, including the id of the object being updated
         :param create: Whether or not to create a new entry or update an existing one
-        :return: self
+        :return: dict of the data to send (None if there is nothing to save)
         """
         if not create:
             self._set_changed_attributes()
         if self._update_query:
             data = self._update_query
             if self._api.endpoint != 'data_sources_info/':
-                
+
                 if self._api.endpoint == 'currencies/':
                     self._pk = self._query['code']
-                    
+
                 try:
                     data['id'] = self._query['id']
                 except KeyError:
@@ -357,38 +1528,36 @@ class DataHolder(object):
                             data['Product ID'] = self._query['product id']
                         except KeyError:
                             pass
-            params = self._build_request_params('POST', self.build_json(data))
-            self._get_response(params)
-
-        # See if there are any deleted attributes
-        deleted = self._get_deleted_attributes()
-        if deleted and self._api.endpoint == 'data_sources_info/':
-            self.delete(list(deleted.keys()))
-        return self
+            return data
+        return None
 
     def _set_changed_attributes(self):
         """
-        Find all of the objects attributes that have changes (for updates)
+        Find all of the objects attributes that have changes (for updates), only the attributes set since the
+        object was loaded / last saved are looked at
         """
-        class_attrs = {x: object.__getattribute__(self, x) for x in dir(self) if not x.startswith('_')}
-        class_attrs = {k: v for k, v in class_attrs.items() if not callable(v)}
-        class_attrs = {k: v for k, v in class_attrs.items() if v is not None}
-        cased_class_attrs = {self._attribute_map[k] if k in self._attribute_map.keys() else k: v for k, v in
-                             class_attrs.items()}
-        for k, v in self._query.items():
-            if k in cased_class_attrs.keys():
-                if cased_class_attrs[k] == v:
-                    del cased_class_attrs[k]
-        self._update_query = cased_class_attrs
+        changed = dict()
+        for name in self._changed:
+            value = self.__dict__.get(name)
+            if value is None:
+                continue
+            key = self._attribute_map.get(name, name)
+            if key in self._query and self._query[key] == value:
+                continue
+            changed[key] = value
+        self._update_query = changed
 
     def _get_deleted_attributes(self):
         """
         Get the attributes that have been deleted
         :return: deleted attributes (dict)
         """
-        class_attrs = {x: getattr(self, x, None) for x in dir(self) if not x.startswith('_')}
-        class_attrs = {k: v for k, v in class_attrs.items() if not callable(v)}
-        return {k: v for k, v in self._query.items() if k.lower().replace(' ', '_').strip() not in class_attrs.keys()}
+        deleted = dict()
+        for name in self._deleted:
+            key = self._attribute_map.get(name, name)
+            if key in self._query:
+                deleted[key] = self._query[key]
+        return deleted
 
     @staticmethod
     def _set_class_attribute(cls, key, value):
@@ -397,10 +1566,11 @@ class DataHolder(object):
         :param key: attribute name
         :param value: attribute value
         """
-        k = key.replace(' ', '_').lower().strip()
-        setattr(cls, k, value)
+        k = attribute_name(key)
+        # set directly so loading the data doesn't count as a change
+        object.__setattr__(cls, k, value)
         if k == 'system_id':
-            setattr(cls, 'id', value)
+            object.__setattr__(cls, 'id', value)
             cls._attribute_map['id'] = 'id'
         cls._attribute_map[k] = key
 
@@ -451,31 +1621,173 @@ class DataHolder(object):
         Generator function for evaluating the requests and updating the object
         :return: iterator for results pages
         """
+        completed = 0
+        last_page = not self._start_pages()
+        while not last_page:
+            page_no = self._page_no
+            obj = self._process_request(True)
+            last_page = self._record_page(obj)
+            yield obj
+            completed += 1
+            self._complete_page(page_no, completed, last_page, self._no_pages)
+            if self._prefetches(last_page):
+                for obj in self._iter_prefetched_pages(self._page_no, self._no_pages, completed):
+                    yield obj
+                return
+
+    def _start_pages(self):
+        """
+        Get ready to evaluate the pages, from the first page or from the cursor when resuming
+        :return: Boolean if there are pages to request
+        """
         if not self._data_function_evaluated_dict['all']:
             self._pages_queryset = []
         # reset page number
         if self._max_page is None:
             self._page_no = 1
+        cursor = self._start_cursor()
+        if cursor is not None:
+            if cursor.done:
+                self._set_evaluated_function()
+                return False
+            self._page_no = cursor.page
+        return True
+
+    def _prefetches(self, last_page):
+        """
+        Once the first page has said how many there are, are the rest fetched concurrently
+        :param last_page: Boolean if the page just consumed was the last one
+        :return: Boolean
+        """
+        return not last_page and bool(self._prefetch) and self._prefetch > 1
+
+    @property
+    def cursor(self):
+        """
+        Position of the iteration: the next page to request, set once a page has been consumed
+        :return: Cursor or None
+        """
+        return self._cursor
+
+    def resume(self, cursor):
+        """
+        Continue from a cursor saved by an earlier iteration of the same query, completed pages aren't requested again
+        :param cursor: Cursor or its to_dict()
+        :return: self
+        """
+        if isinstance(cursor, dict):
+            cursor = Cursor.from_dict(cursor)
+        self._check_cursor(cursor)
+        self._resume_cursor = cursor
+        return self
+
+    def _check_cursor(self, cursor):
+        """
+        Make sure a cursor was saved from this query
+        :param cursor: Cursor
+        """
+        if not cursor.matches(self._api.endpoint, self._api.params):
+            raise ValueError('Cursor is for %s %s, not this query' % (cursor.endpoint, cursor.params))
+
+    def _start_cursor(self):
+        """
+        Cursor to start the iteration from: the one passed to resume(), or the one saved to the checkpoint
+        A finished cursor left in the checkpoint starts the iteration again from the first page
+        :return: Cursor or None
+        """
+        cursor, self._resume_cursor = self._resume_cursor, None
+        if cursor is None and self._checkpoint is not None:
+            cursor = self._checkpoint.load()
+            if cursor is not None:
+                self._check_cursor(cursor)
+                if cursor.done:
+                    self._checkpoint.clear()
+                    cursor = None
+        return cursor
+
+    def _complete_page(self, page_no, completed, last_page, no_pages, offset=None):
+        """
+        Move the cursor on once a page has been consumed, saving it to the checkpoint every checkpoint.every pages
+        The checkpoint is cleared after the last page, so the next run of the query starts from the first page
+        :param page_no: page that was consumed
+        :param completed: number of pages consumed so far by this iteration
+        :param last_page: Boolean if it was the last page
+        :param no_pages: number of pages the API reported
+        :param offset: Optional: size of the export file once the page was written
+        """
+        if last_page and no_pages is None:
+            no_pages = page_no
+        self._cursor = Cursor(self._api.endpoint, self._api.params, page_no + 1, no_pages, self._max_page, offset)
+        if self._checkpoint is None:
+            return
+        if last_page:
+            self._checkpoint.clear()
+        elif completed % self._checkpoint.every == 0:
+            self._checkpoint.save(self._cursor)
+
+    def _record_page(self, obj):
+        """
+        Store a fetched page and move on to the next page number
+        :param obj: page object (DataHolder)
+        :return: Boolean if it was the last page
+        """
         last_page = False
-        while not last_page:
-            try:
-                obj = self._process_request(True)
-            except Exception as e:
-                raise StopIteration(*e.args)
-            if self._data_function_called_dict['all'] or self._data_function_called_dict['pages']:
-                self._pages_queryset += obj._pages_queryset
-            if self._no_pages is not None:
-                if self._max_page is not None:
-                    self._no_pages = self._max_page
-                if self._page_no == self._no_pages:
-                    last_page = True
-                    self._set_evaluated_function()
-                    self._page_no = 1
-                self._page_no += 1
-            else:
+        self._keep_page(obj)
+        if self._no_pages is not None:
+            if self._max_page is not None:
+                self._no_pages = self._max_page
+            if self._page_no == self._no_pages:
                 last_page = True
                 self._set_evaluated_function()
-            yield obj
+                self._page_no = 1
+            self._page_no += 1
+        else:
+            last_page = True
+            self._set_evaluated_function()
+        return last_page
+
+    def _iter_prefetched_pages(self, start, finish, completed=0):
+        """
+        Generator function that requests a range of pages concurrently but yields them in page order
+        :param start: first page to request
+        :param finish: last page to request
+        :param completed: number of pages already consumed by this iteration
+        :return: iterator for results pages
+        """
+        executor = ThreadPoolExecutor(max_workers=self._prefetch)
+        in_flight = collections.deque()
+        next_page = start
+        try:
+            while next_page <= finish or in_flight:
+                # keep at most one request per worker queued ahead of the consumer
+                next_page = self._queue_pages(in_flight, next_page, finish, self._prefetch,
+                                              lambda number, event: executor.submit(self._fetch_page, number, event))
+                page_no, event, future = in_flight.popleft()
+                obj = self._process_request(True, future.result(), event)
+                self._page_no = page_no
+                self._keep_page(obj)
+                yield obj
+                completed += 1
+                self._complete_page(page_no, completed, page_no == finish, self._no_pages)
+            self._finish_pages()
+        finally:
+            self._cancel_pages(in_flight)
+            executor.shutdown(wait=False)
+
+    def _keep_page(self, obj):
+        """
+        Add the rows of a page to this object, when all() / pages() keep every page
+        :param obj: page object (DataHolder)
+        """
+        if self._data_function_called_dict['all'] or self._data_function_called_dict['pages']:
+            self._pages_queryset += obj._pages_queryset
+
+    def _finish_pages(self):
+        """
+        Mark the pages as evaluated once the last one has been consumed
+        """
+        self._set_evaluated_function()
+        self._page_no = 1
 
     def __iter__(self):
         if self._needs_evaluating:
@@ -490,48 +1802,131 @@ class DataHolder(object):
                 for k, v in self._query.items():
                     yield k, v
 
-    def __getattribute__(self, item):
-        if isinstance(item, str):
-            item = item.lower().replace(' ', '_').strip()
-        if callable(object.__getattribute__(self, item)) and '_' not in item:
-            if item not in self._api.data_attributes:
-                raise AttributeError('%s method not allowed' % item)
-            # if item in self._api.data_attributes and True in self._data_function_called_dict.values():
-            #     raise AttributeError('%s method not allowed' % item)
-        return object.__getattribute__(self, item)
+    def __getattr__(self, item):
+        # only called when the normal lookup fails, e.g. obj.Price or obj.product_id before it was loaded
+        # a column name that has been seen before is resolved with a single lookup of the shared name map
+        attributes = self.__dict__
+        name = _attribute_names.get(item)
+        if name is not None and name in attributes:
+            return attributes[name]
+        name = attribute_name(item)
+        if name in attributes:
+            return attributes[name]
+        if isinstance(getattr(self.__class__, name, None), DataFunction):
+            raise AttributeError('%s method not allowed' % name)
+        if name != item:
+            return getattr(self, name)
+        raise AttributeError('%s object has no attribute %s' % (self.__class__.__name__, item))
+
+    def _evaluate(self):
+        """
+        Make the requests, unless the object has already been evaluated
+        """
+        if self._needs_evaluating:
+            collections.deque(self.__iter__(), maxlen=0)
+
+    def index_by(self, *columns):
+        """
+        Also index the rows by these columns, so obj[value] finds a row in O(1) e.g. prices.index_by('Product ID')[sku]
+        Rows are looked up by object name first, then by each column in the order they were added
+        :param columns: column names
+        :return: self
+        """
+        for column in columns:
+            name = attribute_name(column)
+            if name not in self._index_columns:
+                self._index_columns.append(name)
+        return self
+
+    def lookup(self, column, value):
+        """
+        Find a row by the value of a column, e.g. obj.lookup('id', 5), the first matching row is returned
+        :param column: column name, 'id' / 'system id' or '_object_name'
+        :param value: value to look for
+        :return: row (DataHolder or Row)
+        """
+        self._evaluate()
+        index = self._index(column if column == '_object_name' else attribute_name(column))
+        try:
+            return index[value]
+        except (KeyError, TypeError):
+            raise KeyError('No row with %s %r' % (column, value))
+
+    def _index(self, name):
+        """
+        Hash index of the loaded rows, built on first use and rebuilt once more rows have been loaded
+        :param name: attribute style column name or '_object_name'
+        :return: dict of value: first row with that value
+        """
+        if self._indexed_rows != len(self._pages_queryset):
+            self._indexes = dict()
+            self._indexed_rows = len(self._pages_queryset)
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = dict()
+            for row in self._pages_queryset:
+                value = self._row_value(row, name)
+                if value is None:
+                    continue
+                try:
+                    index.setdefault(value, row)
+                except TypeError:
+                    # lists / dicts can't be looked up
+                    continue
+        return index
+
+    @staticmethod
+    def _row_value(row, name):
+        """
+        Value of a column of a row as it was loaded
+        :param row: DataHolder or Row
+        :param name: attribute style column name or '_object_name'
+        :return: value or None
+        """
+        if name == '_object_name':
+            return row._object_name
+        if isinstance(row, Row):
+            position = row._schema.index.get(name)
+            return None if position is None else row._values[position]
+        return row.__dict__.get(name)
 
     def __getitem__(self, item):
-        # evaluate the generator
-        collections.deque(self.__iter__(), maxlen=0)
-        if isinstance(item, int):
+        self._evaluate()
+        if isinstance(item, (int, slice)):
             if self._pages_queryset:
                 return self._pages_queryset[item]
             else:
                 if self._data_function_evaluated_dict['all']:
                     return list(self)[0]
                 raise ValueError('Object is not Indexable')
-        else:
-            object_names = [x._object_name for x in self._pages_queryset]
-            try:
-                idx = object_names.index(item)
-            except ValueError:
-                try:
-                    # escape the variables
-                    query_keys = {k.replace(' ', '_').lower().strip(): k for k, v in self._query.items()}
-                    if item.replace(' ', '_').lower().strip() in query_keys.keys():
-                        return self._query[query_keys[item.replace(' ', '_').lower().strip()]]
-                    return self._query[item]
-                except ValueError:
-                    return self._pages_queryset[item]
-            return self._pages_queryset[idx]
+        if self._pages_queryset:
+            for name in ['_object_name'] + self._index_columns:
+                index = self._index(name)
+                if item in index:
+                    return index[item]
+        if item in self._query:
+            return self._query[item]
+        # escape the variables
+        key = self._attribute_map.get(attribute_name(item))
+        if key is not None and key in self._query:
+            return self._query[key]
+        return self._query[item]
+
+    def __setattr__(self, key, value):
+        if key.startswith('_'):
+            return object.__setattr__(self, key, value)
+        # track the change so save() only has to look at what has been set
+        name = attribute_name(key)
+        object.__setattr__(self, name, value)
+        self._changed.add(name)
+        self._deleted.discard(name)
 
     def __setitem__(self, key, value):
-        if hasattr(self, key):
-            object.__setattr__(self, key, value)
-        elif hasattr(self, key.replace(' ', '_').lower().strip()):
-            object.__setattr__(self, key.replace(' ', '_').lower().strip(), value)
-        else:
-            object.__setattr__(self, key, value)
+        name = attribute_name(key)
+        if name not in self._attribute_map:
+            # new column, keep its name for saving
+            self._attribute_map[name] = key
+        setattr(self, name, value)
 
     def __repr__(self):
         if len(self._pages_queryset) > 0:
@@ -539,8 +1934,7 @@ class DataHolder(object):
         return '<%s Object>' % self._object_name
 
     def __len__(self):
-        # evaluate the generator
-        collections.deque(self.__iter__(), maxlen=0)
+        self._evaluate()
         if self._query:
             return len(self._query)
         return len(self._pages_queryset)
@@ -557,21 +1951,16 @@ class DataHolder(object):
         return object.__delattr__(self, item)
 
     def __delattr__(self, item):
-        attr = []
-        try:
-            object.__getattribute__(self, item)
-            attr.append(item)
-        except AttributeError:
-            pass
-        try:
-            object.__getattribute__(self, item.lower().replace(' ', '_').strip())
-            attr.append(item.lower().replace(' ', '_').strip())
-        except AttributeError:
-            pass
+        if item.startswith('_'):
+            return self._delete_attribute(item)
+        name = attribute_name(item)
+        attr = [i for i in set([item, name]) if i in self.__dict__]
 
         if attr:
             for i in attr:
                 self._delete_attribute(i)
+            self._deleted.add(name)
+            self._changed.discard(name)
         else:
             raise AttributeError('Object has not attribute %s' % item)
 
@@ -588,35 +1977,467 @@ class DataHolder(object):
         return self._query.items()
 
 
+# column names -> Row class of that column layout, shared by every RowSchema with the same columns
+_row_classes = dict()
+_MAX_ROW_CLASSES = 1000
+
+
+def _column_property(position):
+    """
+    Read-only property for a column of a Row
+    :param position: position of the column in the row's values
+    :return: property
+    """
+    return property(lambda row: row._values[position])
+
+
+def row_class(keys, index):
+    """
+    Row class for a column layout, with a property per column name & attribute style name, so row.Price and
+    row.product_id are found by the normal attribute lookup rather than a failed lookup followed by __getattr__
+    Columns named like a Row method or starting with an underscore are left to Row.__getattr__ / row[key]
+    :param keys: tuple of column names
+    :param index: dict of column name / attribute name: position
+    :return: Row subclass
+    """
+    cls = _row_classes.get(keys)
+    if cls is None:
+        attributes = dict((name, _column_property(position)) for name, position in index.items()
+                          if not name.startswith('_') and not hasattr(Row, name))
+        attributes['__slots__'] = ()
+        cls = type('Row', (Row,), attributes)
+        if len(_row_classes) < _MAX_ROW_CLASSES:
+            _row_classes[keys] = cls
+    return cls
+
+
+class RowSchema(object):
+    __slots__ = ('holder', 'object_name', 'keys', 'index', 'row_class')
+
+    def __init__(self, holder, keys):
+        """
+        Column layout shared by every Row with the same columns, the attribute style names are worked out once here
+        rather than for every row
+        :param holder: DataHolder the rows were fetched by
+        :param keys: tuple of column names
+        """
+        self.holder = holder
+        self.object_name = holder._api.object_name
+        self.keys = keys
+        self.index = dict()
+        for i, key in enumerate(keys):
+            self.index[key] = i
+        for i, key in enumerate(keys):
+            self.index.setdefault(attribute_name(key), i)
+        if 'system_id' in self.index:
+            self.index.setdefault('id', self.index['system_id'])
+        self.row_class = row_class(keys, self.index)
+
+
+class Row(object):
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        """
+        Lightweight read-only row, supports row['Product ID'], row.product_id & items()
+        Use edit() to get an editable DataHolder for saving changes
+        :param schema: RowSchema
+        :param values: tuple of values in the order of schema.keys
+        """
+        self._schema = schema
+        self._values = values
+
+    @property
+    def _object_name(self):
+        return self._schema.object_name
+
+    def _index(self, item):
+        index = self._schema.index
+        if item in index:
+            return index[item]
+        return index[attribute_name(item)]
+
+    def __getitem__(self, item):
+        try:
+            return self._values[self._index(item)]
+        except (KeyError, AttributeError):
+            raise KeyError(item)
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        try:
+            return self._values[self._schema.index[item]]
+        except KeyError:
+            raise AttributeError('Row has no attribute %s' % item)
+
+    def __setitem__(self, key, value):
+        raise TypeError('Row is read-only, use edit() to get an editable object')
+
+    def __contains__(self, item):
+        try:
+            self._index(item)
+        except (KeyError, AttributeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(zip(self._schema.keys, self._values))
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '<%s Row>' % self._schema.object_name
+
+    def __str__(self):
+        return str(self.to_dict())
+
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._schema.keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._schema.keys, self._values))
+
+    def to_dict(self):
+        return dict(zip(self._schema.keys, self._values))
+
+    def edit(self):
+        """
+        Get an editable copy of this row
+        :return: DataHolder obj
+        """
+        return self._schema.holder._build_child(self.to_dict())
+
+    def delete(self, attribute=None):
+        """
+        Deletes the Data Object
+        :param attribute: Optional: for deleting a single value
+        :return: DataHolder obj
+        """
+        return self.edit().delete(attribute)
+
+
+class SaveBatch(object):
+    def __init__(self, api, chunk_size=500, max_workers=1):
+        """
+        Unit of work for saving edited objects, use through BlackCurveAPI.batch()
+        Data source rows are sent as lists of up to chunk_size rows, the other endpoints one request per object
+        A batch opened inside another one adds its saves to the outer batch, they are sent when the outermost exits
+        :param api: API Credentials object (BlackCurveAPI)
+        :param chunk_size: Optional: number of rows sent per request (500)
+        :param max_workers: Optional: number of requests in flight at once (1)
+        """
+        self._api = api
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self._pending = list()
+        # number of blocks open on this batch, when it is the outermost one
+        self._depth = 0
+
+    def __enter__(self):
+        self._open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        batch = self._close()
+        if batch is not None and exc_type is None:
+            batch.flush()
+
+    def _open(self):
+        """
+        Start queueing saves, in the batch already open if there is one
+        """
+        state = self._api._batch_state
+        outer = getattr(state, 'batch', None)
+        if outer is None:
+            state.batch = outer = self
+        outer._depth += 1
+
+    def _close(self):
+        """
+        Close a block, saves stop being queued once the outermost one is closed
+        :return: the batch to flush, None when closing an inner block
+        """
+        state = self._api._batch_state
+        outer = state.batch
+        outer._depth -= 1
+        if outer._depth:
+            return None
+        state.batch = None
+        return outer
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, holder, data):
+        """
+        Queue an object to be saved
+        :param holder: DataHolder obj
+        :param data: the data to save (None if only attributes have been deleted)
+        """
+        self._pending.append((holder, data))
+
+    def _build_requests(self, pending):
+        """
+        Group the queued saves into requests
+        :param pending: list of (DataHolder, data)
+        :return: iterator of (list of (DataHolder, data), request params)
+        """
+        data_sources = collections.OrderedDict()
+        for entry in pending:
+            holder, data = entry
+            if data is None:
+                continue
+            if 'data_sources/' in holder._api.endpoint:
+                data_sources.setdefault(holder._api.endpoint, []).append(entry)
+            else:
+                yield [entry], holder._build_request_params('POST', holder.build_json(data))
+        for entries in data_sources.values():
+            for chunk in DataHolder._iter_chunks(entries, self.chunk_size):
+                holder = chunk[0][0]
+                yield chunk, holder._build_request_params('POST', holder.build_json([data for _, data in chunk]))
+
+    def _send(self, request):
+        """
+        Send one grouped request (safe to call from worker threads)
+        :param request: (chunk number, (list of (DataHolder, data), request params))
+        :return: (chunk number, entries, exception or None)
+        """
+        chunk_no, (entries, params) = request
+        try:
+            entries[0][0]._get_response(params)
+        except Exception as e:
+            return chunk_no, entries, e
+        return chunk_no, entries, None
+
+    def flush(self):
+        """
+        Send every queued save
+        """
+        pending, self._pending = self._pending, list()
+        results = map_bounded(self._send, enumerate(self._build_requests(pending)), self.max_workers)
+        for holder, deleted in self._saved(pending, results):
+            if deleted:
+                holder.delete(list(deleted.keys()))
+            holder._mark_saved()
+        self._check_results(results)
+
+    @staticmethod
+    def _saved(pending, results):
+        """
+        The objects whose requests succeeded
+        :param pending: list of (DataHolder, data) that were sent
+        :param results: list of (chunk number, entries, exception or None)
+        :return: iterator of (DataHolder, dict of the deleted attributes still to delete)
+        """
+        failed_holders = set(id(holder) for _, entries, e in results if e is not None for holder, _ in entries)
+        for holder, _ in pending:
+            if id(holder) in failed_holders:
+                continue
+            deleted = holder._get_deleted_attributes()
+            yield holder, deleted if holder._api.endpoint == 'data_sources_info/' else None
+
+    @staticmethod
+    def _check_results(results):
+        """
+        :param results: list of (chunk number, entries, exception or None)
+        :raises BatchSaveException: if any request failed
+        """
+        failed = [(chunk_no, [data for _, data in entries], e) for chunk_no, entries, e in results if e is not None]
+        if failed:
+            raise BatchSaveException(failed)
+
+
 class BlackCurveAPI(object):
-    def __init__(self, subdomain, access_token=None):
+    _data_holder_class = DataHolder
+
+    def __init__(self, subdomain, access_token=None, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=None, cache=None, scheduler=None, client_key=None, client_secret=None,
+                 coalesce=True, transport=None, domain=None):
         """
         This is the base class for accessing the API either by obtaining an access token by providing a key and secret
         or by just providing a pre-existing token
+        Every endpoint call returns an independent query sharing the transport, hooks & credentials, so one client can
+        be used from several threads
+        With the client key & secret an expired token is refreshed automatically and the refused requests are sent
+        again, one refresh at a time however many requests were refused
         :param subdomain: Your BlackCurve subdomain (name of company usually)
         :param access_token: Optional: API access token obtained
+        :param pool_connections: Optional: number of host connection pools to cache (10)
+        :param pool_maxsize: Optional: max number of connections kept open per host (10)
+        :param pool_block: Optional: block when a host pool is exhausted instead of opening extra connections (False)
+        :param keep_alive: Optional: reuse connections between requests (True)
+        :param timeout: Optional: request timeout in seconds, or a (connect, read) tuple
+        :param cache: Optional: ResponseCache for GET responses, writes invalidate the endpoint they touch
+        :param scheduler: Optional: RequestScheduler rate limiting & retrying requests, False to send requests
+        straight away without retrying them (a RequestScheduler with the default settings)
+        :param client_key: Optional: client key used to get & refresh the access token
+        :param client_secret: Optional: client secret used to get & refresh the access token
+        :param coalesce: Optional: identical GET requests made at the same time share one request & response (True)
+        :param transport: Optional: transport sending the requests, or the name of one built with the pool settings:
+        'requests', 'urllib3' or 'http2' (requires httpx[http2]) ('requests'). FakeTransport answers requests
+        in-process
+        :param domain: Optional: base url of the API, e.g. a local stand-in server
+        ('https://<subdomain>.blackcurve.io/api/')
+        """
+        self.subdomain = subdomain
+        self.domain = domain or 'https://%s.blackcurve.io/api/' % subdomain
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = RequestScheduler() if scheduler is None else scheduler or None
+        self.coalescer = self._build_coalescer() if coalesce else None
+        self.hooks = []
+        self._batch_state = threading.local()
+        self.transport = self._build_transport(transport, pool_connections, pool_maxsize, pool_block, keep_alive)
+        self.credentials = Credentials(access_token, client_key, client_secret)
+        self.all_data_attributes = ('all', 'page', 'find', 'pages')
+        self._reset_query()
+
+    def _reset_query(self):
+        """
+        Set the query state of a client that hasn't called an endpoint
         """
-        self.domain = 'https://%s.blackcurve.io/api/' % subdomain
         self.object_name = 'BlackCurve API'
-        self.access_token = access_token
         self.current_request = None
-        self.all_data_attributes = ['all', 'page', 'find', 'pages']
         self.data_attributes = self.all_data_attributes
         self.response_data_name = 'data'
         self.endpoint = None
-        self.params = {}
+        self.params = freeze_params(None)
         self.method = None
         self.after_find_attributes = None
-        self._data_holder = DataHolder(self)
+        self.id_filter = None
+        self.unique_ids = True
+        self._data_holder = self._data_holder_class(self)
         self._can_only_change_attributes = False
         self._is_updatable = True
         self._endpoint_called = False
 
+    def _clone(self):
+        """
+        Copy of this object sharing the transport, hooks & credentials
+        :return: BlackCurveAPI
+        """
+        clone = object.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+    def _new_query(self):
+        """
+        New query sharing the transport, hooks & credentials of this object, for an endpoint method to set up
+        :return: BlackCurveAPI
+        """
+        query = self._clone()
+        query._reset_query()
+        return query
+
+    def _with_params(self, **params):
+        """
+        Copy of this query with some of its params changed, this query is left as it is
+        :param params: params to change
+        :return: BlackCurveAPI
+        """
+        query = self._clone()
+        query._set_request_attributes(self.endpoint, self.method, dict(self.params or {}, **params))
+        query._data_holder = query._data_holder_class(query)
+        return query
+
+    @staticmethod
+    def _build_coalescer():
+        """
+        Build the coalescer shared by every query made through this object
+        :return: RequestCoalescer
+        """
+        return RequestCoalescer()
+
+    @staticmethod
+    def _build_transport(transport, pool_connections, pool_maxsize, pool_block, keep_alive):
+        """
+        Build the transport shared by every request made through this object
+        :param transport: transport, transport name or None for the requests one
+        :param pool_connections: number of host connection pools to cache
+        :param pool_maxsize: max number of connections kept open per host
+        :param pool_block: block when a host pool is exhausted
+        :param keep_alive: reuse connections between requests
+        :return: transport
+        """
+        if transport is None or isinstance(transport, str):
+            return build_transport(transport or 'requests', pool_connections, pool_maxsize, pool_block, keep_alive)
+        return transport
+
+    @property
+    def session(self):
+        """
+        The transport, kept for code written before transports could be swapped
+        """
+        return self.transport
+
+    @session.setter
+    def session(self, transport):
+        self.transport = transport
+
+    def close(self):
+        """
+        Close the pooled connections
+        """
+        self.transport.close()
+
+    def add_hook(self, hook):
+        """
+        Call hook with a RequestEvent after every request, e.g. a blackcurve.metrics.MetricsCollector
+        Requests aren't timed at all while no hooks are registered
+        :param hook: function taking a RequestEvent
+        :return: hook
+        """
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        """
+        Stop calling a hook
+        :param hook: hook passed to add_hook()
+        """
+        self.hooks.remove(hook)
+
+    def _emit(self, event):
+        """
+        Report a request to the hooks
+        :param event: RequestEvent
+        """
+        for hook in list(self.hooks):
+            hook(event)
+
+    def batch(self, chunk_size=500, max_workers=1):
+        """
+        Group the save() calls made inside a with block into bulk requests sent when the block exits, a block inside
+        another one joins it
+        :param chunk_size: Optional: number of rows sent per request (500)
+        :param max_workers: Optional: number of requests in flight at once (1)
+        :return: SaveBatch
+        """
+        return SaveBatch(self, chunk_size, max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def __getattr__(self, name):
         if name in object.__getattribute__(self, 'data_attributes'):
             if not self._endpoint_called:
                 raise AttributeError('You need to call an endpoint before a data function, e.g. inst.prices().all()')
-            return getattr(self._data_holder, name)
+            # every data function runs on a new object, so calls on the same query don't see each other's state
+            return getattr(self._data_holder_class(self), name)
         elif name == '__deepcopy__':
             return None
         else:
@@ -624,33 +2445,86 @@ class BlackCurveAPI(object):
 
     def _set_request_attributes(self, endpoint, method, params=None):
         self.endpoint = endpoint
-        self.params = params
+        self.params = freeze_params(params)
         self.method = method
-        self.headers = {
-            'Authorization': "Bearer %s" % self.access_token,
+
+    @property
+    def access_token(self):
+        return self.credentials.access_token
+
+    @access_token.setter
+    def access_token(self, value):
+        self.credentials.access_token = value
+
+    @property
+    def headers(self):
+        """
+        Headers sent with every request, with the current access token
+        :return: dict
+        """
+        return {
+            'Authorization': self.credentials.authorization,
         }
 
     def get_access_token(self, client_key, client_secret):
         """
         Obtains a new access token, this will change your token for the API credentials
-        The token is set on this object as access_token
+        The token is set on this object as access_token, the key & secret are kept to refresh it when it expires
         :param client_key: Your client key
         :param client_secret: Your client secret
         """
+        self.credentials.client_key = client_key
+        self.credentials.client_secret = client_secret
+        self.access_token = self._fetch_access_token(client_key, client_secret)
+        return self.access_token
+
+    def _fetch_access_token(self, client_key, client_secret):
+        """
+        Request a new access token
+        :param client_key: Your client key
+        :param client_secret: Your client secret
+        :return: access token
+        """
+        params = self._build_access_token_params(client_key, client_secret)
+        response = self.transport.request(timeout=self.timeout, **params)
+        return self._read_access_token(serialisation.loads(response.text))
+
+    def _refresh_access_token(self, params):
+        """
+        Get a new access token for a request refused with an expired one, requests refused at the same time share
+        a single refresh
+        :param params: http parameters of the refused request
+        :return: the http parameters with the new token
+        """
+        self.credentials.refresh(params['headers'].get('Authorization'), self._fetch_access_token)
+        return dict(params, headers=dict(params['headers'], **self.headers))
+
+    def _build_access_token_params(self, client_key, client_secret):
+        """
+        Build the request params for obtaining a new access token
+        :param client_key: Your client key
+        :param client_secret: Your client secret
+        :return: dict of the params to make the request
+        """
         url = self.domain + 'token/'
         payload = "CLIENT_KEY=%s&CLIENT_SECRET=%s" % (client_key, client_secret)
         headers = {
             'Content-Type': "application/x-www-form-urlencoded",
         }
+        return {'method': 'POST', 'url': url, 'data': payload, 'headers': headers}
 
-        response = requests.request("POST", url, data=payload, headers=headers)
-        response = json.loads(response.text)
+    def _read_access_token(self, response):
+        """
+        Get the access token out of a decoded token/ response
+        :param response: decoded response
+        :return: access token
+        """
         if 'token' in response.keys():
-            self.access_token = response['token']
-            return self.access_token
+            return response['token']
         else:
             raise APIException('Bad Response getting Access Token %s' % response['error'])
 
+    @endpoint_method
     def prices(self, columns=None, geography=None, changes_only=True, **kwargs):
         """
         :param columns: Optional: list of columns you want back
@@ -659,10 +2533,13 @@ class BlackCurveAPI(object):
         :param kwargs: Optional: filter columns eg. brand=['nike', 'addidas']
         :return: Current Prices
         """
-        self._data_holder = DataHolder(self)
+        self._data_holder = self._data_holder_class(self)
         self.object_name = 'Price'
-        self.data_attributes = ['all', 'page', 'find', 'pages']
-        self.after_find_attributes = ['all']
+        self.data_attributes = ('all', 'page', 'find', 'find_many', 'pages', 'export')
+        self.after_find_attributes = ('all',)
+        self.id_filter = 'product_id'
+        # a product has a price per geography
+        self.unique_ids = False
         self.response_data_name = 'prices'
         self._is_updatable = False
         self._endpoint_called = True
@@ -682,14 +2559,16 @@ class BlackCurveAPI(object):
         self._set_request_attributes(endpoint, 'GET', params)
         return self
 
+    @endpoint_method
     def data_sources_info(self):
         """
         Retrieves the column names and data types for all data sources
         :return: column names and types for each source
         """
-        self._data_holder = DataHolder(self)
+        self._data_holder = self._data_holder_class(self)
         self.object_name = 'Data Sources Info'
-        self.data_attributes = ['all', 'find', 'delete', 'save', 'create']
+        self.data_attributes = ('all', 'find', 'delete', 'save', 'create', 'batch_create')
+        self.id_filter = None
         self.response_data_name = None
         endpoint = 'data_sources_info/'
         self._set_request_attributes(endpoint, 'GET')
@@ -698,6 +2577,7 @@ class BlackCurveAPI(object):
         self._endpoint_called = True
         return self
 
+    @endpoint_method
     def data_sources(self, source_name, columns=None, **kwargs):
         """
         Gets a list of data from a given data source.
@@ -705,9 +2585,11 @@ class BlackCurveAPI(object):
         :param columns: Optional: The required columns from the DataSource
         :return: Data from a given / all data sources
         """
-        self._data_holder = DataHolder(self)
+        self._data_holder = self._data_holder_class(self)
         self.object_name = 'Data Sources'
-        self.data_attributes = ['all', 'page', 'create', 'batch_create', 'pages', 'find', 'save', 'delete']
+        self.data_attributes = ('all', 'page', 'create', 'batch_create', 'pages', 'find', 'find_many', 'save', 'delete',
+                                'export')
+        self.id_filter = 'id'
         self.response_data_name = 'data'
         endpoint = 'data_sources/%s' % source_name
         params = {}
@@ -721,15 +2603,17 @@ class BlackCurveAPI(object):
         self._endpoint_called = True
         return self
 
+    @endpoint_method
     def geographies(self, geography_name=None):
         """
         Gets a list of Geographies (or a single geography if name is specified) and associated data
         :param geography_name: Name of the geography (Optional)
         :return: Geography Data
         """
-        self._data_holder = DataHolder(self)
+        self._data_holder = self._data_holder_class(self)
         self.object_name = 'Geographies'
-        self.data_attributes = ['all']
+        self.data_attributes = ('all',)
+        self.id_filter = None
         self.response_data_name = 'data'
         endpoint = 'geographies/'
         if geography_name is not None:
@@ -739,14 +2623,16 @@ class BlackCurveAPI(object):
         self._endpoint_called = True
         return self
 
+    @endpoint_method
     def currencies(self):
         """
         Gets a list of Currencies and associated data
         :return: Currency Data
         """
-        self._data_holder = DataHolder(self)
+        self._data_holder = self._data_holder_class(self)
         self.object_name = 'Currencies'
-        self.data_attributes = ['all', 'save']
+        self.data_attributes = ('all', 'save')
+        self.id_filter = None
         self.response_data_name = 'data'
         endpoint = 'currencies/'
 
@@ -0,0 +1,65 @@
+import threading
+
+
+def token_expired(response):
+    """
+    Was the request refused because its access token has expired (or isn't valid)
+    :param response: http response
+    :return: Boolean
+    """
+    if response.status_code == 401:
+        return True
+    if response.status_code == 403:
+        text = response.text.lower()
+        return 'token' in text and ('expired' in text or 'invalid' in text)
+    return False
+
+
+class Credentials(object):
+    def __init__(self, access_token=None, client_key=None, client_secret=None):
+        """
+        Access token of a BlackCurveAPI, shared by every query made from it
+        With the client key & secret the token is refreshed when it expires, one refresh at a time however many
+        requests were refused
+        :param access_token: Optional: API access token obtained
+        :param client_key: Optional: client key used to refresh the token
+        :param client_secret: Optional: client secret used to refresh the token
+        """
+        self.access_token = access_token
+        self.client_key = client_key
+        self.client_secret = client_secret
+        self._lock = threading.Lock()
+        # asyncio.Lock of AsyncBlackCurveAPI refreshes, created on the first one
+        self.async_lock = None
+
+    @property
+    def can_refresh(self):
+        return self.client_key is not None and self.client_secret is not None
+
+    @property
+    def authorization(self):
+        """
+        :return: Authorization header value
+        """
+        return "Bearer %s" % self.access_token
+
+    def is_current(self, authorization):
+        """
+        Was a request sent with the current token, i.e. the token hasn't been refreshed since
+        :param authorization: Authorization header the request was sent with
+        :return: Boolean
+        """
+        return authorization == self.authorization
+
+    def refresh(self, authorization, fetch):
+        """
+        Get a new token for a refused request, unless it has already been refreshed since the request was sent
+        Requests refused at the same time wait for the first refresh and share its token
+        :param authorization: Authorization header the refused request was sent with
+        :param fetch: function taking the client key & secret and returning a new token
+        :return: access token
+        """
+        with self._lock:
+            if self.is_current(authorization):
+                self.access_token = fetch(self.client_key, self.client_secret)
+            return self.access_token
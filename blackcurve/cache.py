@@ -0,0 +1,117 @@
+import collections
+import threading
+import time
+
+# endpoints that rarely change are cached for an hour by default
+DEFAULT_TTLS = {
+    'data_sources_info/': 3600,
+    'currencies/': 3600,
+    'geographies/': 3600,
+}
+
+
+class CacheEntry(object):
+    __slots__ = ('value', 'expires', 'etag', 'last_modified')
+
+    def __init__(self, value, expires, etag=None, last_modified=None):
+        """
+        A cached decoded response
+        :param value: decoded response
+        :param expires: time (time.time()) the entry goes stale
+        :param etag: Optional: ETag header of the response
+        :param last_modified: Optional: Last-Modified header of the response
+        """
+        self.value = value
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires
+
+    @property
+    def revalidatable(self):
+        return self.etag is not None or self.last_modified is not None
+
+
+class ResponseCache(object):
+    def __init__(self, max_entries=1024, ttls=None, default_ttl=None):
+        """
+        In-memory LRU cache of decoded GET responses keyed on the request url, pass one to BlackCurveAPI(cache=...)
+        Any object with the same ttl / get / set / touch / invalidate methods can be used instead
+        :param max_entries: Optional: max number of responses kept, least recently used are evicted first (1024)
+        :param ttls: Optional: dict of endpoint prefix: seconds responses are fresh for (DEFAULT_TTLS)
+        :param default_ttl: Optional: seconds for any other endpoint, None to not cache them (None)
+        """
+        self.max_entries = max_entries
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl(self, endpoint):
+        """
+        Seconds responses from an endpoint stay fresh for
+        :param endpoint: endpoint path, e.g. 'currencies/'
+        :return: seconds or None if the endpoint is not cached
+        """
+        for prefix, ttl in self.ttls.items():
+            if endpoint.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """
+        Get a cached response, stale entries are returned as long as they can be revalidated
+        :param key: request url
+        :return: CacheEntry or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.fresh and not entry.revalidatable:
+                del self._entries[key]
+                return None
+            # re-insert to mark as most recently used
+            self._entries[key] = self._entries.pop(key)
+            return entry
+
+    def set(self, key, value, ttl, etag=None, last_modified=None):
+        """
+        Cache a response
+        :param key: request url
+        :param value: decoded response
+        :param ttl: seconds the response is fresh for
+        :param etag: Optional: ETag header of the response
+        :param last_modified: Optional: Last-Modified header of the response
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = CacheEntry(value, time.time() + ttl, etag, last_modified)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key, ttl):
+        """
+        Mark a revalidated (304 Not Modified) entry as fresh again
+        :param key: request url
+        :param ttl: seconds the response is fresh for
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires = time.time() + ttl
+
+    def invalidate(self, prefix=''):
+        """
+        Drop every cached response whose url starts with prefix
+        :param prefix: Optional: url prefix, everything if empty
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,135 @@
+import json
+import os
+
+# os.replace is atomic on every platform, Python 2 only has rename
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _normalise(params):
+    """
+    Params as they come back from JSON, so a saved cursor compares equal to the query it was saved from
+    :param params: mapping of request params or None
+    :return: dict
+    """
+    return json.loads(json.dumps(dict(params or {}), sort_keys=True, default=str))
+
+
+class Cursor(object):
+    def __init__(self, endpoint, params, page, no_pages=None, finish=None, offset=None):
+        """
+        Position of a paginated query, the next page to request
+        :param endpoint: endpoint path, e.g. 'data_sources/Sales History'
+        :param params: request params of the query
+        :param page: next page to request
+        :param no_pages: Optional: number of pages the API reported
+        :param finish: Optional: last page of a pages() range
+        :param offset: Optional: size of the export file once the pages before page had been written
+        """
+        self.endpoint = endpoint
+        self.params = _normalise(params)
+        self.page = page
+        self.no_pages = no_pages
+        self.finish = finish
+        self.offset = offset
+
+    @property
+    def done(self):
+        """
+        Has every page been consumed
+        :return: Boolean
+        """
+        last = self.finish if self.finish is not None else self.no_pages
+        return last is not None and self.page > last
+
+    def matches(self, endpoint, params):
+        """
+        Was the cursor saved from this query
+        :param endpoint: endpoint path
+        :param params: request params
+        :return: Boolean
+        """
+        return self.endpoint == endpoint and self.params == _normalise(params)
+
+    def to_dict(self):
+        return dict(endpoint=self.endpoint, params=self.params, page=self.page, no_pages=self.no_pages,
+                    finish=self.finish, offset=self.offset)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['endpoint'], data['params'], data['page'], data.get('no_pages'), data.get('finish'),
+                   data.get('offset'))
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def __eq__(self, other):
+        return isinstance(other, Cursor) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<Cursor %s page %s of %s>' % (self.endpoint, self.page, self.finish or self.no_pages)
+
+
+class MemoryCheckpoint(object):
+    def __init__(self, every=1):
+        """
+        Keeps the latest cursor of a query in memory, e.g. to retry a failed iteration in the same process
+        :param every: Optional: save the cursor every this many pages (1)
+        """
+        self.every = every
+        self.cursor = None
+
+    def load(self):
+        """
+        :return: the saved Cursor or None
+        """
+        return self.cursor
+
+    def save(self, cursor):
+        """
+        :param cursor: Cursor
+        """
+        self.cursor = cursor
+
+    def clear(self):
+        self.cursor = None
+
+
+class FileCheckpoint(object):
+    def __init__(self, path, every=1):
+        """
+        Keeps the latest cursor of a query in a JSON file, so an export can be resumed after a restart
+        The file is replaced atomically, it always holds a complete cursor
+        :param path: file path
+        :param every: Optional: save the cursor every this many pages (1)
+        """
+        self.every = every
+        self.path = path
+
+    def load(self):
+        """
+        :return: the saved Cursor or None
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return Cursor.from_json(f.read())
+
+    def save(self, cursor):
+        """
+        :param cursor: Cursor
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(cursor.to_json())
+        _replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
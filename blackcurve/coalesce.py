@@ -0,0 +1,64 @@
+import threading
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def request_key(params):
+    """
+    Requests with the same key get the same response
+    :param params: http parameters
+    :return: hashable key
+    """
+    return params['method'], params['url'], tuple(sorted(params['headers'].items()))
+
+
+class RequestCoalescer(object):
+    def __init__(self):
+        """
+        Shares one call between identical requests made at the same time: while a request is in flight, the same
+        request from other threads waits for it and gets its result (or exception) instead of being sent again
+        Nothing is kept once the request has finished, so unlike a cache a result is never stale
+        """
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def call(self, key, func):
+        """
+        Call func, unless a call with the same key is already in flight, then wait for it
+        :param key: request key
+        :param func: function making the request
+        :return: (result, Boolean if the result was shared from a call already in flight)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def __len__(self):
+        """
+        :return: number of requests in flight
+        """
+        return len(self._calls)
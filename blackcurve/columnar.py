@@ -0,0 +1,204 @@
+import collections
+import datetime
+
+# BlackCurve column types (data_sources_info) -> kind of column
+_KIND_KEYWORDS = (
+    ('datetime', ('datetime', 'timestamp')),
+    ('date', ('date',)),
+    ('bool', ('bool',)),
+    ('int', ('int',)),
+    ('float', ('decimal', 'float', 'double', 'number', 'numeric', 'currency', 'money', 'percent')),
+)
+
+
+def column_kind(type_name):
+    """
+    Work out the kind of column from a BlackCurve column type
+    :param type_name: column type, e.g. 'Integer'
+    :return: 'int', 'float', 'bool', 'date', 'datetime' or 'str'
+    """
+    type_name = str(type_name).lower()
+    for kind, keywords in _KIND_KEYWORDS:
+        for keyword in keywords:
+            if keyword in type_name:
+                return kind
+    return 'str'
+
+
+def _value_kind(value):
+    """
+    :param value: value that isn't None
+    :return: 'int', 'float', 'bool', 'date', 'datetime' or 'str'
+    """
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, datetime.datetime):
+        return 'datetime'
+    if isinstance(value, datetime.date):
+        return 'date'
+    return 'str'
+
+
+# kinds of values that can share a column -> kind of that column, any other mix is a str column
+_MIXED_KINDS = {
+    frozenset(('int', 'float')): 'float',
+    frozenset(('date', 'datetime')): 'datetime',
+}
+
+
+def infer_kind(values):
+    """
+    Work out the kind of column from every one of its values (when there is no column type)
+    :param values: list of values
+    :return: 'int', 'float', 'bool', 'date', 'datetime' or 'str'
+    """
+    kinds = frozenset(_value_kind(value) for value in values if value is not None)
+    if len(kinds) == 1:
+        return next(iter(kinds))
+    return _MIXED_KINDS.get(kinds, 'str')
+
+
+def collect_columns(rows):
+    """
+    Build a list of values per column from decoded rows, missing values are filled with None
+    :param rows: iterator of dicts
+    :return: OrderedDict of column name: list of values, number of rows
+    """
+    columns = collections.OrderedDict()
+    count = 0
+    for row in rows:
+        for key, value in row.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * count
+            column.append(value)
+        count += 1
+        for column in columns.values():
+            if len(column) < count:
+                column.append(None)
+    return columns, count
+
+
+def column_kinds(columns, column_types=None):
+    """
+    Kind of each column, from the data source column types where there are any, otherwise from the values
+    :param columns: OrderedDict of column name: list of values
+    :param column_types: Optional: dict of column name: BlackCurve column type
+    :return: dict of column name: kind
+    """
+    column_types = column_types or dict()
+    kinds = dict()
+    for name, values in columns.items():
+        if name in column_types:
+            kind = column_kind(column_types[name])
+            # a float in an integer column makes it a float one, rather than being truncated
+            if kind == 'int' and infer_kind(values) == 'float':
+                kind = 'float'
+            kinds[name] = kind
+        else:
+            kinds[name] = infer_kind(values)
+    return kinds
+
+
+def _numpy_column(np, values, kind):
+    """
+    Convert a list of values to a typed numpy array, falling back to an object array for values that don't fit
+    Values are never truncated: a float among ints gives a float array, a string that isn't a whole number an object one
+    :param np: numpy module
+    :param values: list of values
+    :param kind: kind of column
+    :return: numpy array
+    """
+    has_missing = None in values
+    try:
+        if kind == 'int' and not has_missing:
+            array = np.array(values)
+            if array.dtype.kind == 'f':
+                return array
+            return array.astype('int64')
+        if kind in ('int', 'float'):
+            return np.array([np.nan if v is None else v for v in values], dtype='float64')
+        if kind == 'bool' and not has_missing:
+            return np.array(values, dtype='bool')
+        if kind in ('date', 'datetime'):
+            return np.array(['NaT' if v is None else v for v in values],
+                            dtype='datetime64[D]' if kind == 'date' else 'datetime64[us]')
+    except (ValueError, TypeError, OverflowError):
+        pass
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def to_numpy(columns, kinds):
+    """
+    Build a numpy structured array
+    :param columns: OrderedDict of column name: list of values
+    :param kinds: dict of column name: kind
+    :return: numpy structured array
+    """
+    import numpy as np
+    arrays = [(str(name), _numpy_column(np, values, kinds[name])) for name, values in columns.items()]
+    length = len(arrays[0][1]) if arrays else 0
+    output = np.empty(length, dtype=[(name, array.dtype) for name, array in arrays])
+    for name, array in arrays:
+        output[name] = array
+    return output
+
+
+def to_pandas(columns, kinds):
+    """
+    Build a pandas DataFrame, integer & boolean columns with missing values use the nullable pandas dtypes
+    :param columns: OrderedDict of column name: list of values
+    :param kinds: dict of column name: kind
+    :return: pandas DataFrame
+    """
+    import numpy as np
+    import pandas as pd
+    data = collections.OrderedDict()
+    for name, values in columns.items():
+        kind = kinds[name]
+        if kind in ('int', 'bool') and None in values:
+            try:
+                data[name] = pd.array(values, dtype='Int64' if kind == 'int' else 'boolean')
+                continue
+            except (ValueError, TypeError):
+                pass
+        data[name] = _numpy_column(np, values, kind)
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def _arrow_types(pa):
+    """
+    :param pa: pyarrow module
+    :return: dict of kind: pyarrow type
+    """
+    return dict(int=pa.int64(), float=pa.float64(), bool=pa.bool_(), date=pa.date32(), datetime=pa.timestamp('us'),
+                str=pa.string())
+
+
+def to_arrow(columns, kinds):
+    """
+    Build a pyarrow Table, missing values are nulls whatever the kind of column
+    :param columns: OrderedDict of column name: list of values
+    :param kinds: dict of column name: kind
+    :return: pyarrow Table
+    """
+    import pyarrow as pa
+    types = _arrow_types(pa)
+    arrays = []
+    for name, values in columns.items():
+        arrow_type = types[kinds[name]]
+        try:
+            # the values' own type first, then a safe cast, which raises rather than truncating
+            array = pa.array(values)
+            if array.type != arrow_type:
+                array = array.cast(arrow_type)
+        except (pa.ArrowException, ValueError, TypeError):
+            array = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in columns])
@@ -0,0 +1,257 @@
+import collections
+import csv
+import io
+import json
+import os
+import sys
+
+from blackcurve import columnar
+
+# file extension -> export format
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+}
+
+
+# formats an export can be resumed in, by appending to the file
+RESUMABLE = ('csv', 'ndjson')
+
+
+def export_format(path, format=None):
+    """
+    Work out the format of an export
+    :param path: file path
+    :param format: Optional: 'csv', 'ndjson' or 'parquet', from the file extension by default
+    :return: format
+    """
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if format is None:
+            raise ValueError('Can\'t tell the export format of %s, pass format=' % path)
+    if format not in WRITERS:
+        raise ValueError('Unknown export format %s (%s)' % (format, ', '.join(sorted(WRITERS))))
+    return format
+
+
+# Python 2's csv module only writes byte strings
+if sys.version_info >= (3, 0):
+    def _open_csv(path, mode='w'):
+        return io.open(path, mode, newline='', encoding='utf-8')
+
+    def _csv_value(value):
+        return value
+else:
+    def _open_csv(path, mode='w'):
+        return open(path, mode + 'b')
+
+    def _csv_value(value):
+        if isinstance(value, unicode):  # noqa: F821
+            return value.encode('utf-8')
+        return value
+
+
+def _read_csv_header(path):
+    """
+    :param path: file path
+    :return: list of the columns in the header row, None if the file is missing or empty
+    """
+    if not os.path.exists(path):
+        return None
+    with _open_csv(path, 'r') as f:
+        return next(csv.reader(f), None)
+
+
+def truncate(path, offset):
+    """
+    Cut a file back to an offset, dropping anything written after it
+    :param path: file path
+    :param offset: file position or None to leave the file as it is
+    """
+    if offset is None:
+        return
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+
+
+class CSVWriter(object):
+    def __init__(self, path, columns=None, column_types=None, append=False):
+        """
+        Writes rows to a CSV file with a header row
+        :param path: file path
+        :param columns: Optional: columns to write, the columns of the first row by default (later columns are
+        left out)
+        :param column_types: not used
+        :param append: Optional: add to the end of the file, using the columns of its header row (False)
+        """
+        self.columns = columns
+        self.count = 0
+        self._writer = None
+        header = _read_csv_header(path) if append else None
+        if header is None:
+            self._file = _open_csv(path)
+        else:
+            self.columns = header
+            self._file = _open_csv(path, 'a')
+            self._writer = csv.writer(self._file)
+
+    def _start(self, columns):
+        self.columns = list(columns)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([_csv_value(column) for column in self.columns])
+
+    def write(self, rows):
+        """
+        Write a page of rows
+        :param rows: list of dicts
+        """
+        if self._writer is None:
+            if self.columns is None and not rows:
+                return
+            self._start(self.columns if self.columns is not None else rows[0])
+        columns = self.columns
+        self._writer.writerows([[_csv_value(self._cell(row.get(column))) for column in columns] for row in rows])
+        self.count += len(rows)
+
+    @staticmethod
+    def _cell(value):
+        """
+        :param value: decoded value
+        :return: value written to the file
+        """
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, sort_keys=True)
+        return value
+
+    def tell(self):
+        """
+        Flush the rows written so far
+        :return: position in the file
+        """
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        if self._writer is None and self.columns is not None:
+            self._start(self.columns)
+        self._file.close()
+
+
+class NDJSONWriter(object):
+    def __init__(self, path, columns=None, column_types=None, append=False):
+        """
+        Writes rows to a newline delimited JSON file, one object per line
+        :param path: file path
+        :param columns: Optional: columns to write, every column by default
+        :param column_types: not used
+        :param append: Optional: add to the end of the file (False)
+        """
+        self.columns = columns
+        self.count = 0
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, rows):
+        """
+        Write a page of rows
+        :param rows: list of dicts
+        """
+        if self.columns is not None:
+            rows = [collections.OrderedDict((column, row.get(column)) for column in self.columns) for row in rows]
+        self._file.write(''.join(json.dumps(row, default=str) + '\n' for row in rows))
+        self.count += len(rows)
+
+    def tell(self):
+        """
+        Flush the rows written so far
+        :return: position in the file
+        """
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(object):
+    def __init__(self, path, columns=None, column_types=None):
+        """
+        Writes rows to a Parquet file, one row group per page (requires pyarrow)
+        The column types are set by the data source column types, or the values of the first page
+        :param path: file path
+        :param columns: Optional: columns to write, the columns of the first row by default (later columns are
+        left out)
+        :param column_types: Optional: dict of column name: BlackCurve column type
+        """
+        import pyarrow.parquet
+        self._parquet = pyarrow.parquet
+        self.path = path
+        self.columns = columns
+        self.column_types = column_types
+        self.count = 0
+        self._kinds = None
+        self._writer = None
+
+    def write(self, rows):
+        """
+        Write a page of rows as a row group
+        :param rows: list of dicts
+        """
+        if not rows:
+            return
+        if self.columns is None:
+            self.columns = list(rows[0])
+        columns = collections.OrderedDict((column, [row.get(column) for row in rows]) for column in self.columns)
+        if self._kinds is None:
+            self._kinds = columnar.column_kinds(columns, self.column_types)
+        table = columnar.to_arrow(columns, self._kinds)
+        if self._writer is None:
+            self._writer = self._parquet.ParquetWriter(self.path, table.schema)
+        elif not table.schema.equals(self._writer.schema):
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.count += len(rows)
+
+    @staticmethod
+    def tell():
+        """
+        :return: None, a Parquet file can't be resumed
+        """
+        return None
+
+    def close(self):
+        if self._writer is None:
+            # nothing was written, still leave a file with the columns
+            columns = collections.OrderedDict((column, []) for column in self.columns or [])
+            self._parquet.write_table(columnar.to_arrow(columns, columnar.column_kinds(columns, self.column_types)),
+                                      self.path)
+            return
+        self._writer.close()
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'ndjson': NDJSONWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def open_writer(path, format, columns=None, column_types=None, append=False):
+    """
+    Open a writer for an export
+    :param path: file path
+    :param format: 'csv', 'ndjson' or 'parquet'
+    :param columns: Optional: columns to write
+    :param column_types: Optional: dict of column name: BlackCurve column type
+    :param append: Optional: add to the end of the file, for the RESUMABLE formats (False)
+    :return: CSVWriter, NDJSONWriter or ParquetWriter
+    """
+    if append:
+        if format not in RESUMABLE:
+            raise ValueError('%s exports can\'t be appended to' % format)
+        return WRITERS[format](path, columns, column_types, append=True)
+    return WRITERS[format](path, columns, column_types)
@@ -0,0 +1,205 @@
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from blackcurve.api import BlackCurveAPI
+
+# client of the worker process & the settings it was made with, reused by every shard the process runs so
+# connections are kept open
+_worker_api = None
+_worker_settings = None
+
+
+class Source(object):
+    def __init__(self, name, columns=None, start=1, finish=None, **kwargs):
+        """
+        Data source to extract
+        :param name: DataSource name, e.g. 'Sales History'
+        :param columns: Optional: the required columns from the DataSource
+        :param start: Optional: page to start from (1)
+        :param finish: Optional: page to end on (the last page)
+        :param kwargs: Optional: filter columns eg. brand=['nike', 'addidas']
+        """
+        self.name = name
+        self.columns = columns
+        self.start = start
+        self.finish = finish
+        self.filters = kwargs
+
+    def __repr__(self):
+        return '<Source %s pages %s - %s>' % (self.name, self.start, self.finish or 'last')
+
+
+class Batch(object):
+    __slots__ = ('source', 'page', 'columns', 'rows')
+
+    def __init__(self, source, page, columns, rows):
+        """
+        Decoded rows of a single page, the values of each row are held as a tuple in the order of columns
+        :param source: data source name
+        :param page: page number
+        :param columns: tuple of column names
+        :param rows: list of tuples
+        """
+        self.source = source
+        self.page = page
+        self.columns = columns
+        self.rows = rows
+
+    def __iter__(self):
+        """
+        :return: iterator of the rows as dicts
+        """
+        columns = self.columns
+        for row in self.rows:
+            yield dict(zip(columns, row))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return '<Batch %s page %s: %s rows>' % (self.source, self.page, len(self.rows))
+
+
+def compact_rows(rows):
+    """
+    Turn decoded rows into a column tuple & a value tuple per row, much cheaper to send between processes than
+    dicts (the column names aren't repeated). Rows missing a column get None
+    :param rows: list of dicts
+    :return: tuple of column names, list of tuples
+    """
+    columns = []
+    positions = dict()
+    for row in rows:
+        for key in row:
+            if key not in positions:
+                positions[key] = len(columns)
+                columns.append(key)
+    columns = tuple(columns)
+    output = []
+    for row in rows:
+        if tuple(row) == columns:
+            output.append(tuple(row.values()))
+        else:
+            output.append(tuple(row.get(column) for column in columns))
+    return columns, output
+
+
+def _get_worker_api(settings):
+    """
+    Get the client of the worker process
+    :param settings: dict of subdomain, domain, credentials & timeout of the client that started the extraction
+    :return: BlackCurveAPI
+    """
+    global _worker_api, _worker_settings
+    if _worker_api is None or _worker_settings != settings:
+        _worker_api = BlackCurveAPI(settings['subdomain'], settings['access_token'], timeout=settings['timeout'],
+                                    client_key=settings['client_key'], client_secret=settings['client_secret'],
+                                    domain=settings['domain'])
+        _worker_settings = settings
+    return _worker_api
+
+
+def extract_shard(settings, name, columns, filters, start, finish):
+    """
+    Request a range of pages of a data source and decode them, run in the worker processes
+    :param settings: dict of subdomain, domain, credentials & timeout of the client
+    :param name: data source name
+    :param columns: the required columns or None
+    :param filters: dict of filter columns
+    :param start: first page
+    :param finish: last page
+    :return: number of pages the API reported, list of (page number, tuple of column names, list of tuples)
+    """
+    api = _get_worker_api(settings)
+    holder = api.data_sources(name, columns, **filters)._data_holder
+    no_pages = None
+    batches = []
+    for page_no in range(start, finish + 1):
+        data = holder._fetch_page(page_no)
+        if isinstance(data, dict):
+            no_pages = data.get('no_pages', no_pages)
+        batches.append((page_no,) + compact_rows(holder._page_rows(data)))
+    return no_pages, batches
+
+
+class ShardedExtractor(object):
+    def __init__(self, api, processes=None, pages_per_shard=10, max_pending=None):
+        """
+        Extracts data sources with a pool of processes, so decoding the responses isn't held to a single core
+        Every data source is split into shards of pages, the shards are requested & decoded in the worker processes
+        and sent back as compact Batches, which are yielded in order (by data source, then page)
+        Each worker process has its own client, so hooks & the response cache of api aren't used, any rate limit
+        applies per process and an expired token is refreshed by each process
+        :param api: BlackCurveAPI with an access token
+        :param processes: Optional: number of worker processes (the number of CPUs)
+        :param pages_per_shard: Optional: pages requested by a worker at a time (10)
+        :param max_pending: Optional: shards requested ahead of the one being read (processes * 2)
+        """
+        credentials = api.credentials
+        self.settings = dict(subdomain=api.subdomain, domain=api.domain, access_token=credentials.access_token,
+                             timeout=api.timeout, client_key=credentials.client_key,
+                             client_secret=credentials.client_secret)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pages_per_shard = pages_per_shard
+        self.max_pending = max_pending or self.processes * 2
+
+    def extract(self, sources):
+        """
+        Extract data sources
+        :param sources: list of Source objects or data source names
+        :return: iterator of Batch objects, in the order of sources and then pages
+        """
+        sources = [source if isinstance(source, Source) else Source(source) for source in sources]
+        executor = ProcessPoolExecutor(max_workers=self.processes)
+        in_flight = collections.deque()
+        probes = []
+        try:
+            # every probe is sent first: the first page of each source without a finish says how many pages it has
+            probes = [None if source.finish is not None else self._submit(executor, source, source.start, source.start)
+                      for source in sources]
+            for source, probe in zip(sources, probes):
+                start, finish = source.start, source.finish
+                if probe is not None:
+                    in_flight.append((source, probe))
+                    # the shards ahead of it are read while its page count is on the way, rather than waiting idle
+                    while in_flight[0][1] is not probe and not probe.done():
+                        for batch in self._read(*in_flight.popleft()):
+                            yield batch
+                    finish = probe.result()[0] or start
+                    start += 1
+                for first in range(start, finish + 1, self.pages_per_shard):
+                    if len(in_flight) >= self.max_pending:
+                        for batch in self._read(*in_flight.popleft()):
+                            yield batch
+                    last = min(first + self.pages_per_shard - 1, finish)
+                    in_flight.append((source, self._submit(executor, source, first, last)))
+            while in_flight:
+                for batch in self._read(*in_flight.popleft()):
+                    yield batch
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+            for future in probes:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown()
+
+    def _submit(self, executor, source, start, finish):
+        """
+        Send a shard to the worker processes
+        :return: future
+        """
+        return executor.submit(extract_shard, self.settings, source.name, source.columns, source.filters, start,
+                               finish)
+
+    @staticmethod
+    def _read(source, future):
+        """
+        Wait for a shard
+        :param source: Source
+        :param future: future of the shard
+        :return: list of Batch objects
+        """
+        _, batches = future.result()
+        return [Batch(source.name, page_no, columns, rows) for page_no, columns, rows in batches]
@@ -0,0 +1,155 @@
+import bisect
+import collections
+import threading
+import time
+
+# highest resolution clock available (Python 2 only has time.time)
+timer = getattr(time, 'perf_counter', time.time)
+
+PHASES = ('network', 'decode', 'build')
+
+
+class RequestEvent(object):
+    __slots__ = ('endpoint', 'method', 'url', 'page', 'status', 'bytes', 'retries', 'rows', 'cached', 'coalesced',
+                 'error', 'network', 'decode', 'build')
+
+    def __init__(self, endpoint, method=None, url=None, page=None):
+        """
+        What happened to a single request, passed to every hook registered with BlackCurveAPI.add_hook()
+        Latencies are in seconds: network (sending, including retries & waiting for the scheduler), decode (JSON)
+        and build (materialising the rows, page requests only)
+        coalesced requests shared the response of an identical request already in flight, network is the time
+        spent waiting for it
+        :param endpoint: endpoint path, e.g. 'prices/'
+        :param method: Optional: http method
+        :param url: Optional: url
+        :param page: Optional: page number
+        """
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.page = page
+        self.status = None
+        self.bytes = 0
+        self.retries = 0
+        self.rows = 0
+        self.cached = False
+        self.coalesced = False
+        self.error = None
+        self.network = 0.0
+        self.decode = 0.0
+        self.build = 0.0
+
+    @property
+    def latency(self):
+        """
+        Total time spent on the request
+        :return: seconds
+        """
+        return self.network + self.decode + self.build
+
+    def __repr__(self):
+        return '<RequestEvent %s %s page %s: %s in %.3fs>' % (self.method, self.endpoint, self.page, self.status,
+                                                              self.latency)
+
+
+class Histogram(object):
+    def __init__(self, bounds=None):
+        """
+        Fixed bucket histogram, cheap to update from any thread
+        :param bounds: Optional: sorted bucket upper bounds (0.5ms doubling up to ~2 minutes)
+        """
+        self.bounds = bounds or [0.0005 * 2 ** i for i in range(19)]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """
+        Record a value
+        :param value: number
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """
+        Estimate a percentile from the buckets, interpolating within the bucket it falls in
+        :param q: percentile, 0 - 100
+        :return: estimate or None if empty
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = max(self.bounds[i - 1] if i else 0.0, self.min)
+                upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                return lower + (upper - lower) * max(0.0, rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self):
+        """
+        :return: dict of count, mean, min, max, p50, p95, p99
+        """
+        return dict(count=self.count, mean=self.sum / self.count if self.count else None, min=self.min,
+                    max=self.max, p50=self.percentile(50), p95=self.percentile(95), p99=self.percentile(99))
+
+
+class MetricsCollector(object):
+    def __init__(self):
+        """
+        Hook aggregating request events into counters & latency histograms, register it with
+        BlackCurveAPI.add_hook(collector) and read collector.summary()
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear everything collected so far
+        """
+        with self._lock:
+            self.counters = collections.Counter()
+            self.statuses = collections.Counter()
+            self.endpoints = collections.Counter()
+            self.histograms = dict((phase, Histogram()) for phase in PHASES + ('latency',))
+
+    def __call__(self, event):
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['retries'] += event.retries
+            self.counters['rows'] += event.rows
+            self.counters['bytes'] += event.bytes
+            if event.cached:
+                self.counters['cached'] += 1
+            if event.coalesced:
+                self.counters['coalesced'] += 1
+            if event.error is not None:
+                self.counters['errors'] += 1
+            self.statuses[event.status] += 1
+            self.endpoints[event.endpoint] += 1
+            for phase in PHASES:
+                self.histograms[phase].add(getattr(event, phase))
+            self.histograms['latency'].add(event.latency)
+
+    def summary(self):
+        """
+        :return: dict of counters, requests per status & endpoint and a summary of each latency histogram
+        """
+        with self._lock:
+            output = dict(self.counters)
+            output['statuses'] = dict(self.statuses)
+            output['endpoints'] = dict(self.endpoints)
+            for name, histogram in self.histograms.items():
+                output[name] = histogram.summary()
+            return output
@@ -0,0 +1,384 @@
+import itertools
+import json
+import sqlite3
+import threading
+import time
+
+from blackcurve.api import APIException
+
+# filter suffixes, e.g. price_gte=5
+_OPERATORS = (
+    ('_gte', '>='),
+    ('_lte', '<='),
+    ('_gt', '>'),
+    ('_lt', '<'),
+    ('_ne', '!='),
+)
+# operators comparing by order
+_ORDERING = ('>=', '<=', '>', '<')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS bc_sync_state (
+    source TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    pending_generation INTEGER,
+    next_page INTEGER NOT NULL DEFAULT 1,
+    no_pages INTEGER,
+    columns TEXT NOT NULL DEFAULT '[]',
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS bc_rows (
+    source TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    row_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, generation, page, position)
+);
+CREATE INDEX IF NOT EXISTS bc_rows_row_id ON bc_rows (source, generation, row_id);
+CREATE TABLE IF NOT EXISTS bc_price_state (
+    feed TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS bc_prices (
+    feed TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (feed, key)
+);
+CREATE INDEX IF NOT EXISTS bc_prices_version ON bc_prices (feed, version);
+'''
+
+
+def _normalise(name):
+    return name.replace(' ', '_').lower().strip()
+
+
+def _price_key(row, key_columns):
+    """
+    Get the key a price is stored under
+    :param row: decoded price
+    :param key_columns: column names that identify a price
+    :return: key (str)
+    """
+    normalised = {_normalise(k): v for k, v in row.items()}
+    return json.dumps([normalised.get(_normalise(c)) for c in key_columns])
+
+
+def _row_id(row):
+    """
+    Get the id used by find() for a row
+    :param row: decoded row
+    :return: id as a string or None
+    """
+    for key in ('system id', 'id'):
+        if row.get(key) is not None:
+            return str(row[key])
+    return None
+
+
+class LocalReplica(object):
+    def __init__(self, path):
+        """
+        SQLite copy of data sources, synced page by page from the API and then queried locally
+        A sync that is interrupted picks up from the last saved page the next time it is run, reads keep seeing the
+        last complete copy until the new one has finished
+        :param path: database file (':memory:' for a temporary replica)
+        """
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def _state(self, source):
+        """
+        Get the sync state of a data source
+        :param source: data source name
+        :return: dict or None if it has never been synced
+        """
+        row = self._connection.execute(
+            'SELECT params, generation, pending_generation, next_page, no_pages, columns, synced_at '
+            'FROM bc_sync_state WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('params', 'generation', 'pending_generation', 'next_page', 'no_pages', 'columns',
+                         'synced_at'), row))
+
+    def sync(self, query, full=False):
+        """
+        Copy a data source into the replica, one transaction per page
+        :param query: data source query, e.g. bc.data_sources('Sales History', columns=['Price'])
+        :param full: Optional: start again from the first page even if the last sync was interrupted (False)
+        :return: number of pages fetched
+        """
+        holder = getattr(query, '_data_holder', query)
+        endpoint = holder._api.endpoint
+        if not endpoint.startswith('data_sources/'):
+            raise APIException('Only data sources can be synced to a local replica')
+        source = endpoint[len('data_sources/'):]
+        params = json.dumps(dict(holder._api.params or {}), sort_keys=True, default=str)
+
+        with self._lock:
+            state = self._state(source)
+            if state is None:
+                state = dict(params=params, generation=0, pending_generation=None, next_page=1, no_pages=None,
+                             columns='[]', synced_at=None)
+                self._connection.execute('INSERT INTO bc_sync_state (source, params) VALUES (?, ?)',
+                                         (source, params))
+            if full or state['pending_generation'] is None or state['params'] != params:
+                # start a new copy alongside the current one
+                state['pending_generation'] = state['generation'] + 1
+                state['next_page'] = 1
+                state['no_pages'] = None
+                state['columns'] = '[]'
+                with self._connection:
+                    self._connection.execute('DELETE FROM bc_rows WHERE source = ? AND generation = ?',
+                                             (source, state['pending_generation']))
+                    self._connection.execute(
+                        'UPDATE bc_sync_state SET params = ?, pending_generation = ?, next_page = 1, no_pages = NULL, '
+                        'columns = ? WHERE source = ?', (params, state['pending_generation'], state['columns'], source))
+
+        generation = state['pending_generation']
+        columns = json.loads(state['columns'])
+        page_no = state['next_page']
+        no_pages = state['no_pages']
+        fetched = 0
+        while no_pages is None or page_no <= no_pages:
+            data = holder._fetch_page(page_no)
+            no_pages = data.get('no_pages') if isinstance(data, dict) else None
+            rows = data[holder._api.response_data_name] if isinstance(data, dict) else data
+            fetched += 1
+            for row in rows:
+                for key in row:
+                    if key not in columns:
+                        columns.append(key)
+            with self._lock, self._connection:
+                self._connection.execute('DELETE FROM bc_rows WHERE source = ? AND generation = ? AND page = ?',
+                                         (source, generation, page_no))
+                self._connection.executemany(
+                    'INSERT INTO bc_rows (source, generation, page, position, row_id, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    ((source, generation, page_no, i, _row_id(row), json.dumps(row)) for i, row in enumerate(rows)))
+                self._connection.execute(
+                    'UPDATE bc_sync_state SET next_page = ?, no_pages = ?, columns = ? WHERE source = ?',
+                    (page_no + 1, no_pages, json.dumps(columns), source))
+            if no_pages is None:
+                break
+            page_no += 1
+
+        # swap the finished copy in
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM bc_rows WHERE source = ? AND generation != ?', (source, generation))
+            self._connection.execute(
+                'UPDATE bc_sync_state SET generation = ?, pending_generation = NULL, next_page = 1, synced_at = ? '
+                'WHERE source = ?', (generation, time.time(), source))
+        return fetched
+
+    def sync_prices(self, query, full=False, key_columns=('Product ID', 'Geography'), batch_size=1000):
+        """
+        Apply the changed prices to the local price table, the first sync (or full=True) fetches every price
+        Prices are streamed and written in batches so memory use doesn't grow with the size of the catalogue
+        :param query: prices query, e.g. bc.prices(geography='UK')
+        :param full: Optional: fetch every price instead of only the changes (False)
+        :param key_columns: Optional: columns that identify a price (('Product ID', 'Geography'))
+        :param batch_size: Optional: prices written per transaction (1000)
+        :return: the new watermark, pass it to changed_prices() to get the prices changed after this sync
+        """
+        holder = getattr(query, '_data_holder', query)
+        if holder._api.endpoint != 'prices/':
+            raise APIException('sync_prices() needs a prices query')
+        params = dict(holder._api.params or {})
+        params.pop('changes_only', None)
+        feed = json.dumps(params, sort_keys=True, default=str)
+
+        with self._lock:
+            row = self._connection.execute('SELECT version FROM bc_price_state WHERE feed = ?', (feed,)).fetchone()
+            if row is None:
+                with self._connection:
+                    self._connection.execute('INSERT INTO bc_price_state (feed) VALUES (?)', (feed,))
+                full = True
+        # an interrupted sync left its rows at the same version, so they are simply written again
+        version = (row[0] if row is not None else 0) + 1
+
+        if full:
+            holder = holder._api._with_params(changes_only=False)._data_holder
+        rows = holder._iter_raw_rows()
+        batch = list(itertools.islice(rows, batch_size))
+        while batch:
+            with self._lock, self._connection:
+                # only bump the version of prices that are actually different
+                self._connection.executemany(
+                    'INSERT INTO bc_prices (feed, key, data, version) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (feed, key) DO UPDATE SET data = excluded.data, version = excluded.version '
+                    'WHERE bc_prices.data != excluded.data',
+                    ((feed, _price_key(r, key_columns), json.dumps(r, sort_keys=True), version) for r in batch))
+            batch = list(itertools.islice(rows, batch_size))
+
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE bc_price_state SET version = ?, synced_at = ? WHERE feed = ?',
+                                     (version, time.time(), feed))
+        return version
+
+    def changed_prices(self, since=0, **kwargs):
+        """
+        Iterate over the prices that changed after a watermark, oldest change first
+        :param since: Optional: watermark returned by an earlier sync_prices() (0 for every price)
+        :param kwargs: Optional: the same filters the prices query was synced with, e.g. geography='UK'
+        :return: iterator of prices (dicts)
+        """
+        feed = json.dumps(kwargs, sort_keys=True, default=str)
+        with self._lock:
+            row = self._connection.execute('SELECT version FROM bc_price_state WHERE feed = ?', (feed,)).fetchone()
+            if row is None:
+                raise APIException('Prices %s have not been synced to the local replica' % kwargs)
+            cursor = self._connection.execute(
+                'SELECT data FROM bc_prices WHERE feed = ? AND version > ? AND version <= ? ORDER BY version',
+                (feed, since, row[0]))
+        return self._iter_cursor(cursor)
+
+    def _iter_cursor(self, cursor):
+        """
+        Generator of the decoded json rows of a query, fetched a batch at a time
+        :param cursor: sqlite cursor selecting a single json column
+        :return: iterator of dicts
+        """
+        with self._lock:
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for (data, ) in rows:
+                yield json.loads(data)
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+
+    def synced_at(self, source_name):
+        """
+        When a data source last finished syncing
+        :param source_name: DataSource name, e.g. 'Sales History'
+        :return: unix time or None
+        """
+        with self._lock:
+            state = self._state(source_name)
+        return state['synced_at'] if state is not None else None
+
+    def data_sources(self, source_name, columns=None, **kwargs):
+        """
+        Query the local copy of a data source, same arguments as BlackCurveAPI.data_sources()
+        :param source_name: DataSource name, e.g. 'Sales History'
+        :param columns: Optional: The required columns from the DataSource
+        :param kwargs: Optional: filter columns eg. product_id='UK54321', price_gte=5
+        :return: LocalQuery
+        """
+        with self._lock:
+            state = self._state(source_name)
+        if state is None or state['synced_at'] is None:
+            raise APIException('%s has not been synced to the local replica' % source_name)
+        return LocalQuery(self, source_name, state['generation'], json.loads(state['columns']), columns, kwargs)
+
+
+class LocalQuery(object):
+    def __init__(self, replica, source, generation, source_columns, columns, filters):
+        """
+        Query on a data source held in a LocalReplica
+        :param replica: LocalReplica
+        :param source: data source name
+        :param generation: the synced copy to read
+        :param source_columns: list of the data source's column names
+        :param columns: Optional: list of columns to return
+        :param filters: dict of filters, e.g. {'price_gte': 5}
+        """
+        self._replica = replica
+        self._source = source
+        self._generation = generation
+        self._columns = columns
+        self._column_map = {_normalise(c): c for c in source_columns}
+        for c in source_columns:
+            self._column_map[c] = c
+        self._where, self._params = self._build_filters(filters)
+
+    def _column(self, name):
+        try:
+            return self._column_map[name]
+        except KeyError:
+            try:
+                return self._column_map[_normalise(name)]
+            except KeyError:
+                raise APIException('%s has no column %s' % (self._source, name))
+
+    def _build_filters(self, filters):
+        """
+        Turn filter kwargs into SQL on the stored json
+        :param filters: dict of filters
+        :return: SQL where clause, list of params
+        """
+        where = ['source = ?', 'generation = ?']
+        params = [self._source, self._generation]
+        for key, value in filters.items():
+            operator = '='
+            for suffix, sql_operator in _OPERATORS:
+                if key.endswith(suffix) and _normalise(key) not in self._column_map:
+                    key, operator = key[:-len(suffix)], sql_operator
+                    break
+            path = '$."%s"' % self._column(key).replace('"', '\\"')
+            if isinstance(value, (list, tuple)):
+                where.append('json_extract(data, ?) IN (%s)' % ', '.join('?' * len(value)))
+                params += [path] + list(value)
+            elif operator in _ORDERING and isinstance(value, (int, float)) and not isinstance(value, bool):
+                # SQLite sorts TEXT above every number, so numbers stored as JSON strings are compared as numbers
+                where.append('CAST(json_extract(data, ?) AS REAL) %s ?' % operator)
+                params += [path, value]
+            else:
+                where.append('json_extract(data, ?) %s ?' % operator)
+                params += [path, value]
+        return ' AND '.join(where), params
+
+    def _rows(self, sql, params):
+        with self._replica._lock:
+            cursor = self._replica._connection.execute(sql, params)
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for (data, ) in rows:
+                row = json.loads(data)
+                if self._columns is not None:
+                    row = {k: v for k, v in row.items() if k in self._columns}
+                yield row
+            with self._replica._lock:
+                rows = cursor.fetchmany(1000)
+
+    def all(self):
+        """
+        Get all of the matching rows, in the order they were synced
+        :return: iterator of rows (dicts)
+        """
+        return self._rows('SELECT data FROM bc_rows WHERE %s ORDER BY page, position' % self._where, self._params)
+
+    def find(self, pk):
+        """
+        Find a single row by system id
+        :param pk: ID for the row
+        :return: row (dict)
+        """
+        for row in self._rows('SELECT data FROM bc_rows WHERE %s AND row_id = ?' % self._where,
+                              self._params + [str(pk)]):
+            return row
+        raise APIException('%s not found in the local copy of %s' % (pk, self._source))
+
+    def count(self):
+        """
+        Count the matching rows
+        :return: int
+        """
+        with self._replica._lock:
+            return self._replica._connection.execute('SELECT COUNT(*) FROM bc_rows WHERE %s' % self._where,
+                                                     self._params).fetchone()[0]
+
+    def __iter__(self):
+        return self.all()
+
+    def __len__(self):
+        return self.count()
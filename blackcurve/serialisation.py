@@ -0,0 +1,239 @@
+import collections
+import datetime
+import decimal
+import json
+
+
+def _datetime(value):
+    """
+    :param value: datetime
+    :return: 'YYYY-MM-DD HH:MM:SS', as the API expects it
+    """
+    if value.microsecond or value.tzinfo is not None:
+        value = value.replace(microsecond=0, tzinfo=None)
+    return value.isoformat(' ')
+
+
+def _date(value):
+    """
+    :param value: date
+    :return: 'YYYY-MM-DD'
+    """
+    return value.isoformat()
+
+
+# datetime64 units that are a date rather than a point in time
+_DATE_UNITS = ('Y', 'M', 'W', 'D')
+
+
+def _tolist(value):
+    """
+    :param value: NumPy scalar or array
+    :return: the Python value (a datetime64 comes back as a datetime / date, which is encoded in turn)
+    """
+    dtype = value.dtype
+    if dtype.kind == 'M' and dtype.name != 'datetime64':
+        # tolist() turns units finer than microseconds, e.g. pandas' datetime64[ns], into ints
+        unit = dtype.name[len('datetime64['):-1]
+        value = value.astype('datetime64[D]' if unit in _DATE_UNITS else 'datetime64[us]')
+    return value.tolist()
+
+
+# encoder of each type default has seen, so a type is only matched once
+_ENCODERS = {
+    datetime.datetime: _datetime,
+    datetime.date: _date,
+    # as a string, a float would round it
+    decimal.Decimal: str,
+}
+
+
+def _find_encoder(value):
+    """
+    Match a type default hasn't seen before, e.g. a subclass of datetime or a NumPy scalar
+    :param value: value
+    :return: encoder function
+    """
+    if isinstance(value, datetime.datetime):
+        return _datetime
+    if isinstance(value, datetime.date):
+        return _date
+    if isinstance(value, decimal.Decimal):
+        return str
+    # NumPy scalars & arrays, without importing numpy
+    if hasattr(value, 'tolist') and type(value).__module__ == 'numpy':
+        return _tolist
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+def default(value):
+    """
+    Encode a value the JSON backends can't, called by the encoder as it reaches it so the data is only walked once
+    :param value: datetime, date, Decimal or NumPy scalar / array
+    :return: JSON-able value
+    """
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        encoder = _ENCODERS[type(value)] = _find_encoder(value)
+    return encoder(value)
+
+
+def encode(data):
+    """
+    Encode the values of the data the JSON backends can't, without building a JSON string
+    :param data: dicts / lists of values
+    :return: copy of the data with dates, datetimes, Decimals & NumPy scalars / arrays replaced by what default sends
+    """
+    if isinstance(data, dict):
+        return dict((key, encode(value)) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return [encode(value) for value in data]
+    if isinstance(data, (datetime.date, decimal.Decimal)) or type(data).__module__ == 'numpy':
+        return encode(default(data))
+    return data
+
+
+class StdlibEngine(object):
+    name = 'json'
+
+    def __init__(self):
+        """
+        JSON engine of the standard library json module
+        """
+        self._encoder = json.JSONEncoder(default=default)
+
+    def dumps(self, data):
+        """
+        :param data: dicts / lists of values
+        :return: JSON string
+        """
+        return self._encoder.encode(data)
+
+    @staticmethod
+    def loads(text):
+        """
+        :param text: JSON string or bytes
+        :return: decoded value
+        """
+        return json.loads(text)
+
+
+class OrjsonEngine(object):
+    name = 'orjson'
+
+    def __init__(self):
+        """
+        JSON engine of orjson, several times faster than json at both encoding & decoding
+        Dates & datetimes still go through default, so they are sent in the format the API expects
+        """
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, data):
+        """
+        :param data: dicts / lists of values
+        :return: JSON string
+        """
+        return self._orjson.dumps(data, default=default, option=self._options).decode('utf-8')
+
+    def loads(self, text):
+        """
+        :param text: JSON string or bytes
+        :return: decoded value
+        """
+        return self._orjson.loads(text)
+
+
+class UjsonEngine(object):
+    name = 'ujson'
+
+    def __init__(self):
+        """
+        JSON engine of ujson (5.2 or later, for default)
+        """
+        import ujson
+        self._ujson = ujson
+        ujson.dumps(None, default=default)
+
+    def dumps(self, data):
+        """
+        :param data: dicts / lists of values
+        :return: JSON string
+        """
+        return self._ujson.dumps(data, default=default, escape_forward_slashes=False)
+
+    def loads(self, text):
+        """
+        :param text: JSON string or bytes
+        :return: decoded value
+        """
+        return self._ujson.loads(text)
+
+
+# engines in order of preference, the first one installed is used
+ENGINES = collections.OrderedDict([
+    ('orjson', OrjsonEngine),
+    ('ujson', UjsonEngine),
+    ('json', StdlibEngine),
+])
+
+
+def available_engines():
+    """
+    :return: list of the names of the engines that can be used here
+    """
+    names = []
+    for name, engine_class in ENGINES.items():
+        try:
+            engine_class()
+        except (ImportError, TypeError):
+            continue
+        names.append(name)
+    return names
+
+
+def get_engine(name=None):
+    """
+    Build an engine
+    :param name: Optional: 'orjson', 'ujson' or 'json', the fastest one installed by default
+    :return: engine
+    """
+    if name is not None:
+        if name not in ENGINES:
+            raise ValueError('Unknown JSON engine %s (%s)' % (name, ', '.join(ENGINES)))
+        return ENGINES[name]()
+    return ENGINES[available_engines()[0]]()
+
+
+# engine used by every request & response
+engine = get_engine()
+
+
+def set_engine(name):
+    """
+    Change the engine used by every request & response
+    :param name: 'orjson', 'ujson' or 'json', or an engine object
+    :return: the engine
+    """
+    global engine
+    engine = get_engine(name) if name is None or isinstance(name, str) else name
+    return engine
+
+
+def dumps(data):
+    """
+    Encode a request body with the current engine
+    :param data: dicts / lists of values, dates, datetimes, Decimals & NumPy scalars are encoded too
+    :return: JSON string
+    """
+    return engine.dumps(data)
+
+
+def loads(text):
+    """
+    Decode a response body with the current engine
+    :param text: JSON string or bytes
+    :return: decoded value
+    """
+    return engine.loads(text)
@@ -0,0 +1,157 @@
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_MISSING = object()
+
+
+class JSONArrayStream(object):
+    def __init__(self, array_name=None):
+        """
+        Incremental decoder for API responses, rows of the array_name member of the top level object are returned
+        as soon as they have been received, the other members are kept in meta (e.g. no_pages / error)
+        :param array_name: Optional: name of the member holding the rows, if None every top level member is
+        returned as a (name, value) pair
+        """
+        self.array_name = array_name
+        self.meta = dict()
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._state = 'start'
+        self._key = None
+        self._top_level_list = False
+
+    def feed(self, chunk):
+        """
+        Add the next chunk of the response body
+        :param chunk: bytes
+        :return: list of the rows completed by this chunk
+        """
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk)
+        self._pos = 0
+        return list(self._parse())
+
+    def close(self):
+        """
+        Finish decoding once the whole response body has been fed
+        :return: list of the remaining rows
+        """
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(b'', final=True)
+        self._pos = 0
+        self._eof = True
+        rows = list(self._parse())
+        if self._state != 'done':
+            raise ValueError('Unexpected end of JSON response')
+        return rows
+
+    def _char(self):
+        """
+        Skip whitespace
+        :return: the next character or None if more data is needed
+        """
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        if pos < len(buffer):
+            return buffer[pos]
+        return None
+
+    def _value(self):
+        """
+        Decode the next complete JSON value
+        :return: value or _MISSING if more data is needed
+        """
+        try:
+            value, end = self._json.raw_decode(self._buffer, self._pos)
+        except ValueError:
+            if self._eof:
+                raise
+            return _MISSING
+        # a number at the end of the buffer may not be complete yet
+        if end == len(self._buffer) and not self._eof:
+            return _MISSING
+        self._pos = end
+        return value
+
+    def _unexpected(self, char):
+        raise ValueError('Unexpected %r in JSON response' % char)
+
+    def _parse(self):
+        """
+        Generator that moves through the buffer as far as it can
+        :return: iterator of rows
+        """
+        while True:
+            char = self._char()
+            if char is None:
+                return
+            state = self._state
+            if state == 'start':
+                if char == '{':
+                    self._state = 'key_or_end'
+                elif char == '[':
+                    self._top_level_list = True
+                    self._state = 'row_or_end'
+                else:
+                    self._unexpected(char)
+                self._pos += 1
+            elif state in ('key_or_end', 'key'):
+                if char == '}' and state == 'key_or_end':
+                    self._state = 'done'
+                    self._pos += 1
+                    continue
+                key = self._value()
+                if key is _MISSING:
+                    return
+                self._key = key
+                self._state = 'colon'
+            elif state == 'colon':
+                if char != ':':
+                    self._unexpected(char)
+                self._state = 'member'
+                self._pos += 1
+            elif state == 'member':
+                if self._key == self.array_name and char == '[':
+                    self._state = 'row_or_end'
+                    self._pos += 1
+                    continue
+                value = self._value()
+                if value is _MISSING:
+                    return
+                self._state = 'member_end'
+                if self.array_name is None and self._key not in ('no_pages', 'error'):
+                    yield self._key, value
+                else:
+                    self.meta[self._key] = value
+            elif state in ('row_or_end', 'row'):
+                if char == ']' and state == 'row_or_end':
+                    self._state = 'done' if self._top_level_list else 'member_end'
+                    self._pos += 1
+                    continue
+                value = self._value()
+                if value is _MISSING:
+                    return
+                self._state = 'row_end'
+                yield value
+            elif state == 'row_end':
+                if char == ',':
+                    self._state = 'row'
+                elif char == ']':
+                    self._state = 'done' if self._top_level_list else 'member_end'
+                else:
+                    self._unexpected(char)
+                self._pos += 1
+            elif state == 'member_end':
+                if char == ',':
+                    self._state = 'key'
+                elif char == '}':
+                    self._state = 'done'
+                else:
+                    self._unexpected(char)
+                self._pos += 1
+            else:
+                self._unexpected(char)
@@ -0,0 +1,240 @@
+import email.utils
+import random
+import threading
+import time
+
+# responses that mean the request wasn't handled and can be sent again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# responses that mean the API is overloaded, the concurrency limit is halved
+OVERLOAD_STATUSES = (429, 503)
+# methods that are safe to send again after a server error / dropped connection
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=None):
+        """
+        Token bucket rate limit, shared by every thread using it
+        :param rate: requests per second
+        :param burst: Optional: requests that can be sent at once after a quiet period (rate)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token, the caller has to wait for the returned delay before sending its request
+        :return: seconds to wait
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class RequestScheduler(object):
+    def __init__(self, rate=None, burst=None, max_retries=5, backoff=0.5, max_backoff=30, initial_concurrency=4,
+                 min_concurrency=1, max_concurrency=64):
+        """
+        Central scheduler for every request made through a BlackCurveAPI, pass one to BlackCurveAPI(scheduler=...)
+        Requests are rate limited with a token bucket, retried with exponential backoff & jitter (honouring
+        Retry-After) and the number in flight is tuned AIMD style: it grows by one for every window of successful
+        responses and is halved when the API says it is overloaded (429 / 503)
+        :param rate: Optional: max requests per second, None for no rate limit (None)
+        :param burst: Optional: requests that can be sent at once after a quiet period (rate)
+        :param max_retries: Optional: times a request is retried before giving up (5)
+        :param backoff: Optional: seconds waited before the first retry, doubled for every retry after (0.5)
+        :param max_backoff: Optional: longest wait between retries in seconds (30)
+        :param initial_concurrency: Optional: requests in flight at once to start with (4)
+        :param min_concurrency: Optional: lowest the concurrency limit can be cut to (1)
+        :param max_concurrency: Optional: highest the concurrency limit can grow to (64)
+        """
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        # (event loop, callback) of the acquire_async() calls waiting for a slot
+        self._async_waiters = []
+
+    @property
+    def concurrency(self):
+        """
+        Requests currently allowed in flight at once
+        :return: int
+        """
+        return int(self.limit)
+
+    def acquire(self):
+        """
+        Wait for the rate limit & a free concurrency slot, give the slot back with release() once the response is in
+        """
+        if self.bucket is not None:
+            wait = self.bucket.reserve()
+            if wait:
+                time.sleep(wait)
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def acquire_async(self):
+        """
+        acquire() for asyncio: the event loop keeps running until the next token is due, then until a slot is given
+        back, give the slot back with release() once the response is in
+        :return: asyncio Future, done once the slot has been taken
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def take_slot():
+            if future.done():
+                # cancelled while waiting
+                return
+            with self._condition:
+                if self.in_flight >= int(self.limit):
+                    self._async_waiters.append((loop, take_slot))
+                    return
+                self.in_flight += 1
+            future.set_result(None)
+
+        wait = self.bucket.reserve() if self.bucket is not None else 0
+        if wait:
+            loop.call_later(wait, take_slot)
+        else:
+            take_slot()
+        return future
+
+    def release(self, overloaded=False):
+        """
+        Give back a concurrency slot and adjust the limit
+        :param overloaded: Optional: the API said it was overloaded (False)
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # the tasks try again for a slot on their own event loop, the ones that don't get one wait for the next release
+        for loop, take_slot in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(take_slot)
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before sending a request again
+        :param attempt: number of retries so far
+        :param retry_after: Optional: Retry-After header of the response
+        :return: seconds
+        """
+        seconds = self._parse_retry_after(retry_after)
+        if seconds is not None:
+            return min(seconds, self.max_backoff)
+        # full jitter, so retrying clients spread out rather than coming back together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """
+        Read a Retry-After header
+        :param value: seconds or an http date
+        :return: seconds or None
+        """
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        parsed = email.utils.parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+    def should_retry(self, method, attempt, response=None, error=None):
+        """
+        Is the request worth sending again
+        :param method: http method
+        :param attempt: number of retries so far
+        :param response: Optional: the response received
+        :param error: Optional: the connection error raised
+        :return: Boolean
+        """
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            return method in IDEMPOTENT_METHODS
+        if response.status_code == 429:
+            # rejected before being handled
+            return True
+        return response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+
+    def retry_delay(self, method, attempt, response=None, error=None):
+        """
+        Decide what to do with a failed request, the response of a request that is sent again is closed
+        :param method: http method
+        :param attempt: number of retries so far
+        :param response: Optional: the response received
+        :param error: Optional: the connection error raised
+        :return: seconds to wait before sending the request again, None if it isn't worth retrying
+        """
+        if not self.should_retry(method, attempt, response, error):
+            return None
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            self._discard(response)
+        return self.delay(attempt, retry_after)
+
+    @staticmethod
+    def _discard(response):
+        """
+        Close a response that is going to be retried
+        :param response: response
+        """
+        close = getattr(response, 'close', None)
+        if close is not None:
+            close()
+
+    def call(self, send, method, errors=()):
+        """
+        Send a request, waiting for the rate limit & a concurrency slot, retrying it when it fails
+        :param send: function sending the request and returning the response
+        :param method: http method
+        :param errors: exception types raised for dropped connections / timeouts
+        :return: response, the last one received if every retry failed
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            overloaded = False
+            try:
+                response = send()
+            except errors as e:
+                wait = self.retry_delay(method, attempt, error=e)
+                if wait is None:
+                    raise
+            else:
+                overloaded = response.status_code in OVERLOAD_STATUSES
+                wait = self.retry_delay(method, attempt, response)
+                if wait is None:
+                    return response
+            finally:
+                self.release(overloaded)
+            time.sleep(wait)
+            attempt += 1
@@ -0,0 +1,321 @@
+import collections
+import json
+import threading
+
+import requests
+import urllib3
+from requests.structures import CaseInsensitiveDict
+
+# request sent through a FakeTransport
+SentRequest = collections.namedtuple('SentRequest', ['method', 'url', 'headers', 'data'])
+
+
+def _split_timeout(timeout):
+    """
+    :param timeout: timeout in seconds, a (connect, read) tuple or None
+    :return: (connect, read)
+    """
+    if isinstance(timeout, tuple):
+        return timeout
+    return timeout, timeout
+
+
+class RequestsTransport(object):
+    # errors worth retrying the request for
+    errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
+        """
+        Sends requests through a pooled, keep-alive requests Session
+        :param pool_connections: Optional: number of host connection pools to cache (10)
+        :param pool_maxsize: Optional: max number of connections kept open per host (10)
+        :param pool_block: Optional: block when a host pool is exhausted (False)
+        :param keep_alive: Optional: reuse connections between requests (True)
+        """
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: don't read the response body yet (False)
+        :param timeout: Optional: timeout in seconds, or a (connect, read) tuple
+        :return: requests Response
+        """
+        return self.session.request(method, url, headers=headers, data=data, stream=stream, timeout=timeout)
+
+    def close(self):
+        """
+        Close the pooled connections
+        """
+        self.session.close()
+
+
+class Urllib3Response(object):
+    def __init__(self, response):
+        """
+        Response of a Urllib3Transport
+        :param response: urllib3 HTTPResponse
+        """
+        self._response = response
+        self._consumed = False
+        self.status_code = response.status
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        content = self._response.data
+        self._consumed = True
+        return content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def iter_content(self, chunk_size=1):
+        """
+        :param chunk_size: bytes read at a time
+        :return: iterator of bytes
+        """
+        for chunk in self._response.stream(chunk_size):
+            yield chunk
+        self._consumed = True
+
+    def close(self):
+        """
+        Give the connection back to the pool, a connection with some of the body left unread is closed instead
+        """
+        if not self._consumed:
+            self._response.close()
+        self._response.release_conn()
+
+
+class Urllib3Transport(object):
+    # errors worth retrying the request for
+    errors = (urllib3.exceptions.ProtocolError, urllib3.exceptions.TimeoutError,
+              urllib3.exceptions.NewConnectionError)
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
+        """
+        Sends requests straight through a urllib3 PoolManager, without the per request overhead of a requests Session
+        Requests aren't retried or redirected here, the request scheduler does the retrying
+        :param pool_connections: Optional: number of host connection pools to cache (10)
+        :param pool_maxsize: Optional: max number of connections kept open per host (10)
+        :param pool_block: Optional: block when a host pool is exhausted (False)
+        :param keep_alive: Optional: reuse connections between requests (True)
+        """
+        self.pool = urllib3.PoolManager(num_pools=pool_connections, maxsize=pool_maxsize, block=pool_block)
+        self.headers = {} if keep_alive else {'Connection': 'close'}
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: don't read the response body yet (False)
+        :param timeout: Optional: timeout in seconds, or a (connect, read) tuple
+        :return: Urllib3Response
+        """
+        connect, read = _split_timeout(timeout)
+        response = self.pool.request(method, url, headers=dict(self.headers, **headers or {}), body=data,
+                                     preload_content=not stream, redirect=False, retries=False,
+                                     timeout=urllib3.Timeout(connect=connect, read=read))
+        return Urllib3Response(response)
+
+    def close(self):
+        """
+        Close the pooled connections
+        """
+        self.pool.clear()
+
+
+class HTTP2Response(object):
+    def __init__(self, response):
+        """
+        Response of a HTTP2Transport
+        :param response: httpx Response
+        """
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        return self._response.read()
+
+    @property
+    def text(self):
+        self._response.read()
+        return self._response.text
+
+    def iter_content(self, chunk_size=1):
+        """
+        :param chunk_size: bytes read at a time
+        :return: iterator of bytes
+        """
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Transport(object):
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
+        """
+        Sends requests over HTTP/2 with httpx (requires httpx[http2]), requests made at the same time, e.g. the pages
+        of a prefetch or a thread pool, are multiplexed over a single connection per host instead of one each
+        Servers without HTTP/2 are spoken to over HTTP/1.1
+        :param pool_connections: Optional: number of hosts to keep connections open for (10)
+        :param pool_maxsize: Optional: max number of connections kept open per host (10)
+        :param pool_block: Optional: unused, requests always wait for a free connection
+        :param keep_alive: Optional: reuse connections between requests (True)
+        """
+        import httpx
+        self._httpx = httpx
+        self.errors = (httpx.TransportError,)
+        limits = httpx.Limits(max_connections=pool_connections * pool_maxsize,
+                              max_keepalive_connections=pool_connections * pool_maxsize if keep_alive else 0)
+        self.client = httpx.Client(http2=True, limits=limits)
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: don't read the response body yet (False)
+        :param timeout: Optional: timeout in seconds, or a (connect, read) tuple
+        :return: HTTP2Response
+        """
+        connect, read = _split_timeout(timeout)
+        request = self.client.build_request(method, url, headers=headers, content=data,
+                                            timeout=self._httpx.Timeout(read, connect=connect))
+        return HTTP2Response(self.client.send(request, stream=stream))
+
+    def close(self):
+        """
+        Close the pooled connections
+        """
+        self.client.close()
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, body, headers=None):
+        """
+        Response of a FakeTransport
+        :param status_code: http status code
+        :param body: response body, anything but a string is sent as JSON
+        :param headers: Optional: dict of http headers
+        """
+        if not isinstance(body, (bytes, str, type(u''))):
+            body = json.dumps(body)
+        self.content = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def iter_content(self, chunk_size=1):
+        """
+        :param chunk_size: bytes read at a time
+        :return: iterator of bytes
+        """
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeTransport(object):
+    # a FakeTransport never fails to connect
+    errors = ()
+
+    def __init__(self, handler=None):
+        """
+        In-process transport for tests & running offline, nothing is sent over the network
+        Requests are answered by the most recently added route matching them, then by handler, and otherwise
+        with a 404. Every request made is kept in requests
+        :param handler: Optional: function taking (method, url, headers, data) and returning (status code, body) or
+        (status code, body, headers), a body that isn't a string is sent as JSON
+        """
+        self.handler = handler
+        self.routes = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def add(self, method, url, body, status_code=200, headers=None):
+        """
+        Answer matching requests with a fixed response
+        :param method: http method, or None for any
+        :param url: part of the url, e.g. 'data_sources/Sales History' or 'token/'
+        :param body: response body, anything but a string is sent as JSON
+        :param status_code: Optional: http status code (200)
+        :param headers: Optional: dict of http headers
+        """
+        self.routes.append((method, url, (status_code, body, headers)))
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        """
+        Make the request
+        :param method: http method
+        :param url: url
+        :param headers: Optional: http headers
+        :param data: Optional: any post data
+        :param stream: Optional: unused
+        :param timeout: Optional: unused
+        :return: FakeResponse
+        """
+        with self._lock:
+            self.requests.append(SentRequest(method, url, dict(headers or {}), data))
+        return FakeResponse(*self._answer(method, url, headers or {}, data))
+
+    def _answer(self, method, url, headers, data):
+        """
+        :return: (status code, body) or (status code, body, headers)
+        """
+        for route_method, route_url, answer in reversed(self.routes):
+            if (route_method is None or route_method == method) and route_url in url:
+                return answer
+        if self.handler is not None:
+            return self.handler(method, url, headers, data)
+        return 404, {'error': 'no fake response for %s %s' % (method, url)}
+
+    def close(self):
+        pass
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'urllib3': Urllib3Transport,
+    'http2': HTTP2Transport,
+}
+
+
+def build_transport(name, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
+    """
+    Build a transport by name
+    :param name: 'requests', 'urllib3' or 'http2'
+    :param pool_connections: Optional: number of host connection pools to cache (10)
+    :param pool_maxsize: Optional: max number of connections kept open per host (10)
+    :param pool_block: Optional: block when a host pool is exhausted (False)
+    :param keep_alive: Optional: reuse connections between requests (True)
+    :return: transport
+    """
+    if name not in TRANSPORTS:
+        raise ValueError('Unknown transport %s (%s)' % (name, ', '.join(sorted(TRANSPORTS))))
+    return TRANSPORTS[name](pool_connections, pool_maxsize, pool_block, keep_alive)
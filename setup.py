@@ -14,8 +14,17 @@ setuptools.setup(
     url="https://github.com/blackcurve/BlackCurve-API",
     packages=setuptools.find_packages(exclude=['tests']),
     install_requires=[
-      'requests'
+      'requests',
+      'futures; python_version < "3"'
     ],
+    extras_require={
+      'async': ['aiohttp'],
+      'numpy': ['numpy'],
+      'pandas': ['pandas'],
+      'arrow': ['pyarrow'],
+      'http2': ['httpx[http2]'],
+      'orjson': ['orjson'],
+    },
     classifiers=(
         "Programming Language :: Python",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import sys
+import threading
+import unittest
+
+if sys.version_info >= (3, 0):
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+# 3 pages of products, page n holds the ids 2n - 1 & 2n
+PRODUCTS = [{'id': i, 'Product ID': 'UK%s' % (40 + i), 'Stock': i * 10} for i in range(1, 7)]
+
+
+def catalogue(method, url, headers, data):
+    """
+    Products data source, paged 2 rows at a time, a single product by ?id=, writes are accepted
+    """
+    if method != 'GET':
+        return 200, {'success': True}
+    params = parse_qs(urlparse(url).query.replace('?', '&'))
+    if 'id' in params:
+        return 200, {'data': [row for row in PRODUCTS if str(row['id']) == params['id'][0]], 'no_pages': 1}
+    page = int(params.get('page', ['1'])[0])
+    return 200, {'data': PRODUCTS[(page - 1) * 2:page * 2], 'no_pages': 3}
+
+
+class SlowSecondPage(AsyncFakeTransport or object):
+    async def request(self, method, url, headers=None, data=None, stream=False):
+        # page 3 is answered before page 2
+        if 'page=2' in url:
+            await asyncio.sleep(0.05)
+        return await AsyncFakeTransport.request(self, method, url, headers, data, stream)
+
+
+class CatalogueServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        """
+        Local server answering like catalogue, for the aiohttp session
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', 0), CatalogueHandler)
+
+    @property
+    def domain(self):
+        return 'http://127.0.0.1:%s/api/' % self.server_address[1]
+
+
+class CatalogueHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status_code, body = catalogue('GET', self.path, dict(self.headers), None)
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncClientTest(unittest.TestCase):
+    def setUp(self):
+        self.transport = AsyncFakeTransport(catalogue)
+        self.bc = AsyncBlackCurveAPI('acme', 'token', transport=self.transport)
+
+    def ids(self, query):
+        return [row['id'] for row in asyncio.run(collect(query))]
+
+    def test_all(self):
+        self.assertEqual(self.ids(self.bc.data_sources('Products').all()), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.ids(self.bc.data_sources('Products').pages(2, 3)), [3, 4, 5, 6])
+
+    def test_prefetch_keeps_page_order(self):
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=SlowSecondPage(catalogue))
+        self.assertEqual(self.ids(bc.data_sources('Products').all(prefetch=3)), [1, 2, 3, 4, 5, 6])
+
+    def test_gathered_queries_are_independent(self):
+        async def main():
+            return await asyncio.gather(collect(self.bc.data_sources('Products').pages(1, 1)),
+                                        collect(self.bc.data_sources('Products').pages(3, 3)))
+        first, third = asyncio.run(main())
+        self.assertEqual(([row['id'] for row in first], [row['id'] for row in third]), ([1, 2], [5, 6]))
+
+    def test_find_and_save(self):
+        async def main():
+            product = await self.bc.data_sources('Products').find(4)
+            product['Stock'] = 35
+            await product.save()
+            await self.bc.data_sources('Products').create({'Product ID': 'UK47'})
+            return product
+        self.assertEqual(asyncio.run(main())['Product ID'], 'UK44')
+        self.assertEqual([json.loads(request.data) for request in self.transport.requests[1:]],
+                         [{'id': 4, 'Stock': 35}, {'Product ID': 'UK47'}])
+
+    def test_a_query_has_to_be_awaited(self):
+        with self.assertRaises(TypeError):
+            list(self.bc.data_sources('Products').all())
+        with self.assertRaises(TypeError):
+            with self.bc:
+                pass
+
+    @unittest.skipIf(pandas is None, 'requires pandas')
+    def test_to_pandas(self):
+        frame = asyncio.run(self.bc.data_sources('Products').all().to_pandas())
+        self.assertEqual(list(frame['Stock']), [10, 20, 30, 40, 50, 60])
+
+    def test_aiohttp_session(self):
+        server = CatalogueServer()
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        async def main():
+            async with AsyncBlackCurveAPI('acme', 'token', domain=server.domain) as bc:
+                return await collect(bc.data_sources('Products').all(prefetch=2))
+        self.assertEqual([row['id'] for row in asyncio.run(main())], [1, 2, 3, 4, 5, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
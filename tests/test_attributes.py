@@ -0,0 +1,67 @@
+import unittest
+
+from blackcurve.api import BlackCurveAPI, Row
+from blackcurve.transport import FakeTransport
+
+# column names as the API sends them: title case with spaces, a lower case one, and one named like a Row method
+PRODUCTS = [
+    {'System ID': 1, 'Product ID': 'UK42', 'Price': 9.99, 'margin': 0.4, 'Items': 3},
+    {'System ID': 2, 'Product ID': 'UK43', 'Price': 4.99, 'margin': 0.2, 'Items': 1},
+]
+
+
+class AttributeTest(unittest.TestCase):
+    def setUp(self):
+        transport = FakeTransport()
+        transport.add('GET', 'data_sources/Products', {'data': PRODUCTS, 'no_pages': 1})
+        self.transport = transport
+        self.bc = BlackCurveAPI('acme', 'token', transport=transport)
+
+    def rows(self, compact=False):
+        return list(self.bc.data_sources('Products').all(compact=compact))
+
+    def test_column_and_attribute_names(self):
+        for compact in (False, True):
+            first, second = self.rows(compact)
+            self.assertEqual((first.Price, first.price, first['Price']), (9.99, 9.99, 9.99))
+            self.assertEqual((second.product_id, second['Product ID']), ('UK43', 'UK43'))
+            self.assertEqual((first.margin, first.id, first.system_id), (0.4, 1, 1))
+            with self.assertRaises(AttributeError):
+                first.Cost
+
+    def test_a_change_is_seen_by_every_name(self):
+        row = self.rows()[0]
+        row.Price = 12.5
+        self.assertEqual((row.Price, row.price), (12.5, 12.5))
+        row['Product ID'] = 'UK44'
+        self.assertEqual(row.product_id, 'UK44')
+        del row.price
+        with self.assertRaises(AttributeError):
+            row.Price
+
+    def test_rows_with_the_same_columns_share_a_class(self):
+        first, second = self.rows(compact=True)
+        self.assertIs(type(first), type(second))
+        self.assertIsInstance(first, Row)
+        self.assertIs(type(self.rows(compact=True)[0]), type(first))
+        self.assertIs(type(self.rows()[0]), type(self.rows()[1]))
+
+    def test_methods_win_over_columns(self):
+        row = self.rows(compact=True)[0]
+        self.assertEqual(row['Items'], 3)
+        self.assertEqual(row.items()[0], ('System ID', 1))
+        with self.assertRaises(AttributeError):
+            row.price = 1
+
+    def test_other_column_layouts(self):
+        self.transport.add('GET', 'data_sources/Products', {'data': [{'Product ID': 'UK45', 'Cost': 2.5},
+                                                                     {'Product ID': 'UK46'}], 'no_pages': 1})
+        for compact in (False, True):
+            first, second = self.rows(compact)
+            self.assertEqual((first.Cost, second.product_id), (2.5, 'UK46'))
+            with self.assertRaises(AttributeError):
+                second.Cost
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.auth import Credentials, token_expired
+from blackcurve.transport import FakeResponse, FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class TokenService(object):
+    def __init__(self, refused_status=401):
+        """
+        Margins data source of 3 pages of 4 rows, answered while the request has the current token and refused
+        otherwise. Every token/ request with the right client key & secret issues a new token
+        :param refused_status: Optional: status of a refused request, 401 or 403 (401)
+        """
+        self.refused_status = refused_status
+        self.issued = 0
+        self.posted = []
+        self.lock = threading.Lock()
+
+    @property
+    def token(self):
+        return 'token-%s' % self.issued
+
+    def __call__(self, method, url, headers, data):
+        with self.lock:
+            if url.endswith('token/'):
+                if data != 'CLIENT_KEY=key&CLIENT_SECRET=secret':
+                    return 200, {'error': 'Unknown client'}
+                self.issued += 1
+                return 200, {'token': self.token}
+            current = headers.get('Authorization') == 'Bearer %s' % self.token
+        if not current:
+            return self.refused_status, {'error': 'Token has expired'}
+        if method == 'POST':
+            self.posted.append(json.loads(data))
+            return 200, {'success': True}
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        return 200, {'data': [{'id': page * 10 + i, 'Margin': 0.1 * i} for i in range(4)], 'no_pages': 3}
+
+
+class TokenExpiredTest(unittest.TestCase):
+    def test_refusals(self):
+        self.assertTrue(token_expired(FakeResponse(401, '')))
+        self.assertTrue(token_expired(FakeResponse(403, '{"error": "Token is invalid"}')))
+        self.assertFalse(token_expired(FakeResponse(403, '{"error": "Not allowed to see Margins"}')))
+        self.assertFalse(token_expired(FakeResponse(200, '{"error": "Token has expired"}')))
+
+
+class CredentialsTest(unittest.TestCase):
+    def test_refused_requests_share_one_refresh(self):
+        credentials = Credentials('expired', 'key', 'secret')
+        fetched = []
+
+        def fetch(key, secret):
+            time.sleep(0.02)
+            fetched.append((key, secret))
+            return 'token-%s' % len(fetched)
+        stale = credentials.authorization
+        threads = [threading.Thread(target=credentials.refresh, args=(stale, fetch)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((fetched, credentials.access_token), ([('key', 'secret')], 'token-1'))
+        # a request sent with the new token refreshes it again
+        credentials.refresh(credentials.authorization, fetch)
+        self.assertEqual(credentials.access_token, 'token-2')
+
+    def test_can_refresh(self):
+        self.assertTrue(Credentials('token', 'key', 'secret').can_refresh)
+        self.assertFalse(Credentials('token', 'key').can_refresh)
+
+
+class TokenRefreshTest(unittest.TestCase):
+    def client(self, service, access_token='expired', **kwargs):
+        self.transport = FakeTransport(service)
+        return BlackCurveAPI('acme', access_token, transport=self.transport, **kwargs)
+
+    def test_an_expired_token_is_refreshed(self):
+        for status in (401, 403):
+            service = TokenService(status)
+            bc = self.client(service, client_key='key', client_secret='secret')
+            self.assertEqual(len(list(bc.data_sources('Margins').all())), 12)
+            self.assertEqual(service.issued, 1)
+            self.assertEqual(bc.access_token, 'token-1')
+
+    def test_a_token_is_fetched_when_there_is_none(self):
+        service = TokenService()
+        bc = self.client(service, access_token=None, client_key='key', client_secret='secret')
+        self.assertEqual(len(list(bc.data_sources('Margins').all())), 12)
+        self.assertEqual(service.issued, 1)
+        self.assertTrue(self.transport.requests[0].url.endswith('token/'))
+
+    def test_requests_refused_together_share_one_refresh(self):
+        service = TokenService()
+        bc = self.client(service, client_key='key', client_secret='secret')
+        self.assertEqual(len(list(bc.data_sources('Margins').all(prefetch=3))), 12)
+        self.assertEqual(service.issued, 1)
+
+    def test_streamed_pages_refresh_the_token(self):
+        service = TokenService()
+        bc = self.client(service, client_key='key', client_secret='secret')
+        self.assertEqual(len(list(bc.data_sources('Margins').all().iter_rows(raw=True))), 12)
+        self.assertEqual(service.issued, 1)
+
+    def test_writes_refresh_the_token(self):
+        service = TokenService()
+        bc = self.client(service, access_token=None, client_key='key', client_secret='secret')
+        margin = list(bc.data_sources('Margins').all())[0]
+        # the token expires after the rows were read
+        service.issued += 1
+        margin['Margin'] = 0.5
+        margin.save()
+        self.assertEqual(service.posted, [{'id': 10, 'Margin': 0.5}])
+        self.assertEqual(bc.access_token, 'token-3')
+
+    def test_get_access_token(self):
+        service = TokenService()
+        bc = self.client(service, access_token=None)
+        self.assertEqual(bc.get_access_token('key', 'secret'), 'token-1')
+        self.assertEqual(len(list(bc.data_sources('Margins').all())), 12)
+        with self.assertRaises(APIException):
+            bc.get_access_token('key', 'wrong')
+
+    def test_without_a_key_the_error_is_raised(self):
+        bc = self.client(TokenService())
+        with self.assertRaises(APIException):
+            list(bc.data_sources('Margins').all())
+        self.assertEqual(len(self.transport.requests), 1)
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncTokenRefreshTest(unittest.TestCase):
+    def client(self, service):
+        return AsyncBlackCurveAPI('acme', 'expired', transport=AsyncFakeTransport(service), client_key='key',
+                                  client_secret='secret')
+
+    def test_an_expired_token_is_refreshed(self):
+        for prefetch in (None, 3):
+            service = TokenService()
+            bc = self.client(service)
+
+            async def main():
+                return [row async for row in bc.data_sources('Margins').all(prefetch=prefetch)]
+            self.assertEqual(len(asyncio.run(main())), 12)
+            self.assertEqual(service.issued, 1)
+
+    def test_streamed_pages_refresh_the_token(self):
+        service = TokenService()
+        bc = self.client(service)
+
+        async def main():
+            return [row async for row in bc.data_sources('Margins').all().iter_rows(raw=True)]
+        self.assertEqual(len(asyncio.run(main())), 12)
+        self.assertEqual(service.issued, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from blackcurve.api import BatchCreateException, BlackCurveAPI
+from blackcurve.transport import FakeTransport
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+def new_products(count):
+    """
+    :param count: number of products
+    :return: list of products to create
+    """
+    return [{'Product ID': 'NEW%s' % i, 'Stock': i} for i in range(1, count + 1)]
+
+
+class ProductImport(object):
+    def __init__(self, refused=None, delay=0):
+        """
+        Keeps the body of every POST & the most POSTs it had in flight at once
+        :param refused: Optional: Product ID of a row that fails its request
+        :param delay: Optional: seconds taken to answer
+        """
+        self.refused = refused
+        self.delay = delay
+        self.posted = []
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, headers, data):
+        body = json.loads(data)
+        with self.lock:
+            self.posted.append(body)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        rows = body if isinstance(body, list) else [body]
+        if self.refused is not None and any(row.get('Product ID') == self.refused for row in rows):
+            return 400, {'error': 'Duplicate Product ID'}
+        return 200, {'success': True}
+
+
+class BatchCreateTest(unittest.TestCase):
+    def build(self, handler):
+        return BlackCurveAPI('acme', 'token', transport=FakeTransport(handler))
+
+    def test_data_sources_get_a_request_per_chunk(self):
+        handler = ProductImport()
+        self.build(handler).data_sources('Products').batch_create(new_products(7), chunk_size=3)
+        self.assertEqual([[row['Product ID'] for row in body] for body in handler.posted],
+                         [['NEW1', 'NEW2', 'NEW3'], ['NEW4', 'NEW5', 'NEW6'], ['NEW7']])
+
+    def test_other_endpoints_get_a_request_per_row(self):
+        handler = ProductImport()
+        self.build(handler).data_sources_info().batch_create([{'Products': {'Colour': 'String'}}] * 2)
+        self.assertEqual(handler.posted, [{'Products': {'Colour': 'String'}}] * 2)
+
+    def test_chunks_are_sent_concurrently(self):
+        handler = ProductImport(delay=0.02)
+        products = (product for product in new_products(8))
+        self.build(handler).data_sources('Products').batch_create(products, chunk_size=2, max_workers=3)
+        self.assertEqual(sorted(len(body) for body in handler.posted), [2, 2, 2, 2])
+        self.assertEqual(handler.peak, 3)
+
+    def test_failed_chunks_dont_stop_the_rest(self):
+        handler = ProductImport(refused='NEW4')
+        with self.assertRaises(BatchCreateException) as raised:
+            self.build(handler).data_sources('Products').batch_create(new_products(7), chunk_size=3, max_workers=2)
+        self.assertEqual(len(handler.posted), 3)
+        [(chunk, rows, error)] = raised.exception.failed
+        self.assertEqual((chunk, [row['Product ID'] for row in rows]), (1, ['NEW4', 'NEW5', 'NEW6']))
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncBatchCreateTest(unittest.TestCase):
+    def test_chunks(self):
+        handler = ProductImport(refused='NEW7')
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(handler))
+        with self.assertRaises(BatchCreateException) as raised:
+            asyncio.run(bc.data_sources('Products').batch_create(new_products(7), chunk_size=3, max_workers=2))
+        self.assertEqual(sorted(len(body) for body in handler.posted), [1, 3, 3])
+        self.assertEqual([chunk for chunk, _, _ in raised.exception.failed], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import time
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.cache import ResponseCache
+from blackcurve.transport import FakeTransport
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class ExchangeRates(object):
+    def __init__(self, validator='ETag'):
+        """
+        Currencies endpoint answering with a version header, and with a 304 when the request already has the current
+        version. Saving a rate makes a new version
+        :param validator: Optional: 'ETag', 'Last-Modified' or None to send no validator
+        """
+        self.validator = validator
+        self.version = 1
+        self.rates = {'GBP': 1.0, 'EUR': 1.17}
+
+    @property
+    def tag(self):
+        if self.validator == 'ETag':
+            return '"v%s"' % self.version
+        return 'Mon, 0%s Jun 2026 09:00:00 GMT' % self.version
+
+    def __call__(self, method, url, headers, data):
+        if method != 'GET':
+            self.version += 1
+            self.rates['EUR'] = 1.2
+            return 200, {'success': True}
+        if self.validator is None:
+            return 200, self.body()
+        asked = headers.get('If-None-Match' if self.validator == 'ETag' else 'If-Modified-Since')
+        if asked == self.tag:
+            return 304, ''
+        return 200, self.body(), {self.validator: self.tag}
+
+    def body(self):
+        return {'data': [{'code': code, 'Rate': rate} for code, rate in sorted(self.rates.items())]}
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_least_recently_used_are_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual((cache.get('a').value, cache.get('b'), cache.get('c').value), (1, None, 3))
+
+    def test_ttls_by_endpoint(self):
+        cache = ResponseCache(ttls={'currencies/': 60}, default_ttl=5)
+        self.assertEqual((cache.ttl('currencies/'), cache.ttl('data_sources/Sales')), (60, 5))
+        self.assertIsNone(ResponseCache().ttl('data_sources/Sales'))
+
+    def test_stale_entries_are_kept_while_they_can_be_revalidated(self):
+        cache = ResponseCache()
+        cache.set('plain', 1, -1)
+        cache.set('tagged', 2, -1, etag='"v1"')
+        self.assertIsNone(cache.get('plain'))
+        self.assertFalse(cache.get('tagged').fresh)
+        cache.touch('tagged', 60)
+        self.assertTrue(cache.get('tagged').fresh)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        for key in ('https://x/api/currencies/', 'https://x/api/currencies/?page=2', 'https://x/api/geographies/'):
+            cache.set(key, key, 60)
+        cache.invalidate('https://x/api/currencies/')
+        self.assertEqual(len(cache), 1)
+
+
+class ClientCacheTest(unittest.TestCase):
+    def build(self, rates, **cache_kwargs):
+        self.transport = FakeTransport(rates)
+        return BlackCurveAPI('acme', 'token', transport=self.transport, cache=ResponseCache(**cache_kwargs))
+
+    @staticmethod
+    def rates(bc):
+        return [row['Rate'] for row in bc.currencies().all()]
+
+    def test_fresh_responses_are_answered_from_memory(self):
+        bc = self.build(ExchangeRates())
+        self.assertEqual(self.rates(bc), self.rates(bc))
+        self.assertEqual(len(self.transport.requests), 1)
+
+    def test_stale_responses_are_revalidated(self):
+        for validator, header in (('ETag', 'If-None-Match'), ('Last-Modified', 'If-Modified-Since')):
+            rates = ExchangeRates(validator)
+            bc = self.build(rates, ttls={'currencies/': 0.01})
+            self.rates(bc)
+            time.sleep(0.02)
+            self.assertEqual(self.rates(bc), [1.17, 1.0])
+            self.assertEqual(self.transport.requests[1].headers.get(header), rates.tag)
+            # answered from memory again once revalidated
+            self.rates(bc)
+            self.assertEqual(len(self.transport.requests), 2)
+
+    def test_a_changed_response_replaces_the_stale_one(self):
+        rates = ExchangeRates()
+        bc = self.build(rates, ttls={'currencies/': 0})
+        self.rates(bc)
+        rates.rates['EUR'] = 1.25
+        rates.version = 2
+        self.assertEqual(self.rates(bc), [1.25, 1.0])
+
+    def test_writes_invalidate_the_endpoint(self):
+        bc = self.build(ExchangeRates())
+        euro = list(bc.currencies().all())[0]
+        euro['Rate'] = 1.2
+        euro.save()
+        self.assertEqual(self.rates(bc), [1.2, 1.0])
+        self.assertEqual([request.method for request in self.transport.requests], ['GET', 'POST', 'GET'])
+
+    def test_endpoints_without_a_ttl_arent_cached(self):
+        bc = self.build(ExchangeRates(), ttls={})
+        self.rates(bc)
+        self.rates(bc)
+        self.assertEqual(len(self.transport.requests), 2)
+
+    def test_responses_without_a_validator_are_fetched_again_once_stale(self):
+        bc = self.build(ExchangeRates(None), ttls={'currencies/': 0})
+        self.rates(bc)
+        self.rates(bc)
+        self.assertNotIn('If-None-Match', self.transport.requests[1].headers)
+
+    def test_cached_responses_are_reported(self):
+        bc = self.build(ExchangeRates())
+        events = []
+        bc.add_hook(events.append)
+        self.rates(bc)
+        self.rates(bc)
+        self.assertEqual([event.cached for event in events], [False, True])
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncClientCacheTest(unittest.TestCase):
+    def test_fresh_responses_are_answered_from_memory(self):
+        transport = AsyncFakeTransport(ExchangeRates())
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=transport, cache=ResponseCache())
+
+        async def main():
+            for _ in range(2):
+                [row async for row in bc.currencies().all()]
+        asyncio.run(main())
+        self.assertEqual(len(transport.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.checkpoint import Cursor, FileCheckpoint, MemoryCheckpoint
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class Ledger(object):
+    def __init__(self, no_rows=25, page_size=10):
+        """
+        Sales Ledger data source of ids 1 - no_rows, keeping the pages requested
+        :param no_rows: Optional: number of rows (25)
+        :param page_size: Optional: rows per page (10)
+        """
+        self.ids = list(range(1, no_rows + 1))
+        self.page_size = page_size
+        self.requested = []
+        self.failing_page = None
+
+    def __call__(self, method, url, headers, data):
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        self.requested.append(page)
+        if page == self.failing_page:
+            raise IOError('connection reset')
+        ids = self.ids[(page - 1) * self.page_size:page * self.page_size]
+        no_pages = (len(self.ids) + self.page_size - 1) // self.page_size
+        return 200, {'data': [{'id': i, 'Amount': i * 2.5} for i in ids], 'no_pages': no_pages}
+
+
+class CursorTest(unittest.TestCase):
+    def test_json_round_trip(self):
+        cursor = Cursor('data_sources/Sales Ledger', {'columns': ('id', 'Amount')}, 3, no_pages=5, offset=120)
+        self.assertEqual(Cursor.from_json(cursor.to_json()), cursor)
+        self.assertEqual(Cursor.from_dict(cursor.to_dict()).params, {'columns': ['id', 'Amount']})
+        self.assertNotEqual(cursor, Cursor('data_sources/Sales Ledger', {}, 3, no_pages=5, offset=120))
+
+    def test_done(self):
+        self.assertFalse(Cursor('prices/', {}, 2).done)
+        self.assertFalse(Cursor('prices/', {}, 3, no_pages=3).done)
+        self.assertTrue(Cursor('prices/', {}, 4, no_pages=3).done)
+        self.assertTrue(Cursor('prices/', {}, 3, no_pages=5, finish=2).done)
+
+    def test_matches(self):
+        cursor = Cursor('prices/', {'geography': ['UK', 'FR']}, 2)
+        self.assertTrue(cursor.matches('prices/', {'geography': ('UK', 'FR')}))
+        self.assertFalse(cursor.matches('prices/', {'geography': ['UK']}))
+        self.assertFalse(cursor.matches('data_sources/Sales Ledger', {'geography': ['UK', 'FR']}))
+
+
+class FileCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_save_load_clear(self):
+        checkpoint = FileCheckpoint(os.path.join(self.directory, 'cursor.json'))
+        self.assertIsNone(checkpoint.load())
+        cursor = Cursor('prices/', {'geography': 'UK'}, 2, no_pages=4)
+        checkpoint.save(cursor)
+        checkpoint.save(cursor)
+        self.assertEqual(checkpoint.load(), cursor)
+        self.assertEqual(os.listdir(self.directory), ['cursor.json'])
+        checkpoint.clear()
+        checkpoint.clear()
+        self.assertIsNone(checkpoint.load())
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = Ledger()
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.ledger))
+
+    def query(self, **kwargs):
+        return self.bc.data_sources('Sales Ledger', **kwargs)
+
+    def test_resumes_from_the_last_saved_page(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = FileCheckpoint(os.path.join(directory, 'cursor.json'))
+        for row in self.query().all(checkpoint=checkpoint):
+            # page 2 has been consumed once the first row of page 3 is read
+            if row['id'] == 21:
+                break
+        self.assertEqual(checkpoint.load().page, 3)
+        ids = [row['id'] for row in self.query().all(checkpoint=checkpoint)]
+        self.assertEqual(ids, list(range(21, 26)))
+        self.assertEqual(self.ledger.requested, [1, 2, 3, 3])
+
+    def test_a_failed_iteration_resumes_at_the_failed_page(self):
+        for prefetch in (None, 3):
+            self.ledger.requested = []
+            checkpoint = MemoryCheckpoint()
+            self.ledger.failing_page = 2
+            with self.assertRaises(IOError):
+                list(self.query().all(checkpoint=checkpoint, prefetch=prefetch))
+            self.ledger.failing_page = None
+            failed = len(self.ledger.requested)
+            self.assertEqual(len(list(self.query().all(checkpoint=checkpoint, prefetch=prefetch))), 15)
+            self.assertEqual(sorted(self.ledger.requested[failed:]), [2, 3])
+
+    def test_the_checkpoint_is_cleared_after_the_last_page(self):
+        checkpoint = MemoryCheckpoint()
+        for _ in range(2):
+            ids = [row['id'] for row in self.query().all(checkpoint=checkpoint)]
+            self.assertEqual(ids, list(range(1, 26)))
+            self.assertIsNone(checkpoint.load())
+
+    def test_saved_every_few_pages(self):
+        self.ledger.page_size = 2
+        checkpoint = MemoryCheckpoint(every=3)
+        saved = []
+        checkpoint.save = lambda cursor: saved.append(cursor.page)
+        list(self.query().all(checkpoint=checkpoint))
+        self.assertEqual(saved, [4, 7, 10, 13])
+
+    def test_a_finished_cursor_starts_again(self):
+        checkpoint = MemoryCheckpoint()
+        query = self.query().all()
+        list(query)
+        self.assertTrue(query.cursor.done)
+        checkpoint.save(query.cursor)
+        self.assertEqual(len(list(self.query().all(checkpoint=checkpoint))), 25)
+
+    def test_page_ranges(self):
+        checkpoint = MemoryCheckpoint()
+        checkpoint.save(Cursor('data_sources/Sales Ledger', {}, 2, no_pages=3, finish=2))
+        self.assertEqual([row['id'] for row in self.query().pages(1, 2, checkpoint=checkpoint)],
+                         list(range(11, 21)))
+
+    def test_resume_from_a_cursor(self):
+        query = self.query().all()
+        for row in query:
+            if row['id'] == 11:
+                break
+        cursor = query.cursor.to_dict()
+        ids = [row['id'] for row in self.query().all().resume(cursor)]
+        self.assertEqual(ids, list(range(11, 26)))
+
+    def test_a_cursor_of_another_query_is_refused(self):
+        checkpoint = MemoryCheckpoint()
+        checkpoint.save(Cursor('data_sources/Sales Ledger', {'columns': ['id']}, 2, no_pages=3))
+        with self.assertRaises(ValueError):
+            list(self.query().all(checkpoint=checkpoint))
+        with self.assertRaises(ValueError):
+            self.query(columns=['Amount']).all().resume(checkpoint.load())
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncResumeTest(unittest.TestCase):
+    def test_resumes_from_the_last_saved_page(self):
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(Ledger()))
+        checkpoint = MemoryCheckpoint()
+
+        async def first_two_pages():
+            pages = 0
+            async for _ in bc.data_sources('Sales Ledger').all(checkpoint=checkpoint).iter_pages():
+                pages += 1
+                # the second page is saved once the third one is reached
+                if pages == 3:
+                    break
+
+        async def rest():
+            return [row['id'] async for row in bc.data_sources('Sales Ledger').all(checkpoint=checkpoint)]
+        asyncio.run(first_two_pages())
+        self.assertEqual(checkpoint.load().page, 3)
+        self.assertEqual(asyncio.run(rest()), list(range(21, 26)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.coalesce import RequestCoalescer
+from blackcurve.transport import FakeTransport
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport, AsyncRequestCoalescer
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class HotPrices(object):
+    def __init__(self):
+        """
+        Prices endpoint answering prices/<Product ID> once released, so requests can be held in flight together
+        A product id starting with 'X' is refused with an API error
+        """
+        self.release = threading.Event()
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, headers, data):
+        with self.lock:
+            self.requested.append(url)
+        self.release.wait(5)
+        sku = url.rsplit('/', 1)[-1]
+        if sku.startswith('X'):
+            return 200, {'error': 'No price for %s' % sku}
+        return 200, {'prices': [{'Product ID': sku, 'Geography': 'UK', 'Price': 9.99}], 'no_pages': 1}
+
+
+class RequestCoalescerTest(unittest.TestCase):
+    def test_calls_in_flight_are_shared(self):
+        coalescer = RequestCoalescer()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return 'response'
+        threads = [threading.Thread(target=lambda: results.append(coalescer.call('key', fetch))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.assertEqual(len(coalescer), 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('response', False)] + [('response', True)] * 3)
+        # nothing is kept once the call has finished
+        self.assertEqual(len(coalescer), 0)
+        self.assertEqual(coalescer.call('key', lambda: 'again'), ('again', False))
+
+    def test_a_failed_call_isnt_kept(self):
+        coalescer = RequestCoalescer()
+
+        def fail():
+            raise IOError('connection reset')
+        with self.assertRaises(IOError):
+            coalescer.call('key', fail)
+        self.assertEqual(coalescer.call('key', lambda: 'response'), ('response', False))
+
+
+class ClientCoalescingTest(unittest.TestCase):
+    def setUp(self):
+        self.prices = HotPrices()
+        self.transport = FakeTransport(self.prices)
+
+    def find_together(self, bc, skus):
+        """
+        Look the skus up from a thread each, answering once every thread has started
+        :return: list of the prices found or the exceptions raised, in sku order
+        """
+        results = [None] * len(skus)
+
+        def find(i, sku):
+            try:
+                results[i] = bc.prices().find(sku)
+            except APIException as e:
+                results[i] = e
+        threads = [threading.Thread(target=find, args=(i, sku)) for i, sku in enumerate(skus)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.prices.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_requests_share_one_response(self):
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport)
+        events = []
+        bc.add_hook(events.append)
+        prices = self.find_together(bc, ['UK42'] * 5)
+        self.assertEqual([price['Product ID'] for price in prices], ['UK42'] * 5)
+        self.assertEqual(len(self.prices.requested), 1)
+        self.assertEqual(sorted(event.coalesced for event in events), [False] + [True] * 4)
+        # each caller gets its own rows
+        prices[0]['Price'] = 12.5
+        self.assertEqual(prices[1]['Price'], 9.99)
+
+    def test_different_requests_are_each_sent(self):
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport)
+        prices = self.find_together(bc, ['UK42', 'UK43', 'UK42'])
+        self.assertEqual([price['Product ID'] for price in prices], ['UK42', 'UK43', 'UK42'])
+        self.assertEqual(sorted(self.prices.requested), ['https://acme.blackcurve.io/api/prices/UK42',
+                                                         'https://acme.blackcurve.io/api/prices/UK43'])
+
+    def test_errors_are_shared(self):
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport)
+        errors = self.find_together(bc, ['X1'] * 3)
+        self.assertTrue(all(isinstance(error, APIException) for error in errors))
+        self.assertEqual(len(self.prices.requested), 1)
+
+    def test_requests_made_one_after_another_are_each_sent(self):
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport)
+        self.prices.release.set()
+        bc.prices().find('UK42')
+        bc.prices().find('UK42')
+        self.assertEqual(len(self.prices.requested), 2)
+
+    def test_coalescing_can_be_turned_off(self):
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport, coalesce=False)
+        self.assertIsNone(bc.coalescer)
+        self.find_together(bc, ['UK42'] * 3)
+        self.assertEqual(len(self.prices.requested), 3)
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncCoalescingTest(unittest.TestCase):
+    def test_identical_requests_share_one_response(self):
+        prices = HotPrices()
+        prices.release.set()
+        transport = AsyncFakeTransport(prices)
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=transport)
+
+        async def main():
+            return await asyncio.gather(*[bc.prices().find(sku) for sku in ('UK42', 'UK42', 'UK43', 'UK42')])
+        self.assertEqual([price['Product ID'] for price in asyncio.run(main())], ['UK42', 'UK42', 'UK43', 'UK42'])
+        self.assertEqual(len(transport.requests), 2)
+
+    def test_a_cancelled_waiter_doesnt_cancel_the_request(self):
+        coalescer = AsyncRequestCoalescer()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 'response'
+
+        async def main():
+            first = asyncio.ensure_future(coalescer.call('key', fetch))
+            second = asyncio.ensure_future(coalescer.call('key', fetch))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+        self.assertEqual(asyncio.run(main()), ('response', True))
+        self.assertEqual(len(coalescer), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
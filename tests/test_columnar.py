@@ -0,0 +1,101 @@
+import datetime
+import sys
+import unittest
+from unittest import mock
+
+from blackcurve import columnar
+from blackcurve.api import BlackCurveAPI
+from blackcurve.transport import FakeTransport
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Stock is an Integer column with a missing value, Weight an Integer column the API sent a float in, Price has no
+# column type and mixes ints with floats, Discount mixes them with a missing value
+STOCK = [
+    {'SKU': 'A', 'Stock': 1, 'Weight': 2, 'Price': 2, 'Discount': None},
+    {'SKU': 'B', 'Stock': None, 'Weight': 1.5, 'Price': 2.75, 'Discount': 0.5},
+    {'SKU': 'C', 'Stock': 3, 'Weight': 4, 'Price': 3, 'Discount': 1},
+]
+
+
+class InferKindTest(unittest.TestCase):
+    def test_every_value_is_looked_at(self):
+        self.assertEqual(columnar.infer_kind([1, None, 2.75]), 'float')
+        self.assertEqual(columnar.infer_kind([None, 1, 2]), 'int')
+        self.assertEqual(columnar.infer_kind([datetime.date(2020, 1, 2), datetime.datetime(2020, 1, 2, 3)]),
+                         'datetime')
+        self.assertEqual(columnar.infer_kind([True, False]), 'bool')
+        self.assertEqual(columnar.infer_kind([1, 'one']), 'str')
+        self.assertEqual(columnar.infer_kind([None]), 'str')
+
+    def test_a_float_in_an_integer_column(self):
+        columns, _ = columnar.collect_columns(STOCK)
+        kinds = columnar.column_kinds(columns, {'Stock': 'Integer', 'Weight': 'Integer'})
+        self.assertEqual((kinds['Stock'], kinds['Weight'], kinds['Price']), ('int', 'float', 'float'))
+
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        transport = FakeTransport()
+        transport.add('GET', 'data_sources_info/Stock', {'Stock': {'Stock': 'Integer', 'Weight': 'Integer'}})
+        transport.add('GET', 'data_sources/Stock', {'data': STOCK, 'no_pages': 1})
+        self.query = BlackCurveAPI('acme', 'token', transport=transport).data_sources('Stock').all()
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_to_numpy(self):
+        array = self.query.to_numpy()
+        self.assertEqual(array['Price'].tolist(), [2.0, 2.75, 3.0])
+        self.assertEqual(array['Weight'].tolist(), [2.0, 1.5, 4.0])
+        self.assertTrue(numpy.isnan(array['Stock'][1]))
+        self.assertTrue(numpy.isnan(array['Discount'][0]))
+        self.assertEqual(array['Discount'][1:].tolist(), [0.5, 1.0])
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_numpy_never_truncates(self):
+        self.assertEqual(columnar._numpy_column(numpy, [1, 2.75], 'int').tolist(), [1.0, 2.75])
+        self.assertEqual(columnar._numpy_column(numpy, ['1', '2.75'], 'int').tolist(), ['1', '2.75'])
+        updated = datetime.datetime(2020, 1, 2, 3, 4, 5, 600)
+        self.assertEqual(columnar._numpy_column(numpy, [updated], 'datetime').tolist(), [updated])
+
+    @unittest.skipIf(pandas is None, 'requires pandas')
+    def test_to_pandas(self):
+        frame = self.query.to_pandas()
+        self.assertEqual(str(frame['Stock'].dtype), 'Int64')
+        self.assertTrue(pandas.isna(frame['Stock'][1]))
+        self.assertEqual(list(frame['Price']), [2.0, 2.75, 3.0])
+        self.assertEqual(list(frame['Weight']), [2.0, 1.5, 4.0])
+        self.assertEqual(list(frame['Discount'][1:]), [0.5, 1.0])
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_to_arrow(self):
+        table = self.query.to_arrow()
+        self.assertEqual(table.schema.field('Stock').type, pyarrow.int64())
+        self.assertEqual(table.column('Stock').to_pylist(), [1, None, 3])
+        self.assertEqual(table.column('Price').to_pylist(), [2.0, 2.75, 3.0])
+        self.assertEqual(table.column('Weight').to_pylist(), [2.0, 1.5, 4.0])
+        self.assertEqual(table.column('Discount').to_pylist(), [None, 0.5, 1.0])
+        self.assertEqual(table.column('SKU').to_pylist(), ['A', 'B', 'C'])
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_to_arrow_without_numpy(self):
+        columns, _ = columnar.collect_columns(STOCK)
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            table = columnar.to_arrow(columns, columnar.column_kinds(columns))
+        self.assertEqual(table.column('Discount').to_pylist(), [None, 0.5, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+
+from blackcurve.api import BlackCurveAPI, DataHolder, Row
+from blackcurve.transport import FakeTransport
+
+# the last product is missing a column, so it has a column layout of its own
+INVENTORY = [
+    {'id': 1, 'Product ID': 'UK42', 'Stock Level': 12, 'Warehouse': 'Leeds'},
+    {'id': 2, 'Product ID': 'UK43', 'Stock Level': 0, 'Warehouse': 'York'},
+    {'id': 3, 'Product ID': 'UK44', 'Stock Level': 7},
+]
+
+
+class Inventory(object):
+    def __init__(self):
+        """
+        Inventory data source on a single page, keeping the body of every POST & the url of every DELETE
+        """
+        self.posted = []
+        self.deleted = []
+
+    def __call__(self, method, url, headers, data):
+        if method == 'POST':
+            self.posted.append(json.loads(data))
+        elif method == 'DELETE':
+            self.deleted.append(url)
+        else:
+            return 200, {'data': INVENTORY, 'no_pages': 1}
+        return 200, {'success': True}
+
+
+class CompactRowTest(unittest.TestCase):
+    def setUp(self):
+        self.inventory = Inventory()
+        bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.inventory))
+        self.rows = list(bc.data_sources('Inventory').all(compact=True))
+
+    def test_rows_are_compact(self):
+        self.assertTrue(all(isinstance(row, Row) for row in self.rows))
+        self.assertFalse(hasattr(self.rows[0], '__dict__'))
+        first, second, third = self.rows
+        self.assertIs(first._schema, second._schema)
+        self.assertIsNot(first._schema, third._schema)
+
+    def test_reading(self):
+        row = self.rows[0]
+        self.assertEqual((row['Stock Level'], row['stock_level'], row.stock_level), (12, 12, 12))
+        self.assertEqual((row.get('Warehouse'), self.rows[2].get('Warehouse', 'none')), ('Leeds', 'none'))
+        self.assertIn('Product ID', row)
+        self.assertNotIn('Colour', row)
+        with self.assertRaises(KeyError):
+            row['Colour']
+        self.assertEqual(len(row), 4)
+        self.assertEqual(row.keys(), ['id', 'Product ID', 'Stock Level', 'Warehouse'])
+        self.assertEqual(row.values(), [1, 'UK42', 12, 'Leeds'])
+        self.assertEqual(list(row), row.items())
+        self.assertEqual(row.to_dict(), INVENTORY[0])
+
+    def test_rows_are_read_only(self):
+        with self.assertRaises(TypeError):
+            self.rows[0]['Stock Level'] = 3
+
+    def test_edit_saves_the_changes(self):
+        product = self.rows[1].edit()
+        self.assertIsInstance(product, DataHolder)
+        product['Stock Level'] = 40
+        product.save()
+        self.assertEqual(self.inventory.posted, [{'id': 2, 'Stock Level': 40}])
+        self.assertEqual(self.rows[1]['Stock Level'], 0)
+
+    def test_delete(self):
+        self.rows[2].delete()
+        self.assertEqual(len(self.inventory.deleted), 1)
+        self.assertIn('id=3', self.inventory.deleted[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.checkpoint import MemoryCheckpoint
+from blackcurve.export import export_format
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+def order(i):
+    return {'id': i, 'Customer': u'Caf\xe9 %s' % i, 'Total': i * 1.5, 'Notes': 'gift' if i % 5 == 0 else None,
+            'Lines': [{'sku': 'UK%s' % i, 'qty': 1}]}
+
+
+class Orders(object):
+    def __init__(self, no_orders=25, page_size=10):
+        """
+        Orders data source of ids 1 - no_orders, with its column types on data_sources_info
+        :param no_orders: Optional: number of orders (25)
+        :param page_size: Optional: orders per page (10)
+        """
+        self.no_orders = no_orders
+        self.page_size = page_size
+        self.failing_page = None
+        self.requested = []
+
+    def __call__(self, method, url, headers, data):
+        if 'data_sources_info/' in url:
+            return 200, {'Orders': {'id': 'Integer', 'Customer': 'String', 'Total': 'Decimal', 'Notes': 'String'}}
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        self.requested.append(page)
+        if page == self.failing_page:
+            raise IOError('connection reset')
+        ids = range((page - 1) * self.page_size + 1, min(page * self.page_size, self.no_orders) + 1)
+        no_pages = (self.no_orders + self.page_size - 1) // self.page_size
+        return 200, {'data': [order(i) for i in ids], 'no_pages': no_pages}
+
+
+class ExportFormatTest(unittest.TestCase):
+    def test_format_from_the_extension(self):
+        self.assertEqual([export_format(path) for path in ('a.csv', 'a.NDJSON', 'a.jsonl', 'a.pq')],
+                         ['csv', 'ndjson', 'ndjson', 'parquet'])
+        self.assertEqual(export_format('orders.txt', 'csv'), 'csv')
+        for path, format in (('orders.txt', None), ('orders.csv', 'xlsx')):
+            with self.assertRaises(ValueError):
+                export_format(path, format)
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.orders = Orders()
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.orders))
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def query(self):
+        return self.bc.data_sources('Orders')
+
+    @staticmethod
+    def read(path):
+        with io.open(path, encoding='utf-8', newline='') as f:
+            if path.endswith('.csv'):
+                return list(csv.DictReader(f))
+            return [json.loads(line) for line in f]
+
+    def test_csv(self):
+        path = self.path('orders.csv')
+        self.assertEqual(self.query().all().export(path, prefetch=3), 25)
+        rows = self.read(path)
+        self.assertEqual([int(row['id']) for row in rows], list(range(1, 26)))
+        self.assertEqual(rows[4], {'id': '5', 'Customer': u'Caf\xe9 5', 'Total': '7.5', 'Notes': 'gift',
+                                   'Lines': '[{"qty": 1, "sku": "UK5"}]'})
+        self.assertEqual(rows[0]['Notes'], '')
+
+    def test_ndjson(self):
+        path = self.path('orders.ndjson')
+        self.assertEqual(self.query().all().export(path), 25)
+        self.assertEqual(self.read(path), [order(i) for i in range(1, 26)])
+
+    def test_columns_and_page_ranges(self):
+        # csv values are read back as strings
+        expected = {'orders.csv': {'id': '11', 'Total': '16.5'}, 'orders.ndjson': {'id': 11, 'Total': 16.5}}
+        for name, first in expected.items():
+            path = self.path(name)
+            self.assertEqual(self.query().pages(2, 2).export(path, columns=['id', 'Total']), 10)
+            self.assertEqual(dict(self.read(path)[0]), first)
+
+    def test_an_evaluated_query_exports_its_rows(self):
+        query = self.query().all()
+        list(query)
+        self.assertEqual(query.export(self.path('orders.ndjson')), 25)
+        self.assertEqual(self.orders.requested, [1, 2, 3])
+
+    def test_no_rows(self):
+        self.orders.no_orders = 0
+        path = self.path('orders.csv')
+        self.assertEqual(self.query().all().export(path, columns=['id']), 0)
+        self.assertEqual(self.read(path), [])
+
+    def test_resume_from_a_checkpoint(self):
+        for name in ('orders.csv', 'orders.ndjson'):
+            path = self.path(name)
+            checkpoint = MemoryCheckpoint()
+            self.orders.failing_page = 3
+            with self.assertRaises(IOError):
+                self.query().all(checkpoint=checkpoint).export(path, prefetch=1)
+            self.assertEqual(checkpoint.load().page, 3)
+            # half a row written when it failed
+            with open(path, 'a') as f:
+                f.write('21,Caf')
+            self.orders.failing_page = None
+            self.assertEqual(self.query().all(checkpoint=checkpoint).export(path), 5)
+            self.assertEqual([int(row['id']) for row in self.read(path)], list(range(1, 26)))
+            self.assertIsNone(checkpoint.load())
+
+    def test_resume_from_a_cursor(self):
+        path = self.path('orders.csv')
+        query = self.query().all()
+        self.orders.failing_page = 2
+        with self.assertRaises(IOError):
+            query.export(path, prefetch=1)
+        self.orders.failing_page = None
+        cursor = json.loads(json.dumps(query.cursor.to_dict()))
+        self.assertEqual(self.query().all().resume(cursor).export(path), 15)
+        self.assertEqual([int(row['id']) for row in self.read(path)], list(range(1, 26)))
+
+    def test_parquet_cant_be_resumed(self):
+        with self.assertRaises(ValueError):
+            self.query().all(checkpoint=MemoryCheckpoint()).export(self.path('orders.parquet'))
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_parquet(self):
+        path = self.path('orders.parquet')
+        self.assertEqual(self.query().all().export(path, columns=['id', 'Customer', 'Total', 'Notes']), 25)
+        parquet = pyarrow.parquet.ParquetFile(path)
+        # a row group per page, typed by data_sources_info
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual([str(field.type) for field in parquet.schema_arrow], ['int64', 'string', 'double', 'string'])
+        self.assertEqual(parquet.read().column('Notes').to_pylist()[:5], [None, None, None, None, 'gift'])
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncExportTest(unittest.TestCase):
+    def test_ndjson(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'orders.ndjson')
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(Orders()))
+        self.assertEqual(asyncio.run(bc.data_sources('Orders').all().export(path, prefetch=2)), 25)
+        with open(path) as f:
+            self.assertEqual([json.loads(line)['id'] for line in f], list(range(1, 26)))
+
+
+if __name__ == '__main__':
+    unittest.main()
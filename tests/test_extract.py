@@ -0,0 +1,92 @@
+import json
+import threading
+import unittest
+
+from blackcurve import extract
+from blackcurve.api import BlackCurveAPI
+from blackcurve.extract import Batch, ShardedExtractor, Source, compact_rows
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, unquote, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urllib import unquote
+    from urlparse import parse_qs, urlparse
+
+# rows of each data source, 3 to a page
+SOURCES = {
+    'Sales History': [{'id': i, 'Units': i * 2} for i in range(1, 12)],
+    'Inventory': [{'id': i, 'Stock': i, 'Warehouse': 'W%s' % (i % 2)} for i in range(1, 6)],
+}
+PAGE_SIZE = 3
+
+
+class DataSourceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        rows = SOURCES[unquote(url.path[len('/api/data_sources/'):])]
+        if 'warehouse' in query:
+            rows = [row for row in rows if row.get('Warehouse') == query['warehouse']]
+        page = int(query.get('page', 1))
+        body = json.dumps({'data': rows[(page - 1) * PAGE_SIZE:page * PAGE_SIZE],
+                           'no_pages': max(1, -(-len(rows) // PAGE_SIZE))}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ShardedExtractorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), DataSourceHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.bc = BlackCurveAPI('acme', 'token', domain='http://127.0.0.1:%s/api/' % cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def extract(self, sources, **kwargs):
+        kwargs.setdefault('processes', 2)
+        return list(ShardedExtractor(self.bc, **kwargs).extract(sources))
+
+    def test_sources_come_back_in_order(self):
+        batches = self.extract(['Sales History', 'Inventory'], pages_per_shard=2, max_pending=1)
+        self.assertEqual([(batch.source, batch.page) for batch in batches],
+                         [('Sales History', page) for page in range(1, 5)] + [('Inventory', 1), ('Inventory', 2)])
+        self.assertEqual([row['id'] for batch in batches[:4] for row in batch], list(range(1, 12)))
+
+    def test_page_range_and_filters(self):
+        batches = self.extract([Source('Sales History', start=2, finish=3), Source('Inventory', warehouse='W1')])
+        self.assertEqual([(batch.source, batch.page) for batch in batches],
+                         [('Sales History', 2), ('Sales History', 3), ('Inventory', 1)])
+        self.assertEqual([row['id'] for row in batches[2]], [1, 3, 5])
+
+    def test_workers_are_built_with_the_domain_of_the_client(self):
+        settings = ShardedExtractor(self.bc, processes=1).settings
+        api = extract._get_worker_api(settings)
+        self.assertEqual((api.subdomain, api.domain), ('acme', self.bc.domain))
+        self.assertIs(extract._get_worker_api(dict(settings)), api)
+
+
+class CompactRowsTest(unittest.TestCase):
+    def test_columns_are_sent_once(self):
+        columns, rows = compact_rows([{'id': 1, 'Units': 2}, {'Units': 4, 'id': 2}, {'id': 3, 'Note': 'late'}])
+        self.assertEqual(columns, ('id', 'Units', 'Note'))
+        self.assertEqual(rows, [(1, 2, None), (2, 4, None), (3, None, 'late')])
+        batch = Batch('Sales History', 1, columns, rows)
+        self.assertEqual(list(batch)[2], {'id': 3, 'Units': None, 'Note': 'late'})
+
+
+if __name__ == '__main__':
+    unittest.main()
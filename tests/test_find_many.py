@@ -0,0 +1,111 @@
+import asyncio
+import sys
+import unittest
+
+from blackcurve.api import BlackCurveAPI, Row
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+# UK42 is priced in two geographies
+PRICES = [
+    {'id': 1, 'Product ID': 'UK42', 'Geography': 'UK', 'Price': 10.0},
+    {'id': 2, 'Product ID': 'UK42', 'Geography': 'IE', 'Price': 11.5},
+    {'id': 3, 'Product ID': 'UK43', 'Geography': 'UK', 'Price': 7.25},
+]
+
+SALES = [{'id': i, 'Product ID': 'UK%s' % i, 'Units': i * 10} for i in range(1, 6)]
+
+
+def filter_param(url, name):
+    """
+    :return: list of the comma delimited values of a query param of the url, None when it isn't there
+    """
+    values = parse_qs(urlparse(url).query).get(name)
+    return values[0].split(',') if values else None
+
+
+def price_list(method, url, headers, data):
+    wanted = filter_param(url, 'product_id')
+    return 200, {'prices': [price for price in PRICES if price['Product ID'] in wanted], 'no_pages': 1}
+
+
+def sales_history(method, url, headers, data):
+    wanted = filter_param(url, 'id')
+    return 200, {'data': [row for row in SALES if str(row['id']) in wanted], 'no_pages': 1}
+
+
+def single_id_sales_history(method, url, headers, data):
+    """
+    Data source that ignores a list of ids, sending every row back, and only filters on a single one
+    """
+    wanted = filter_param(url, 'id')
+    if len(wanted) > 1:
+        return 200, {'data': SALES, 'no_pages': 1}
+    rows = [row for row in SALES if str(row['id']) in wanted]
+    if not rows:
+        return 200, {'error': 'No row with id %s' % wanted[0]}
+    return 200, {'data': rows, 'no_pages': 1}
+
+
+class FindManyTest(unittest.TestCase):
+    def build(self, handler):
+        self.transport = FakeTransport(handler)
+        return BlackCurveAPI('acme', 'token', transport=self.transport)
+
+    def test_prices_are_always_lists(self):
+        found = self.build(price_list).prices().find_many(['UK42', 'UK43', 'UK99'])
+        self.assertEqual([price.geography for price in found['UK42']], ['UK', 'IE'])
+        self.assertEqual([price.price for price in found['UK43']], [7.25])
+        self.assertEqual(found.missing, ['UK99'])
+        self.assertEqual(len(self.transport.requests), 1)
+
+    def test_data_source_rows_are_rows(self):
+        found = self.build(sales_history).data_sources('Sales History').find_many([4, 30, 2])
+        self.assertEqual(list(found), [4, 2])
+        self.assertEqual(found[4]['Units'], 40)
+        self.assertEqual(found.missing, [30])
+
+    def test_ids_are_split_to_fit_the_url(self):
+        bc = self.build(sales_history)
+        url_length = len(bc.domain + 'data_sources/Sales History?id=') + 10
+        found = bc.data_sources('Sales History').find_many([1, 2, 3, 4, 5], max_url_length=url_length)
+        self.assertEqual(sorted(found), [1, 2, 3, 4, 5])
+        self.assertGreater(len(self.transport.requests), 1)
+        self.assertTrue(all(len(request.url) <= url_length for request in self.transport.requests))
+
+    def test_an_endpoint_ignoring_the_filter_is_asked_id_by_id(self):
+        found = self.build(single_id_sales_history).data_sources('Sales History').find_many([2, 3, 30])
+        self.assertEqual((found[2]['Units'], found[3]['Units']), (20, 30))
+        self.assertEqual(found.missing, [30])
+        self.assertEqual(list(found.errors), [30])
+        # the list of ids, then one request per id
+        self.assertEqual(len(self.transport.requests), 4)
+
+    def test_compact(self):
+        found = self.build(price_list).prices().find_many(['UK43'], compact=True)
+        self.assertIsInstance(found['UK43'][0], Row)
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncFindManyTest(unittest.TestCase):
+    def test_same_types_as_the_sync_client(self):
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(price_list))
+        found = asyncio.run(bc.prices().find_many(['UK42', 'UK43']))
+        self.assertEqual([len(found['UK42']), len(found['UK43'])], [2, 1])
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(sales_history))
+        found = asyncio.run(bc.data_sources('Sales History').find_many([4, 30]))
+        self.assertEqual(found[4]['Units'], 40)
+        self.assertEqual(found.missing, [30])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import sys
+import unittest
+
+from blackcurve.api import BlackCurveAPI, DataHolder, Row
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+
+class PriceList(object):
+    def __init__(self):
+        """
+        Prices endpoint of 2 pages, a product has a price per geography so Product ID isn't unique, rows are
+        identified by System ID which is also reachable as id
+        """
+        self.pages = {
+            1: [{'System ID': 1, 'Product ID': 'UK42', 'Geography': 'UK', 'Price': 9.99, 'Tags': ['sale']},
+                {'System ID': 2, 'Product ID': 'UK42', 'Geography': 'FR', 'Price': 11.5, 'Tags': []}],
+            2: [{'System ID': 3, 'Product ID': 'UK43', 'Geography': 'UK', 'Price': 4.99, 'Tags': None}],
+        }
+
+    def __call__(self, method, url, headers, data):
+        if 'data_sources_info' in url:
+            return 200, {'Sales History': {'Units': 'Integer'}, 'Products': {'Product ID': 'String'}}
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        return 200, {'prices': self.pages[page], 'no_pages': len(self.pages)}
+
+
+class LookupTest(unittest.TestCase):
+    def setUp(self):
+        self.transport = FakeTransport(PriceList())
+        self.bc = BlackCurveAPI('acme', 'token', transport=self.transport)
+
+    def test_index_by(self):
+        for compact in (False, True):
+            prices = self.bc.prices().all(compact=compact).index_by('Product ID', 'geography')
+            # the first row with a value wins
+            self.assertEqual(prices['UK42'].id, 1)
+            self.assertEqual(prices['UK43'].price, 4.99)
+            self.assertEqual(prices['FR'].id, 2)
+            self.assertEqual(prices[2].id, 3)
+
+    def test_lookup(self):
+        for compact in (False, True):
+            prices = self.bc.prices().all(compact=compact)
+            self.assertEqual(prices.lookup('id', 3)['Product ID'], 'UK43')
+            self.assertEqual(prices.lookup('System ID', 2)['Geography'], 'FR')
+            self.assertEqual(prices.lookup('Geography', 'UK').id, 1)
+            self.assertIsInstance(prices.lookup('id', 1), Row if compact else DataHolder)
+            for column, value in (('id', 4), ('Tags', ['sale']), ('Tags', None)):
+                with self.assertRaises(KeyError):
+                    prices.lookup(column, value)
+
+    def test_lookups_only_request_the_rows_once(self):
+        prices = self.bc.prices().all().index_by('Product ID')
+        for sku in ('UK42', 'UK43', 'UK42'):
+            prices[sku]
+        prices.lookup('id', 2)
+        self.assertEqual(len(self.transport.requests), 2)
+
+    def test_the_index_is_rebuilt_when_more_rows_are_loaded(self):
+        prices = self.bc.prices().all().index_by('Product ID')
+        rows = iter(prices)
+        next(rows)
+        self.assertIsNone(prices._index('product_id').get('UK43'))
+        list(rows)
+        self.assertEqual(prices['UK43'].id, 3)
+
+    def test_rows_are_found_by_object_name(self):
+        info = self.bc.data_sources_info().all()
+        self.assertEqual(info['Products']['Product ID'], 'String')
+        self.assertEqual(info.lookup('_object_name', 'Sales History')['Units'], 'Integer')
+
+
+if __name__ == '__main__':
+    unittest.main()
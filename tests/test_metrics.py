@@ -0,0 +1,155 @@
+import asyncio
+import sys
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.metrics import Histogram, MetricsCollector, RequestEvent
+from blackcurve.throttle import RequestScheduler
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class SalesReport(object):
+    def __init__(self, page_sizes=(10, 10, 5), unavailable=0, error_page=None):
+        """
+        Sales History data source with a page of each size, page n holding ids from n * 100
+        :param page_sizes: Optional: rows on each page ((10, 10, 5))
+        :param unavailable: Optional: number of requests answered with a 503 before the pages are sent (0)
+        :param error_page: Optional: page answered with an API error
+        """
+        self.page_sizes = page_sizes
+        self.unavailable = unavailable
+        self.error_page = error_page
+
+    def __call__(self, method, url, headers, data):
+        if self.unavailable:
+            self.unavailable -= 1
+            return 503, {'error': 'Service unavailable'}
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        if page == self.error_page:
+            return 200, {'error': 'Page %s is unavailable' % page}
+        rows = [{'id': page * 100 + i, 'Units': i} for i in range(self.page_sizes[page - 1])]
+        return 200, {'data': rows, 'no_pages': len(self.page_sizes)}
+
+
+def event(status=200, rows=0, network=0.0, **attributes):
+    event = RequestEvent('prices/', 'GET', page=1)
+    event.status, event.rows, event.network = status, rows, network
+    for name, value in attributes.items():
+        setattr(event, name, value)
+    return event
+
+
+class HistogramTest(unittest.TestCase):
+    def test_summary(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.summary()['p50'], None)
+        for ms in range(1, 101):
+            histogram.add(ms / 1000.0)
+        summary = histogram.summary()
+        self.assertEqual((summary['count'], summary['min'], summary['max']), (100, 0.001, 0.1))
+        self.assertAlmostEqual(summary['mean'], 0.0505)
+        # bucket estimates stay within the bucket the true value falls in
+        self.assertTrue(0.032 <= summary['p50'] <= 0.064)
+        self.assertTrue(0.064 <= summary['p99'] <= 0.1)
+
+    def test_values_above_the_last_bound(self):
+        histogram = Histogram(bounds=[1, 2])
+        for value in (0.5, 5, 7):
+            histogram.add(value)
+        self.assertEqual(histogram.counts, [1, 0, 2])
+        self.assertEqual(histogram.percentile(100), 7)
+
+
+class MetricsCollectorTest(unittest.TestCase):
+    def test_counters(self):
+        collector = MetricsCollector()
+        collector(event(rows=10, network=0.02, bytes=300))
+        collector(event(rows=5, cached=True))
+        collector(event(status=503, retries=2, error=APIException('Service unavailable')))
+        collector(event(coalesced=True))
+        summary = collector.summary()
+        counters = ('requests', 'rows', 'bytes', 'retries', 'cached', 'coalesced', 'errors')
+        self.assertEqual(dict((name, summary[name]) for name in counters),
+                         dict(requests=4, rows=15, bytes=300, retries=2, cached=1, coalesced=1, errors=1))
+        self.assertEqual(summary['statuses'], {200: 3, 503: 1})
+        self.assertEqual(summary['endpoints'], {'prices/': 4})
+        self.assertEqual(summary['network']['max'], 0.02)
+        collector.reset()
+        self.assertEqual(collector.summary()['latency']['count'], 0)
+
+
+class ClientMetricsTest(unittest.TestCase):
+    def client(self, report, **kwargs):
+        self.transport = FakeTransport(report)
+        bc = BlackCurveAPI('acme', 'token', transport=self.transport, **kwargs)
+        self.events = []
+        bc.add_hook(self.events.append)
+        return bc
+
+    def test_every_page_is_reported(self):
+        for prefetch in (None, 2):
+            bc = self.client(SalesReport())
+            list(bc.data_sources('Sales History').all(prefetch=prefetch))
+            self.assertEqual([(e.endpoint, e.method, e.page, e.status, e.rows) for e in self.events],
+                             [('data_sources/Sales History', 'GET', 1, 200, 10),
+                              ('data_sources/Sales History', 'GET', 2, 200, 10),
+                              ('data_sources/Sales History', 'GET', 3, 200, 5)])
+            self.assertTrue(self.events[2].url.endswith('page=3'))
+            for e in self.events:
+                self.assertGreater(e.bytes, 0)
+                self.assertGreaterEqual(e.latency, e.network + e.build)
+
+    def test_streamed_pages_are_reported(self):
+        bc = self.client(SalesReport())
+        list(bc.data_sources('Sales History').all().iter_rows(raw=True))
+        self.assertEqual([(e.page, e.status, e.rows) for e in self.events], [(1, 200, 10), (2, 200, 10), (3, 200, 5)])
+
+    def test_retries_are_counted(self):
+        bc = self.client(SalesReport(page_sizes=(2,), unavailable=2), scheduler=RequestScheduler(backoff=0))
+        list(bc.data_sources('Sales History').all())
+        self.assertEqual([(e.status, e.retries) for e in self.events], [(200, 2)])
+        self.assertEqual(len(self.transport.requests), 3)
+
+    def test_errors_are_reported(self):
+        bc = self.client(SalesReport(error_page=2))
+        with self.assertRaises(APIException):
+            list(bc.data_sources('Sales History').all())
+        self.assertEqual([e.error is None for e in self.events], [True, False])
+        self.assertIsInstance(self.events[1].error, APIException)
+
+    def test_hooks(self):
+        bc = self.client(SalesReport(page_sizes=(2,)))
+        collector = bc.add_hook(MetricsCollector())
+        list(bc.data_sources('Sales History').all())
+        bc.remove_hook(collector)
+        bc.remove_hook(self.events.append)
+        list(bc.data_sources('Sales History').all())
+        self.assertEqual(collector.summary()['requests'], 1)
+        self.assertEqual(len(self.events), 1)
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncClientMetricsTest(unittest.TestCase):
+    def test_streamed_pages_are_reported(self):
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(SalesReport()))
+        events = []
+        bc.add_hook(events.append)
+
+        async def main():
+            return [row async for row in bc.data_sources('Sales History').all().iter_rows(raw=True)]
+        self.assertEqual(len(asyncio.run(main())), 25)
+        self.assertEqual([(e.page, e.status, e.rows) for e in events], [(1, 200, 10), (2, 200, 10), (3, 200, 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+PRICES = {'prices': [{'id': 1, 'Product ID': 'UK42', 'Price': 9.99},
+                     {'id': 2, 'Product ID': 'UK43', 'Price': 4.99}], 'no_pages': 1}
+
+
+class PriceServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        """
+        Local keep-alive server answering every GET with a page of prices, keeping the client port of every request
+        so the connections used can be counted
+        :param delay: Optional: seconds taken to answer
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', 0), PriceHandler)
+        self.delay = delay
+        self.ports = []
+
+    @property
+    def domain(self):
+        return 'http://127.0.0.1:%s/api/' % self.server_address[1]
+
+
+class PriceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.ports.append(self.client_address[1])
+        time.sleep(self.server.delay)
+        body = json.dumps(PRICES).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PoolingTest(unittest.TestCase):
+    def serve(self, delay=0):
+        server = PriceServer(delay)
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def client(self, server, **kwargs):
+        bc = BlackCurveAPI('acme', 'token', domain=server.domain, **kwargs)
+        self.addCleanup(bc.close)
+        return bc
+
+    def test_connections_are_reused(self):
+        for transport in ('requests', 'urllib3'):
+            server = self.serve()
+            bc = self.client(server, transport=transport)
+            for _ in range(5):
+                self.assertEqual(len(list(bc.prices().all())), 2)
+            self.assertEqual(len(server.ports), 5)
+            self.assertEqual(len(set(server.ports)), 1, transport)
+
+    def test_without_keep_alive_every_request_connects(self):
+        for transport in ('requests', 'urllib3'):
+            server = self.serve()
+            bc = self.client(server, transport=transport, keep_alive=False)
+            for _ in range(3):
+                list(bc.prices().all())
+            self.assertEqual(len(set(server.ports)), 3, transport)
+
+    def test_a_blocking_pool_caps_the_connections(self):
+        server = self.serve(delay=0.02)
+        bc = self.client(server, pool_maxsize=2, pool_block=True)
+        # a geography each, so the requests aren't coalesced
+        threads = [threading.Thread(target=lambda i=i: list(bc.prices(geography=str(i)).all())) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(server.ports), 6)
+        self.assertLessEqual(len(set(server.ports)), 2)
+
+    def test_close(self):
+        server = self.serve()
+        with BlackCurveAPI('acme', 'token', domain=server.domain) as bc:
+            list(bc.prices().all())
+            self.assertIs(bc.session, bc.transport)
+        # the pooled connection was closed, so the next request has to open a new one
+        list(bc.prices().all())
+        bc.close()
+        self.assertEqual(len(set(server.ports)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import sys
+import threading
+import time
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+
+class SlowPages(object):
+    def __init__(self, no_pages, delays=None, error_page=None):
+        """
+        Sales History data source of no_pages pages of 2 rows, page n holds the ids 2n - 1 & 2n
+        Keeps the pages requested & the most requests it had in flight at once
+        :param no_pages: number of pages
+        :param delays: Optional: dict of page number: seconds taken to answer it
+        :param error_page: Optional: page answered with an API error
+        """
+        self.no_pages = no_pages
+        self.delays = delays or {}
+        self.error_page = error_page
+        self.requested = []
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, headers, data):
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        with self.lock:
+            self.requested.append(page)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delays.get(page, 0.005))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        if page == self.error_page:
+            return 200, {'error': 'Page %s is unavailable' % page}
+        return 200, {'data': [{'id': page * 2 - 1}, {'id': page * 2}], 'no_pages': self.no_pages}
+
+
+class PrefetchTest(unittest.TestCase):
+    def query(self, pages):
+        return BlackCurveAPI('acme', 'token', transport=FakeTransport(pages)).data_sources('Sales History')
+
+    def test_without_prefetch_pages_are_requested_one_at_a_time(self):
+        pages = SlowPages(4)
+        self.assertEqual([row['id'] for row in self.query(pages).all()], list(range(1, 9)))
+        self.assertEqual((pages.requested, pages.peak), ([1, 2, 3, 4], 1))
+
+    def test_rows_keep_page_order(self):
+        # page 2 is answered after pages 3 & 4
+        pages = SlowPages(5, delays={2: 0.05})
+        self.assertEqual([row['id'] for row in self.query(pages).all(prefetch=3)], list(range(1, 11)))
+        self.assertEqual(pages.requested[0], 1)
+        self.assertEqual(sorted(pages.requested), [1, 2, 3, 4, 5])
+        self.assertEqual(pages.peak, 3)
+
+    def test_page_range(self):
+        pages = SlowPages(6)
+        self.assertEqual([row['id'] for row in self.query(pages).pages(2, 4, prefetch=4)], [3, 4, 5, 6, 7, 8])
+        self.assertEqual(sorted(pages.requested), [2, 3, 4])
+
+    def test_an_error_is_raised_once_the_pages_before_it_are_read(self):
+        pages = SlowPages(5, delays={2: 0.05}, error_page=3)
+        ids = []
+        with self.assertRaises(APIException):
+            for row in self.query(pages).all(prefetch=4):
+                ids.append(row['id'])
+        self.assertEqual(ids, [1, 2, 3, 4])
+
+    def test_an_error_without_prefetch(self):
+        with self.assertRaises(APIException):
+            list(self.query(SlowPages(3, error_page=1)).all())
+
+    def test_pages_are_only_requested_as_they_are_read(self):
+        pages = SlowPages(20)
+        rows = iter(self.query(pages).all(prefetch=2))
+        for _ in range(4):
+            next(rows)
+        self.assertLessEqual(len(pages.requested), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
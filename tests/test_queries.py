@@ -0,0 +1,129 @@
+import sys
+import threading
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+# 2 pages of 3 rows for each region's stock, the region is a filter of the query
+REGIONS = ['North', 'South', 'East', 'West']
+
+
+class StockLevels(object):
+    def __init__(self):
+        """
+        Stock data source filtered on region, rows are answered 3 to a page, a single row by ?id=
+        """
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, headers, data):
+        # a find() adds its ?id= ahead of the query's own params
+        query = dict((key, value[0]) for key, value in parse_qs(urlparse(url).query.replace('?', '&')).items())
+        if method == 'DELETE':
+            with self.lock:
+                self.deleted.append(query)
+            return 200, {'success': True}
+        region = query.get('region', 'North')
+        rows = [{'id': '%s-%s' % (region, i), 'Region': region, 'Stock': i} for i in range(1, 7)]
+        if 'id' in query:
+            return 200, {'data': [row for row in rows if row['id'] == query['id']], 'no_pages': 1}
+        page = int(query.get('page', 1))
+        return 200, {'data': rows[(page - 1) * 3:page * 3], 'no_pages': 2}
+
+
+class QueryStateTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = StockLevels()
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.handler))
+
+    def test_endpoint_calls_leave_the_client_alone(self):
+        north = self.bc.data_sources('Stock', region='North')
+        south = self.bc.data_sources('Stock', region='South')
+        self.assertEqual([row['Region'] for row in north.all()], ['North'] * 6)
+        self.assertEqual([row['Region'] for row in south.pages(2, 2)], ['South'] * 3)
+        self.assertIsNone(self.bc.endpoint)
+        self.assertEqual(dict(self.bc.params), {})
+
+    def test_params_are_read_only(self):
+        columns = ['Stock']
+        query = self.bc.data_sources('Stock', columns=columns, region='East')
+        columns.append('Region')
+        self.assertEqual(query.params['columns'], ('Stock',))
+        with self.assertRaises(TypeError):
+            query.params['region'] = 'West'
+        list(query.all())
+        self.assertIn('columns=Stock&', self.bc.transport.requests[0].url)
+
+    def test_data_functions_leave_the_query_alone(self):
+        query = self.bc.data_sources('Stock')
+        attributes = query.data_attributes
+        row = query.find('North-2')
+        self.assertEqual(row['Stock'], 2)
+        list(query.pages(2, 2))
+        self.assertIs(query.data_attributes, attributes)
+        self.assertEqual([row['Stock'] for row in query.all()], [1, 2, 3, 4, 5, 6])
+
+    def test_delete_sends_the_id_of_the_row_only(self):
+        self.bc.data_sources('Stock').find('North-3').delete()
+        self.assertEqual(self.handler.deleted, [{'id': 'North-3'}])
+        self.assertEqual(len(list(self.bc.data_sources('Stock').all())), 6)
+
+
+class ConcurrentQueriesTest(unittest.TestCase):
+    def setUp(self):
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(StockLevels()))
+        self.errors = []
+
+    def run_threads(self, target, count=8):
+        barrier = threading.Barrier(count) if hasattr(threading, 'Barrier') else None
+
+        def run(i):
+            try:
+                if barrier is not None:
+                    barrier.wait()
+                target(i)
+            except Exception as e:
+                self.errors.append(e)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.errors, [])
+
+    def test_threads_sharing_a_client(self):
+        results = dict()
+
+        def read(i):
+            region = REGIONS[i % len(REGIONS)]
+            for _ in range(5):
+                rows = list(self.bc.data_sources('Stock', region=region).all())
+                assert [row['Region'] for row in rows] == [region] * 6, rows
+            results[i] = len(rows)
+        self.run_threads(read)
+        self.assertEqual(sorted(results.values()), [6] * 8)
+
+    def test_threads_sharing_a_query(self):
+        query = self.bc.data_sources('Stock', region='West')
+        attributes, params = query.data_attributes, query.params
+
+        def read(i):
+            for _ in range(5):
+                if i % 2:
+                    assert query.find('West-%s' % (i % 6 + 1))['Stock'] == i % 6 + 1
+                else:
+                    assert [row['Stock'] for row in query.pages(2, 2)] == [4, 5, 6]
+                assert len(list(query.all())) == 6
+        self.run_threads(read)
+        self.assertIs(query.data_attributes, attributes)
+        self.assertIs(query.params, params)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.replica import LocalReplica
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+
+class SalesHistory(object):
+    def __init__(self, rows, page_size=3):
+        """
+        Sales History data source split into pages of page_size rows, keeping the pages requested
+        :param rows: list of rows
+        :param page_size: Optional: rows per page (3)
+        """
+        self.rows = rows
+        self.page_size = page_size
+        self.failing_page = None
+        self.requested = []
+
+    def __call__(self, method, url, headers, data):
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        self.requested.append(page)
+        if page == self.failing_page:
+            return 200, {'error': 'Gateway timeout'}
+        no_pages = (len(self.rows) + self.page_size - 1) // self.page_size
+        return 200, {'data': self.rows[(page - 1) * self.page_size:page * self.page_size], 'no_pages': no_pages}
+
+
+class PriceFeed(object):
+    def __init__(self, prices, page_size=2):
+        """
+        Prices endpoint sending only the prices changed since the last request, unless changes_only=False is asked
+        for, keeping whether each request asked for every price
+        :param prices: dict of (product id, geography): price
+        :param page_size: Optional: prices per page (2)
+        """
+        self.prices = dict(prices)
+        self.changed = set()
+        self.sending = []
+        self.page_size = page_size
+        self.full_requests = []
+
+    def set(self, product_id, geography, price):
+        self.prices[(product_id, geography)] = price
+        self.changed.add((product_id, geography))
+
+    def __call__(self, method, url, headers, data):
+        query = parse_qs(urlparse(url).query)
+        page = int(query.get('page', ['1'])[0])
+        every = query.get('changes_only') == ['False']
+        if page == 1:
+            self.full_requests.append(every)
+            self.sending = sorted(key for key in self.prices if every or key in self.changed)
+            self.changed = set()
+        keys = [key for key in self.sending if key[1] in query.get('geography', [key[1]])]
+        no_pages = max(1, (len(keys) + self.page_size - 1) // self.page_size)
+        prices = [{'Product ID': product_id, 'Geography': geography, 'Price': self.prices[(product_id, geography)]}
+                  for product_id, geography in keys[(page - 1) * self.page_size:page * self.page_size]]
+        return 200, {'prices': prices, 'no_pages': no_pages}
+
+
+def sales_rows(count, name='n'):
+    # the odd prices are sent as strings
+    return [{'id': i, 'Price': str(i * 50.5) if i % 2 else i * 50.5, 'Name': '%s%s' % (name, i)}
+            for i in range(1, count + 1)]
+
+
+class LocalReplicaTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sales = SalesHistory(sales_rows(8))
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.sales))
+        self.replica = LocalReplica(os.path.join(self.directory, 'replica.db'))
+        self.addCleanup(self.replica.close)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sync(self, **kwargs):
+        return self.replica.sync(self.bc.data_sources('Sales History'), **kwargs)
+
+    def ids(self, **filters):
+        return [row['id'] for row in self.replica.data_sources('Sales History', **filters).all()]
+
+    def test_sync_every_page(self):
+        self.assertEqual(self.sync(), 3)
+        self.assertEqual(self.ids(), list(range(1, 9)))
+        self.assertEqual(len(self.replica.data_sources('Sales History')), 8)
+        self.assertIsNotNone(self.replica.synced_at('Sales History'))
+
+    def test_filters(self):
+        self.sync()
+        self.assertEqual(self.ids(name='n3'), [3])
+        self.assertEqual(self.ids(name=['n3', 'n5']), [3, 5])
+        self.assertEqual(self.ids(id_ne=1, price_lt=200), [2, 3])
+        with self.assertRaises(APIException):
+            self.ids(cost=1)
+
+    def test_numbers_stored_as_strings_compare_numerically(self):
+        self.sync()
+        self.assertEqual(self.ids(price_gte=100), list(range(2, 9)))
+        self.assertEqual(self.ids(price_lt=100), [1])
+
+    def test_find_and_columns(self):
+        self.sync()
+        local = self.replica.data_sources('Sales History', columns=['Name'])
+        self.assertEqual(local.find(4), {'Name': 'n4'})
+        with self.assertRaises(APIException):
+            local.find(9)
+
+    def test_unsynced_sources_cant_be_read(self):
+        with self.assertRaises(APIException):
+            self.replica.data_sources('Sales History')
+        self.assertIsNone(self.replica.synced_at('Sales History'))
+
+    def test_an_interrupted_sync_resumes_at_the_failed_page(self):
+        self.sales.failing_page = 2
+        with self.assertRaises(APIException):
+            self.sync()
+        self.sales.failing_page = None
+        self.assertEqual(self.sync(), 2)
+        self.assertEqual(self.sales.requested, [1, 2, 2, 3])
+        self.assertEqual(self.ids(), list(range(1, 9)))
+
+    def test_reads_see_the_last_complete_copy_during_a_sync(self):
+        self.sync()
+        self.sales.rows = sales_rows(5, name='m')
+        self.sales.failing_page = 2
+        with self.assertRaises(APIException):
+            self.sync()
+        self.assertEqual(self.ids(), list(range(1, 9)))
+        # full=True starts again from the first page
+        self.sales.failing_page = None
+        self.assertEqual(self.sync(full=True), 2)
+        self.assertEqual([row['Name'] for row in self.replica.data_sources('Sales History').all()],
+                         ['m1', 'm2', 'm3', 'm4', 'm5'])
+
+    def test_only_data_sources_can_be_synced(self):
+        with self.assertRaises(APIException):
+            self.replica.sync(self.bc.prices())
+
+
+class PriceSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.feed = PriceFeed({('UK42', 'UK'): 9.99, ('UK43', 'UK'): 4.99, ('UK42', 'FR'): 11.5})
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.feed))
+        self.replica = LocalReplica(':memory:')
+        self.addCleanup(self.replica.close)
+
+    def sync(self, **kwargs):
+        return self.replica.sync_prices(self.bc.prices(), **kwargs)
+
+    @staticmethod
+    def prices(rows):
+        # prices changed by the same sync share a version, so come back in any order
+        return sorted((row['Product ID'], row['Geography'], row['Price']) for row in rows)
+
+    def test_the_first_sync_fetches_every_price(self):
+        self.assertEqual(self.sync(), 1)
+        self.assertEqual(self.feed.full_requests, [True])
+        self.assertEqual(self.prices(self.replica.changed_prices()),
+                         [('UK42', 'FR', 11.5), ('UK42', 'UK', 9.99), ('UK43', 'UK', 4.99)])
+
+    def test_later_syncs_apply_the_changes(self):
+        watermark = self.sync()
+        self.feed.set('UK43', 'UK', 5.49)
+        self.feed.set('UK44', 'UK', 1.0)
+        self.assertEqual(self.sync(), watermark + 1)
+        self.assertEqual(self.feed.full_requests, [True, False])
+        self.assertEqual(self.prices(self.replica.changed_prices(watermark)),
+                         [('UK43', 'UK', 5.49), ('UK44', 'UK', 1.0)])
+        self.assertEqual(len(list(self.replica.changed_prices())), 4)
+
+    def test_unchanged_prices_keep_their_version(self):
+        watermark = self.sync()
+        self.feed.set('UK42', 'UK', 9.99)
+        self.sync(full=True)
+        self.assertEqual(self.feed.full_requests, [True, True])
+        self.assertEqual(list(self.replica.changed_prices(watermark)), [])
+
+    def test_small_batches(self):
+        self.sync(batch_size=1)
+        self.assertEqual(len(list(self.replica.changed_prices())), 3)
+
+    def test_each_filter_is_its_own_feed(self):
+        self.replica.sync_prices(self.bc.prices(geography='FR'))
+        self.assertEqual(self.prices(self.replica.changed_prices(geography='FR')), [('UK42', 'FR', 11.5)])
+        with self.assertRaises(APIException):
+            self.replica.changed_prices()
+
+    def test_only_prices_can_be_synced(self):
+        with self.assertRaises(APIException):
+            self.replica.sync_prices(self.bc.data_sources('Sales History'))
+
+
+if __name__ == '__main__':
+    unittest.main()
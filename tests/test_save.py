@@ -0,0 +1,153 @@
+import asyncio
+import json
+import unittest
+
+from blackcurve.api import APIException, BatchSaveException, BlackCurveAPI
+from blackcurve.transport import FakeTransport
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class SalesLedger(object):
+    def __init__(self):
+        """
+        Sales History data source keeping the body of every POST, a row with the Product ID 'bad' is refused
+        """
+        self.rows = [{'id': i, 'Product ID': 'P%s' % i, 'Price': 1.0, 'Units': i} for i in range(1, 6)]
+        self.posted = []
+
+    def __call__(self, method, url, headers, data):
+        if method == 'GET':
+            return 200, {'data': self.rows, 'no_pages': 1}
+        body = json.loads(data)
+        self.posted.append(body)
+        if any(row.get('Product ID') == 'bad' for row in (body if isinstance(body, list) else [body])):
+            return 400, {'error': 'Bad Product ID'}
+        return 200, {'success': True}
+
+
+class DirtyTrackingTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = SalesLedger()
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.ledger))
+        self.sale = list(self.bc.data_sources('Sales History').all())[0]
+
+    def test_only_the_changed_columns_are_sent(self):
+        self.sale['Price'] = 12.5
+        self.sale.units = 1
+        self.sale.save()
+        self.assertEqual(self.ledger.posted, [{'id': 1, 'Price': 12.5}])
+
+    def test_a_saved_change_isnt_sent_again(self):
+        self.sale.price = 12.5
+        self.sale.save()
+        self.sale.save()
+        self.assertEqual(len(self.ledger.posted), 1)
+
+    def test_a_failed_save_is_kept(self):
+        self.sale['Product ID'] = 'bad'
+        with self.assertRaises(APIException):
+            self.sale.save()
+        self.sale['Product ID'] = 'P1b'
+        self.sale.save()
+        self.assertEqual(self.ledger.posted[-1], {'id': 1, 'Product ID': 'P1b'})
+
+
+class SaveBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = SalesLedger()
+        self.bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(self.ledger))
+        self.sales = list(self.bc.data_sources('Sales History').all())
+
+    def reprice(self, sales):
+        for sale in sales:
+            sale['Price'] = sale['Units'] * 2.0
+            sale.save()
+
+    def test_saves_are_sent_in_chunks_when_the_block_exits(self):
+        with self.bc.batch(chunk_size=2):
+            self.reprice(self.sales)
+            self.assertEqual(self.ledger.posted, [])
+        self.assertEqual(self.ledger.posted, [[{'id': 1, 'Price': 2.0}, {'id': 2, 'Price': 4.0}],
+                                              [{'id': 3, 'Price': 6.0}, {'id': 4, 'Price': 8.0}],
+                                              [{'id': 5, 'Price': 10.0}]])
+
+    def test_nested_blocks_are_sent_with_the_outermost(self):
+        with self.bc.batch():
+            with self.bc.batch():
+                self.reprice(self.sales[:2])
+            self.assertEqual(self.ledger.posted, [])
+            self.reprice(self.sales[2:])
+        self.assertEqual([len(body) for body in self.ledger.posted], [5])
+        self.sales[0]['Price'] = 1.0
+        self.sales[0].save()
+        self.assertEqual(self.ledger.posted[-1], {'id': 1, 'Price': 1.0})
+
+    def test_failed_chunks_are_raised_together(self):
+        self.sales[2]['Product ID'] = 'bad'
+        with self.assertRaises(BatchSaveException) as raised:
+            with self.bc.batch(chunk_size=2):
+                self.reprice(self.sales)
+        self.assertEqual([chunk for chunk, _, _ in raised.exception.failed], [1])
+        self.assertEqual(len(self.ledger.posted), 3)
+        # the rows of the failed chunk still have their changes to send
+        self.sales[2]['Product ID'] = 'P3b'
+        with self.bc.batch():
+            for sale in self.sales:
+                sale.save()
+        self.assertEqual(self.ledger.posted[-1], [{'id': 3, 'Product ID': 'P3b', 'Price': 6.0},
+                                                  {'id': 4, 'Price': 8.0}])
+
+    def test_nothing_is_sent_when_the_block_raises(self):
+        with self.assertRaises(ValueError):
+            with self.bc.batch():
+                self.reprice(self.sales)
+                raise ValueError
+        self.assertEqual(self.ledger.posted, [])
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncSaveBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = SalesLedger()
+        self.bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(self.ledger))
+
+    async def reprice(self):
+        async for sale in self.bc.data_sources('Sales History').all():
+            sale['Price'] = sale['Units'] * 2.0
+            await sale.save()
+
+    def test_saves_are_sent_in_chunks_when_the_block_exits(self):
+        async def main():
+            async with self.bc.batch(chunk_size=2):
+                async with self.bc.batch():
+                    await self.reprice()
+                self.assertEqual(self.ledger.posted, [])
+        asyncio.run(main())
+        self.assertEqual([len(body) for body in self.ledger.posted], [2, 2, 1])
+
+    def test_other_tasks_save_straight_away(self):
+        async def main():
+            opened = asyncio.Event()
+
+            async def other_task():
+                await opened.wait()
+                await self.reprice()
+            task = asyncio.ensure_future(other_task())
+            async with self.bc.batch():
+                opened.set()
+                await task
+                self.assertEqual(len(self.ledger.posted), 5)
+        asyncio.run(main())
+
+    def test_needs_async_with(self):
+        with self.assertRaises(TypeError):
+            with self.bc.batch():
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
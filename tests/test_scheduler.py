@@ -0,0 +1,219 @@
+import asyncio
+import email.utils
+import threading
+import time
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI
+from blackcurve.throttle import RequestScheduler
+from blackcurve.transport import FakeResponse, FakeTransport
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+
+class Outage(object):
+    def __init__(self, failures, status_code=503, retry_after=None):
+        """
+        Prices endpoint answering the first failures requests with an error, or dropping the connection when
+        status_code is None, then with a page of prices
+        """
+        self.failures = failures
+        self.status_code = status_code
+        self.headers = {} if retry_after is None else {'Retry-After': retry_after}
+        self.calls = 0
+
+    def __call__(self, method, url, headers, data):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.status_code is None:
+                raise IOError('connection reset')
+            return self.status_code, {'error': 'Service unavailable'}, self.headers
+        if method == 'POST':
+            return 200, {'success': True}
+        return 200, {'prices': [{'id': 1, 'Product ID': 'UK42', 'Price': 9.99},
+                                {'id': 2, 'Product ID': 'UK43', 'Price': 4.99}], 'no_pages': 1}
+
+
+class RetryRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RequestScheduler(max_retries=2, backoff=1, max_backoff=30)
+
+    def test_what_is_retried(self):
+        unavailable, server_error, throttled = FakeResponse(503, ''), FakeResponse(500, ''), FakeResponse(429, '')
+        self.assertTrue(self.scheduler.should_retry('GET', 0, server_error))
+        self.assertFalse(self.scheduler.should_retry('POST', 0, unavailable))
+        self.assertTrue(self.scheduler.should_retry('POST', 0, throttled))
+        self.assertTrue(self.scheduler.should_retry('DELETE', 0, error=IOError()))
+        self.assertFalse(self.scheduler.should_retry('POST', 0, error=IOError()))
+        self.assertFalse(self.scheduler.should_retry('GET', 2, unavailable))
+
+    def test_retry_after(self):
+        self.assertEqual(self.scheduler.delay(0, '3'), 3)
+        self.assertEqual(self.scheduler.delay(0, '600'), 30)
+        self.assertAlmostEqual(self.scheduler.delay(0, email.utils.formatdate(time.time() + 10, usegmt=True)), 10,
+                               delta=1.5)
+
+    def test_backoff_is_jittered_and_capped(self):
+        delays = [self.scheduler.delay(attempt) for attempt in range(8) for _ in range(20)]
+        self.assertTrue(all(0 <= delay <= 30 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_delay_closes_the_response_given_up_on(self):
+        closed = []
+        response = FakeResponse(503, '', {'Retry-After': '2'})
+        response.close = lambda: closed.append(True)
+        self.assertEqual(self.scheduler.retry_delay('GET', 0, response), 2)
+        self.assertEqual(closed, [True])
+        self.assertIsNone(self.scheduler.retry_delay('POST', 0, response))
+
+
+class ConcurrencyTest(unittest.TestCase):
+    def test_limit_is_halved_when_overloaded_and_grows_back(self):
+        scheduler = RequestScheduler(initial_concurrency=8)
+        scheduler.acquire()
+        scheduler.release(overloaded=True)
+        self.assertEqual(scheduler.concurrency, 4)
+        for _ in range(5):
+            scheduler.acquire()
+            scheduler.release()
+        self.assertEqual(scheduler.concurrency, 5)
+
+    def test_requests_in_flight_are_capped(self):
+        scheduler = RequestScheduler(initial_concurrency=2, max_concurrency=2)
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def send():
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.pop()
+            return FakeResponse(200, '')
+        threads = [threading.Thread(target=scheduler.call, args=(send, 'GET')) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_rate_limit(self):
+        scheduler = RequestScheduler(rate=50, burst=1)
+        started = time.time()
+        for _ in range(5):
+            scheduler.call(lambda: FakeResponse(200, ''), 'GET')
+        self.assertGreaterEqual(time.time() - started, 0.07)
+
+
+class AsyncAcquireTest(unittest.TestCase):
+    def test_waits_for_a_slot_to_be_released(self):
+        scheduler = RequestScheduler(initial_concurrency=1, max_concurrency=1)
+
+        async def main():
+            await scheduler.acquire_async()
+            waiting = scheduler.acquire_async()
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            scheduler.release()
+            await asyncio.wait_for(waiting, 1)
+            self.assertEqual(scheduler.in_flight, 1)
+        asyncio.run(main())
+
+    def test_sleeps_until_the_next_token(self):
+        scheduler = RequestScheduler(rate=20, burst=1)
+
+        async def main():
+            await scheduler.acquire_async()
+            scheduler.release()
+            started = time.time()
+            await scheduler.acquire_async()
+            return time.time() - started
+        self.assertGreaterEqual(asyncio.run(main()), 0.04)
+
+    def test_a_cancelled_wait_takes_no_slot(self):
+        scheduler = RequestScheduler(initial_concurrency=1, max_concurrency=1)
+
+        async def main():
+            await scheduler.acquire_async()
+            waiting = scheduler.acquire_async()
+            waiting.cancel()
+            scheduler.release()
+            await asyncio.sleep(0)
+        asyncio.run(main())
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class ClientRetryTest(unittest.TestCase):
+    def build(self, handler, **scheduler_kwargs):
+        scheduler_kwargs.setdefault('backoff', 0)
+        transport = FakeTransport(handler)
+        transport.errors = (IOError,)
+        return BlackCurveAPI('acme', 'token', transport=transport, scheduler=RequestScheduler(**scheduler_kwargs))
+
+    def test_overloaded_responses_are_retried(self):
+        outage = Outage(2, retry_after='0')
+        self.assertEqual(len(list(self.build(outage).prices().all())), 2)
+        self.assertEqual(outage.calls, 3)
+
+    def test_dropped_connections_are_retried(self):
+        outage = Outage(1, None)
+        self.assertEqual(len(list(self.build(outage).prices().all())), 2)
+
+    def test_streamed_pages_are_retried(self):
+        outage = Outage(1)
+        self.assertEqual(len(list(self.build(outage).prices().all().iter_rows(raw=True))), 2)
+
+    def test_gives_up_after_max_retries(self):
+        outage = Outage(10, 500)
+        with self.assertRaises(APIException):
+            list(self.build(outage, max_retries=2).prices().all())
+        self.assertEqual(outage.calls, 3)
+
+    def test_a_create_isnt_sent_twice_after_a_server_error(self):
+        outage = Outage(1, 500)
+        with self.assertRaises(APIException):
+            self.build(outage).data_sources('Sales History').create({'Product ID': 'UK42'})
+        self.assertEqual(outage.calls, 1)
+
+    def test_without_a_scheduler_nothing_is_retried(self):
+        bc = BlackCurveAPI('acme', 'token', transport=FakeTransport(Outage(1)), scheduler=False)
+        with self.assertRaises(APIException):
+            list(bc.prices().all())
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncClientRetryTest(unittest.TestCase):
+    def build(self, handler, **scheduler_kwargs):
+        return AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(handler),
+                                  scheduler=RequestScheduler(backoff=0, **scheduler_kwargs))
+
+    @staticmethod
+    async def collect(rows):
+        return [row async for row in rows]
+
+    def test_overloaded_responses_are_retried(self):
+        outage = Outage(2, retry_after='0')
+        self.assertEqual(len(asyncio.run(self.collect(self.build(outage).prices().all()))), 2)
+        self.assertEqual(outage.calls, 3)
+
+    def test_streamed_errors_raise_api_exception(self):
+        with self.assertRaises(APIException):
+            asyncio.run(self.collect(self.build(Outage(10), max_retries=1).prices().all().iter_rows()))
+
+    def test_gathered_requests_share_the_concurrency_limit(self):
+        bc = self.build(Outage(0), initial_concurrency=2, max_concurrency=2)
+
+        async def main():
+            return await asyncio.gather(*[self.collect(bc.prices(geography=str(i)).all()) for i in range(6)])
+        self.assertEqual(len(asyncio.run(main())), 6)
+        self.assertEqual(bc.scheduler.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
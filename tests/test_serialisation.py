@@ -0,0 +1,59 @@
+import datetime
+import decimal
+import json
+import unittest
+
+from blackcurve import serialisation
+from blackcurve.api import DataHolder
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SerialisationTest(unittest.TestCase):
+    def test_dates_decimals(self):
+        data = {'Date': datetime.date(2020, 1, 2), 'Updated': datetime.datetime(2020, 1, 2, 3, 4, 5, 600),
+                'Price': decimal.Decimal('1.25')}
+        self.assertEqual(json.loads(serialisation.dumps(data)),
+                         {'Date': '2020-01-02', 'Updated': '2020-01-02 03:04:05', 'Price': '1.25'})
+
+    def test_decimals_keep_every_digit(self):
+        price = decimal.Decimal('12345678901234567.000000000000000001')
+        self.assertEqual(decimal.Decimal(json.loads(serialisation.dumps({'Price': price}))['Price']), price)
+
+    def test_build_json_recursion_returns_the_encoded_data(self):
+        data = [{'Date': datetime.date(2020, 1, 2), 'Prices': (decimal.Decimal('0.1'), 2), 'Name': None}]
+        self.assertEqual(DataHolder.build_json(data, recursion=True),
+                         [{'Date': '2020-01-02', 'Prices': ['0.1', 2], 'Name': None}])
+
+    def test_every_engine_agrees(self):
+        data = [{'Date': datetime.date(2020, 1, 2), 'Price': decimal.Decimal('1.5'), 'Name': u'caf\xe9'}]
+        for name in serialisation.available_engines():
+            engine = serialisation.get_engine(name)
+            self.assertEqual(json.loads(engine.dumps(data)),
+                             [{'Date': '2020-01-02', 'Price': '1.5', 'Name': u'caf\xe9'}])
+
+    def test_unknown_type(self):
+        with self.assertRaises(TypeError):
+            serialisation.dumps({'value': object()})
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_numpy(self):
+        data = {'Stock': numpy.int64(3), 'Price': numpy.float32(1.5), 'Sizes': numpy.array([1, 2])}
+        self.assertEqual(json.loads(serialisation.dumps(data)), {'Stock': 3, 'Price': 1.5, 'Sizes': [1, 2]})
+        self.assertEqual(serialisation.encode(data), {'Stock': 3, 'Price': 1.5, 'Sizes': [1, 2]})
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_numpy_datetimes(self):
+        data = {'Updated': numpy.datetime64('2020-01-02T03:04:05.123456789', 'ns'),
+                'Date': numpy.datetime64('2020-01-02', 'D'),
+                'Dates': numpy.array(['2020-01-02', '2020-01-03'], dtype='datetime64[ns]')}
+        self.assertEqual(json.loads(serialisation.dumps(data)),
+                         {'Updated': '2020-01-02 03:04:05', 'Date': '2020-01-02',
+                          'Dates': ['2020-01-02 00:00:00', '2020-01-03 00:00:00']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import sys
+import unittest
+
+from blackcurve.api import APIException, BlackCurveAPI, DataHolder, Row
+from blackcurve.streaming import JSONArrayStream
+from blackcurve.transport import FakeTransport
+
+if sys.version_info >= (3, 0):
+    from urllib.parse import parse_qs, urlparse
+else:
+    from urlparse import parse_qs, urlparse
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI, AsyncFakeTransport
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+# values that look like JSON syntax, escapes & multi-byte characters, split up by small chunks
+NOTES = ['plain', 'has "quotes" & a \\ backslash', 'brackets ] } [ {', 'commas, colons: ', u'caf\xe9 \u2603', '']
+
+
+def product_rows(page):
+    return [{'id': page * 10 + i, 'Note': note, 'Price': 1.5 * i} for i, note in enumerate(NOTES)]
+
+
+class ProductNotes(object):
+    def __init__(self, no_pages=3, error_page=None):
+        """
+        Products data source of no_pages pages, with the no_pages member sent after the rows
+        :param no_pages: Optional: number of pages (3)
+        :param error_page: Optional: page answered with an API error
+        """
+        self.no_pages = no_pages
+        self.error_page = error_page
+
+    def __call__(self, method, url, headers, data):
+        page = int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+        if page == self.error_page:
+            return 200, {'error': 'Export limit reached'}
+        return 200, '{"data": %s, "no_pages": %s}' % (json.dumps(product_rows(page)), self.no_pages)
+
+
+def feed(stream, body, chunk_size):
+    body = body.encode('utf-8')
+    rows = []
+    for i in range(0, len(body), chunk_size):
+        rows.extend(stream.feed(body[i:i + chunk_size]))
+    return rows + stream.close()
+
+
+class JSONArrayStreamTest(unittest.TestCase):
+    def test_rows_split_across_chunks(self):
+        body = json.dumps({'no_pages': 4, 'data': product_rows(1), 'page': 1})
+        for chunk_size in (1, 3, 7, len(body)):
+            stream = JSONArrayStream('data')
+            self.assertEqual(feed(stream, body, chunk_size), product_rows(1))
+            self.assertEqual(stream.meta, {'no_pages': 4, 'page': 1})
+
+    def test_rows_are_returned_as_soon_as_they_are_complete(self):
+        stream = JSONArrayStream('data')
+        self.assertEqual(stream.feed(b'{"data": [{"id": 1}, {"id": 2'), [{'id': 1}])
+        self.assertEqual(stream.feed(b'}, {"id": 3'), [{'id': 2}])
+        # a number at the end of a chunk may still have digits to come
+        self.assertEqual(stream.feed(b'4}], "no_pages": 1'), [{'id': 34}])
+        self.assertEqual(stream.meta, {})
+        self.assertEqual(stream.feed(b'}') + stream.close(), [])
+        self.assertEqual(stream.meta, {'no_pages': 1})
+
+    def test_members_without_an_array_name(self):
+        body = json.dumps({'Products': {'Note': 'String'}, 'Sales': {'Units': 'Integer'}, 'no_pages': 1})
+        self.assertEqual(feed(JSONArrayStream(), body, 5),
+                         [('Products', {'Note': 'String'}), ('Sales', {'Units': 'Integer'})])
+
+    def test_a_top_level_list(self):
+        self.assertEqual(feed(JSONArrayStream('data'), '[{"id": 1}, {"id": 2}]', 4), [{'id': 1}, {'id': 2}])
+
+    def test_errors(self):
+        stream = JSONArrayStream('data')
+        self.assertEqual(feed(stream, '{"error": "Token expired"}', 4), [])
+        self.assertEqual(stream.meta, {'error': 'Token expired'})
+        with self.assertRaises(ValueError):
+            feed(JSONArrayStream('data'), '{"data": [{"id": 1}', 4)
+        with self.assertRaises(ValueError):
+            feed(JSONArrayStream('data'), '{"data": [{"id": 1} {"id": 2}]}', 4)
+
+
+class IterRowsTest(unittest.TestCase):
+    def query(self, handler):
+        self.transport = FakeTransport(handler)
+        return BlackCurveAPI('acme', 'token', transport=self.transport).data_sources('Products').all()
+
+    def test_every_page_is_streamed(self):
+        query = self.query(ProductNotes())
+        rows = list(query.iter_rows(raw=True, chunk_size=16))
+        self.assertEqual(rows, product_rows(1) + product_rows(2) + product_rows(3))
+        self.assertEqual(len(self.transport.requests), 3)
+        # the rows aren't kept on the query
+        self.assertEqual(query._pages_queryset, [])
+
+    def test_row_types(self):
+        holders = list(self.query(ProductNotes(1)).iter_rows())
+        self.assertIsInstance(holders[1], DataHolder)
+        self.assertEqual(holders[1].note, NOTES[1])
+        rows = list(self.query(ProductNotes(1)).iter_rows(compact=True))
+        self.assertIsInstance(rows[4], Row)
+        self.assertEqual(rows[4]['Note'], NOTES[4])
+
+    def test_an_error_page_stops_the_rows(self):
+        rows = []
+        with self.assertRaises(APIException):
+            for row in self.query(ProductNotes(error_page=2)).iter_rows(raw=True):
+                rows.append(row)
+        self.assertEqual(rows, product_rows(1))
+
+    def test_page_range(self):
+        query = BlackCurveAPI('acme', 'token', transport=FakeTransport(ProductNotes())).data_sources('Products')
+        self.assertEqual(list(query.pages(2, 3).iter_rows(raw=True)), product_rows(2) + product_rows(3))
+
+
+@unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+class AsyncIterRowsTest(unittest.TestCase):
+    def test_every_page_is_streamed(self):
+        bc = AsyncBlackCurveAPI('acme', 'token', transport=AsyncFakeTransport(ProductNotes()))
+
+        async def main():
+            return [row async for row in bc.data_sources('Products').all().iter_rows(raw=True, chunk_size=16)]
+        self.assertEqual(asyncio.run(main()), product_rows(1) + product_rows(2) + product_rows(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
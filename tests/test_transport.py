@@ -0,0 +1,175 @@
+import json
+import threading
+import unittest
+
+from blackcurve.api import BlackCurveAPI
+from blackcurve.transport import (FakeResponse, FakeTransport, HTTP2Transport, RequestsTransport, Urllib3Transport,
+                                  build_transport)
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from blackcurve.aio import AsyncBlackCurveAPI
+except ImportError:
+    AsyncBlackCurveAPI = None
+
+# 2 pages of stock levels, the body is written in small chunks so streamed reads see it arrive in pieces
+STOCK = {1: [{'id': i, 'Product ID': 'UK%s' % i, 'Stock': i * 3} for i in range(1, 6)],
+         2: [{'id': i, 'Product ID': 'UK%s' % i, 'Stock': i * 3} for i in range(6, 9)]}
+
+
+class StockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        """
+        Local keep-alive server with a Stock Levels data source, POSTs are answered with the body they sent
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StockHandler)
+
+    @property
+    def domain(self):
+        return 'http://127.0.0.1:%s/api/' % self.server_address[1]
+
+
+class StockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        page = int(self.path.split('page=')[1]) if 'page=' in self.path else 1
+        self.answer(200, {'data': STOCK[page], 'no_pages': len(STOCK)})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.answer(201, {'received': json.loads(body.decode('utf-8')), 'agent': self.headers.get('X-Client')})
+
+    def answer(self, status, body):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Page-Bytes', str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), 64):
+            self.wfile.write(body[i:i + 64])
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeTransportTest(unittest.TestCase):
+    def test_routes_win_over_the_handler(self):
+        transport = FakeTransport(lambda method, url, headers, data: (200, {'from': 'handler'}))
+        transport.add('GET', 'currencies/', {'from': 'route'})
+        transport.add('GET', 'currencies/', {'from': 'newer route'})
+        transport.add(None, 'token/', {'token': 'abc'}, headers={'Cache-Control': 'no-store'})
+        self.assertEqual(json.loads(transport.request('GET', 'https://x/api/currencies/').text),
+                         {'from': 'newer route'})
+        self.assertEqual(json.loads(transport.request('POST', 'https://x/api/currencies/').text), {'from': 'handler'})
+        response = transport.request('POST', 'https://x/api/token/')
+        self.assertEqual(response.headers['cache-control'], 'no-store')
+
+    def test_unanswered_requests_are_404s(self):
+        response = FakeTransport().request('GET', 'https://x/api/geographies/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('geographies', json.loads(response.text)['error'])
+
+    def test_requests_are_kept(self):
+        transport = FakeTransport()
+        transport.request('POST', 'https://x/api/prices/', headers={'Authorization': 'Bearer abc'}, data='{}')
+        self.assertEqual(transport.requests[0],
+                         ('POST', 'https://x/api/prices/', {'Authorization': 'Bearer abc'}, '{}'))
+
+    def test_responses(self):
+        self.assertEqual(FakeResponse(200, {'a': 1}).text, '{"a": 1}')
+        self.assertEqual(FakeResponse(200, u'caf\xe9').content, b'caf\xc3\xa9')
+        self.assertEqual(list(FakeResponse(200, b'abcde').iter_content(2)), [b'ab', b'cd', b'e'])
+
+
+class BuildTransportTest(unittest.TestCase):
+    def test_names(self):
+        for name, transport_class in (('requests', RequestsTransport), ('urllib3', Urllib3Transport)):
+            transport = build_transport(name, pool_maxsize=2)
+            self.assertIsInstance(transport, transport_class)
+            transport.close()
+
+    def test_unknown_names_are_refused(self):
+        with self.assertRaises(ValueError):
+            build_transport('pycurl')
+        with self.assertRaises(ValueError):
+            BlackCurveAPI('acme', 'token', transport='pycurl')
+
+    @unittest.skipIf(AsyncBlackCurveAPI is None, 'requires aiohttp')
+    def test_the_async_client_only_takes_awaitable_transports(self):
+        with self.assertRaises(ValueError):
+            AsyncBlackCurveAPI('acme', 'token', transport='urllib3')
+
+
+class HTTPTransportTest(unittest.TestCase):
+    transports = ['requests', 'urllib3']
+
+    def setUp(self):
+        server = StockServer()
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+
+    def transport(self, name):
+        transport = build_transport(name)
+        self.addCleanup(transport.close)
+        return transport
+
+    def test_requests(self):
+        for name in self.transports:
+            transport = self.transport(name)
+            response = transport.request('POST', self.server.domain + 'data_sources/Stock Levels',
+                                         headers={'X-Client': 'tests', 'Content-Type': 'application/json'},
+                                         data=json.dumps([{'id': 1, 'Stock': 4}]), timeout=5)
+            self.assertEqual(response.status_code, 201, name)
+            self.assertEqual(json.loads(response.text), {'received': [{'id': 1, 'Stock': 4}], 'agent': 'tests'})
+            self.assertEqual(int(response.headers['x-page-bytes']), len(response.content))
+            response.close()
+
+    def test_streamed_responses(self):
+        for name in self.transports:
+            response = self.transport(name).request('GET', self.server.domain + 'data_sources/Stock%20Levels?page=2',
+                                                    stream=True, timeout=(5, 5))
+            chunks = list(response.iter_content(16))
+            response.close()
+            self.assertGreater(len(chunks), 1, name)
+            self.assertEqual(json.loads(b''.join(chunks).decode('utf-8'))['data'], STOCK[2])
+
+    def test_clients(self):
+        for name in self.transports:
+            bc = BlackCurveAPI('acme', 'token', transport=name, domain=self.server.domain)
+            self.addCleanup(bc.close)
+            query = bc.data_sources('Stock Levels')
+            self.assertEqual([row['Stock'] for row in query.all()], [i * 3 for i in range(1, 9)])
+            streamed = bc.data_sources('Stock Levels').all().iter_rows(raw=True, chunk_size=32)
+            self.assertEqual(list(streamed), STOCK[1] + STOCK[2])
+
+
+@unittest.skipIf(httpx is None, 'requires httpx[http2]')
+class HTTP2TransportTest(HTTPTransportTest):
+    # the local server only speaks HTTP/1.1, which HTTP2Transport falls back to
+    transports = ['http2']
+
+    def test_names(self):
+        self.assertIsInstance(self.transport('http2'), HTTP2Transport)
+
+
+if __name__ == '__main__':
+    unittest.main()